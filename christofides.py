@@ -23,11 +23,21 @@ The Christofides algorithm has the following steps:
 6) Make a Hamiltonian circuit out of the Eulerian circuit by removing edges
    between vertices that are visited more than once.
 
-In reality, this program uses a pseudo-Christofides algorithm. It merges the 
-MST and MPM, but it does not ensure that the nodes in its merged result have 
-an even number of edges nor does it find a Eulerian circuit for the graph. 
-Instead, it prunes the paths and builds the Hamiltonian circuit in a single 
-function. It runs more like this:
+By default, christofides() follows those steps: the MST and MPM are merged 
+into a multigraph where every node has an even number of edges, Hierholzer's 
+algorithm walks a Eulerian circuit through it, and the circuit is shortcut 
+into a Hamiltonian circuit by skipping the nodes it has already visited. 
+Unless the nearest neighbours of the places are used, those steps run on 
+NumPy arrays of integer indices into the distances between the places, 
+which are read from the distance matrix once (see christofides_ids()). The 
+places themselves are only looked at again to build the final route.
+
+The program also keeps its original pseudo-Christofides algorithm, which can 
+be selected with christofides(..., circuit="repair"). It merges the MST and 
+MPM, but it does not ensure that the nodes in its merged result have an even 
+number of edges nor does it find a Eulerian circuit for the graph. Instead, 
+it prunes the paths and builds the Hamiltonian circuit in a single function. 
+It runs more like this:
 1) Find the minimum spanning tree (MST) of the input graph
 2) Identify all the nodes that have an odd number of edges in the MST.
 3) Find the minimum-weight perfect matching (MPM) of the nodes with the odd 
@@ -37,12 +47,169 @@ function. It runs more like this:
    edges of each node until all of them have exactly two edges. Ensure that 
    the graph is not disjoint every time the edges are reconnected.
 
-This pseudo-Christofides algorithm still has a worst-case runtime of O(n^3).
+This pseudo-Christofides algorithm has a worst-case runtime of O(n^3log(n)), 
+while the Eulerian circuit and shortcutting only take O(n) after the MST and 
+MPM are found.
 """
 
 import heapq
 
-def get_mst(nodes_list, distance_graph, places):
+import numpy as np
+
+from classes.disjoint_set import DisjointSet
+from classes.distance_matrix import DistanceMatrix
+from classes.tour import Tour
+from matching import min_weight_perfect_matching
+
+# Largest number of nodes with uneven edges for which get_mpm() finds the 
+# exact matching by default. Edmonds' algorithm takes around a second for 200 
+# nodes.
+EXACT_MATCHING_LIMIT = 150
+# How much get_mpm() can stretch each distance (as a fraction of it) when it 
+# is randomized.
+MATCHING_PERTURBATION = 0.05
+
+def get_distances_between(nodes, distance_graph):
+    """Returns the distances between every pair of nodes in the list, indexed 
+    by their position in it.
+
+    The result is a NumPy array when distance_graph is a DistanceMatrix, and 
+    a list of lists otherwise.
+
+    Time complexity: O(n^2)
+        * n = nodes
+    """
+
+    ids = [node.id for node in nodes]
+    if isinstance(distance_graph, DistanceMatrix):
+        return distance_graph.submatrix(ids)
+    return [[distance_graph[a][b] for b in ids] for a in ids]
+
+
+def get_distances_to(origin_id, destination_ids, distance_graph):
+    """Returns the distances from one place to each of the destinations, as 
+    a list.
+
+    Time complexity: O(n)
+        * n = destination_ids
+    """
+
+    if isinstance(distance_graph, DistanceMatrix):
+        return distance_graph.pairs(origin_id, destination_ids).tolist()
+    return [distance_graph[origin_id][b] for b in destination_ids]
+
+
+def prim_tree(distances, root=0):
+    """Returns the parent of each node in the minimum spanning tree of a 
+    complete graph, using the dense version of Prim's algorithm.
+
+    distances is a square matrix (a NumPy array or a list of lists) with the 
+    distance between every pair of nodes, indexed from 0. Instead of keeping a 
+    priority queue of every edge, each node that is not in the tree yet keeps 
+    the weight of the cheapest edge connecting it to the tree (its key). Every 
+    iteration adds the node with the smallest key and lowers the keys of its 
+    neighbours. The root is its own parent.
+
+    Time complexity: O(n^2)
+        * n = distances
+    """
+
+    n = len(distances)
+    if n == 0:
+        return []
+
+    # NumPy arrays get a vectorized argmin and key update.
+    if isinstance(distances, np.ndarray):
+        keys = np.array(distances[root], dtype=np.float64)
+        parents = np.full(n, root, dtype=np.intp)
+        in_tree = np.zeros(n, dtype=bool)
+        in_tree[root] = True
+        keys[root] = np.inf
+
+        for _ in range(n - 1):
+            node = int(np.argmin(keys))
+            in_tree[node] = True
+            keys[node] = np.inf
+
+            row = distances[node]
+            closer = (row < keys) & ~in_tree
+            keys[closer] = row[closer]
+            parents[closer] = node
+
+        return parents.tolist()
+
+    infinity = float("inf")
+    keys = [float(distance) for distance in distances[root]]
+    parents = [root] * n
+    in_tree = [False] * n
+    in_tree[root] = True
+    keys[root] = infinity
+
+    for _ in range(n - 1):
+        node = min(range(n), key=keys.__getitem__)
+        in_tree[node] = True
+        keys[node] = infinity
+
+        row = distances[node]
+        for destination in range(n):
+            if not in_tree[destination] and row[destination] < keys[destination]:
+                keys[destination] = row[destination]
+                parents[destination] = node
+
+    return parents
+
+
+def sparse_prim_tree(candidates, weights, root=0):
+    """Returns the parent of each node in the minimum spanning tree of the 
+    graph made of the candidate edges, using Prim's algorithm with a priority 
+    queue.
+
+    candidates holds the nearest neighbours of each node (see 
+    NeighbourIndex.candidate_lists()), and weights holds the distance to each 
+    of them in the same order. Each candidate edge can be used from either of 
+    its nodes. The root is its own parent. Returns None if the candidate edges 
+    do not connect every node, since the tree can't be found without the 
+    rest of the edges.
+
+    Time complexity: O(n*k*log(n*k))
+        * n = candidates
+        * k = neighbours of each node
+    """
+
+    n = len(candidates)
+    if n == 0:
+        return []
+
+    # Each edge is kept in both directions with its weight.
+    edges = [[] for _ in range(n)]
+    for a in range(n):
+        for b, distance in zip(candidates[a], weights[a]):
+            edges[a].append((distance, b))
+            edges[b].append((distance, a))
+
+    parents = [root] * n
+    in_tree = [False] * n
+    in_tree[root] = True
+    queue = [(distance, b, root) for distance, b in edges[root]]
+    heapq.heapify(queue)
+    added = 1
+
+    while queue and added < n:
+        distance, node, parent = heapq.heappop(queue)
+        if in_tree[node]:
+            continue
+        in_tree[node] = True
+        parents[node] = parent
+        added += 1
+        for edge in edges[node]:
+            if not in_tree[edge[1]]:
+                heapq.heappush(queue, (edge[0], edge[1], node))
+
+    return parents if added == n else None
+
+
+def get_mst(nodes_list, distance_graph, places, neighbour_index=None, 
+            rng=None):
     """Calculate the minimum spanning tree (MST) using Prim's algorithm.
     
     The minimum spanning tree of a graph links together all of its nodes using 
@@ -51,62 +218,75 @@ def get_mst(nodes_list, distance_graph, places):
     than two. 
     
     The steps of Prim's algorithm are:
-    1) Start from an arbitrary node in the graph.
+    1) Start from an arbitrary node in the graph (the hub).
     2) Add the node to a "visited" list.
     3) Compare the weight of all the edges of the nodes in the visited list.
     4) Choose the edge with the smallest weight, given that it isn't connected 
        to a node we have already visited.
     5) Repeat 2-4 until all of the nodes in the graph are in the MST.
 
-    Time complexity: O(n^2log(n))
+    Since the graph is complete, the dense version of Prim's algorithm is 
+    used (see prim_tree()). When distance_graph is a DistanceMatrix, the 
+    distances between the nodes are extracted once as a NumPy array.
+
+    If a NeighbourIndex is given and every node keeps some of its nearest 
+    neighbours within the group, the tree is only built out of the edges to 
+    those neighbours (see sparse_prim_tree()). The tree is then almost always 
+    the same, but the distances between every pair of nodes are never read. 
+    If those edges do not connect every node, the dense version is used.
+
+    If a NumPy random generator (rng) is given, the tree grows from a random 
+    node instead of the hub, and edges with the same weight are picked in a 
+    random order.
+
+    Time complexity: O(n^2), or O(n*k*log(n*k)) with neighbour_index
         * n = nodes_list
+        * k = neighbours of each node in neighbour_index
     """
     
-    current_node = places.get(places.address_to_place("HUB"))  # Node 0
-    visited_nodes = set()
-    possible_paths = []
+    # Sorting the nodes makes the MST the same on every run, even when two 
+    # edges have the same weight.
+    nodes = sorted(nodes_list)
+    if rng is not None:
+        nodes = [nodes[i] for i in rng.permutation(len(nodes))]
     # An MST includes all the nodes in the graph. Initialize all the nodes in
     # a dictionary without any connections.
-    mst = {node:set() for node in nodes_list}
-    
-    # "While we don't have connections between all the nodes." We don't 
-    # actually need to visit all the nodes for all of them to be included.
-    while len(visited_nodes) < len(nodes_list) - 1:
-        visited_nodes.add(current_node)
-
-        # Get the distances stored in the current node.
-        for destination in mst:
-            distance = distance_graph[current_node.id][destination.id]
-            # Do not add nodes connected to themselves or without paths.
-            if distance != 0 and destination not in visited_nodes:
-                possible_paths.append([distance, current_node, destination])
-
-         # Convert the list into a priority queue: the first element will 
-         # always contain the smallest element.
-        heapq.heapify(possible_paths)
-
-        while possible_paths:
-            origin = possible_paths[0][1]
-            destination = possible_paths[0][2]
-            if destination not in visited_nodes:
-                break
-            heapq.heappop(possible_paths)
-        
-        # Draw a path between the two nodes. The path can be accessed through 
-        # either of them.
-        mst[origin].add(destination)
-        mst[destination].add(origin)
+    mst = {node:set() for node in nodes}
+    if not nodes:
+        return mst
 
-        if not possible_paths:
-            break
+    hub = places.get(places.address_to_place("HUB"))  # Node 0
+    root = nodes.index(hub) if hub in mst else 0
+    if rng is not None:
+        root = int(rng.integers(len(nodes)))
+
+    parents = None
+    if neighbour_index is not None:
+        ids = [node.id for node in nodes]
+        candidates = neighbour_index.candidate_lists(ids)
+        if candidates is not None:
+            weights = [get_distances_to(ids[a], 
+                                        [ids[b] for b in candidates[a]], 
+                                        distance_graph)
+                       for a in range(len(ids))]
+            parents = sparse_prim_tree(candidates, weights, root)
+    if parents is None:
+        distances = get_distances_between(nodes, distance_graph)
+        parents = prim_tree(distances, root)
 
-        current_node = destination
-        heapq.heappop(possible_paths)
+    # Draw a path between each node and its parent. The path can be accessed 
+    # through either of them.
+    for i, parent in enumerate(parents):
+        if i != parent:
+            mst[nodes[i]].add(nodes[parent])
+            mst[nodes[parent]].add(nodes[i])
         
     return mst
 
 
-def get_mpm(node_graph: dict, distance_graph: list):
+def get_mpm(node_graph: dict, distance_graph: list, method="exact", 
+            exact_limit=EXACT_MATCHING_LIMIT, neighbour_index=None, 
+            rng=None, perturbation=MATCHING_PERTURBATION):
     """Find the minimum-weight perfect matching of the nodes with uneven edges 
     from the input graph.
 
@@ -118,10 +298,31 @@ def get_mpm(node_graph: dict, distance_graph: list):
     edges connecting to them. Therefore, the expected input for this function 
     is the result of the MST.
 
-    Time complexity: O(n^2log(n))
-        * n = node_graph
+    There are two ways to find the matching:
+    - "exact" uses Edmonds' blossom algorithm (see matching.py) to find the 
+      true minimum-weight perfect matching, which is what gives Christofides 
+      its 3/2 guarantee. It is only used when there are at most exact_limit 
+      nodes with uneven edges, since it takes O(k^3) time.
+    - "greedy" keeps matching the two closest unmatched nodes. It is faster, 
+      but the matching (and therefore the route) can be longer. It is also 
+      used when there are too many nodes for the exact matching.
+
+    If a NeighbourIndex is given, the greedy matching starts with only the 
+    edges between each node and its nearest neighbours with uneven edges. 
+    The few nodes that are left unmatched after those edges run out are then 
+    matched with every pair of them.
+
+    If a NumPy random generator (rng) is given, each distance is stretched by 
+    a random fraction of up to perturbation before the nodes are matched, so 
+    that matchings that are almost as short get a chance to be picked.
+
+    Time complexity: O(k^3) (exact) or O(k^2log(k)) (greedy)
+        * k = nodes with an uneven number of edges in node_graph
     """
     
+    if method not in ("exact", "greedy"):
+        raise ValueError(f"Unknown matching method {method}.")
+
     uneven_nodes = set()  # Nodes with an odd number of edges/paths.
     bijection = []
     node_distances = []
@@ -131,14 +332,53 @@ def get_mpm(node_graph: dict, distance_graph: list):
         if len(node_graph[node]) % 2 == 1:
             uneven_nodes.add(node)
 
-    # 2) Get the distances of each of those nodes.
+    if method == "exact" and len(uneven_nodes) <= exact_limit:
+        uneven_list = sorted(uneven_nodes)
+        distances = get_distances_between(uneven_list, distance_graph)
+        if rng is not None:
+            noise = rng.random((len(uneven_list), len(uneven_list)))
+            distances = np.asarray(distances) * (
+                1 + perturbation * (noise + noise.T) / 2)
+        for i, j in min_weight_perfect_matching(distances):
+            bijection.append((uneven_list[i], uneven_list[j]))
+        return bijection
+
+    # 2) Get the distances of each of those nodes, or only to their nearest 
+    #    neighbours if there is an index of them.
+    candidates = None
+    if neighbour_index is not None:
+        uneven_list = sorted(uneven_nodes)
+        candidates = neighbour_index.candidate_lists(
+            [node.id for node in uneven_list])
+    if candidates is not None:
+        for i, origin in enumerate(uneven_list):
+            destinations = [uneven_list[j] for j in candidates[i]]
+            distances = get_distances_to(
+                origin.id, [node.id for node in destinations], distance_graph)
+            for destination, distance in zip(destinations, distances):
+                if distance != 0:
+                    node_distances.append((distance, origin, destination))
+        if rng is not None:
+            node_distances = perturb_distances(node_distances, rng, 
+                                               perturbation)
+        heapq.heapify(node_distances)
+
+        while node_distances:
+            distance, start_node, end_node = heapq.heappop(node_distances)
+            if start_node in uneven_nodes and end_node in uneven_nodes:
+                bijection.append((start_node, end_node))
+                uneven_nodes.remove(start_node)
+                uneven_nodes.remove(end_node)
+
     unseen = uneven_nodes.copy()  # Prevents path duplicates.
     for origin in uneven_nodes:
         unseen.remove(origin)
         for destination in unseen:
-            distance = distance_graph[origin.id][destination.id]
+            distance = distance_graph[origin.id, destination.id]
             if distance != 0:
                 node_distances.append((distance, origin, destination))
+    if rng is not None:
+        node_distances = perturb_distances(node_distances, rng, perturbation)
 
     heapq.heapify(node_distances)
 
@@ -158,6 +398,26 @@ def get_mpm(node_graph: dict, distance_graph: list):
     return bijection
 
 
+def perturb_distances(node_distances: list, rng, perturbation: float):
+    """Stretches each (distance, origin, destination) entry by a random 
+    fraction of up to perturbation, and returns the new entries.
+
+    The entries are put in order of the IDs of their nodes first, so the same 
+    random generator always stretches the same paths by the same amount.
+
+    Time complexity: O(n*log(n))
+        * n = node_distances
+    """
+
+    node_distances = sorted(
+        node_distances, key=lambda entry: (min(entry[1].id, entry[2].id), 
+                                           max(entry[1].id, entry[2].id)))
+    stretch = 1 + perturbation * rng.random(len(node_distances))
+    return [(distance * factor, origin, destination) 
+            for (distance, origin, destination), factor 
+            in zip(node_distances, stretch.tolist())]
+
+
 def merge_graphs(mst: dict, mpm: list): 
     """Merge the MST and MPM.
     
@@ -179,33 +439,221 @@ def merge_graphs(mst: dict, mpm: list):
     return merged
 
 
-def is_disjoint(node_connection_dict, current_node, complete_node_count):
-    """Checks if the input graph is disjoint.
-    
-    A graph is disjoint when it has at least one node that is not connected to 
-    the rest of the graph. It is not possible to access all the nodes in the 
-    graph when starting its traversal at an arbitrary node. This is a helper 
-    function for simplify_edges().
+def get_multigraph(mst: dict, mpm: list, rng=None):
+    """Merge the MST and MPM into a multigraph.
+
+    Unlike merge_graphs(), an edge that is in both the MST and the MPM is 
+    kept twice, so every node ends up with an even number of edges. Each node 
+    maps to a list of its neighbours, with repeats for duplicate edges. If a 
+    NumPy random generator (rng) is given, the neighbours of each node are 
+    shuffled, which changes the order in which the Eulerian circuit visits 
+    them.
 
     Time complexity: O(n)
-        * n = node_connection_dict
+        * n = mst
     """
 
-    visited_nodes = set()
-    unvisited_nodes = list(node_connection_dict[current_node]) # stack
-    
-    while unvisited_nodes:
-        if current_node in visited_nodes:
-            pass
+    multigraph = {node: list(mst[node]) for node in mst}
+    for a, b in mpm:
+        multigraph[a].append(b)
+        multigraph[b].append(a)
+
+    if rng is not None:
+        for node in multigraph:
+            neighbours = sorted(multigraph[node])
+            multigraph[node] = [neighbours[i] 
+                                for i in rng.permutation(len(neighbours))]
+
+    return multigraph
+
+
+def get_eulerian_circuit(multigraph: dict, start):
+    """Returns a Eulerian circuit of the multigraph, starting and ending at 
+    the start node, using Hierholzer's algorithm.
+
+    A Eulerian circuit uses every edge of the graph exactly once. It exists 
+    when the graph is connected and all of its nodes have an even number of 
+    edges. Hierholzer's algorithm follows unused edges until it gets stuck 
+    (which can only happen back at the node where it started), then backtracks 
+    to the last node that still has unused edges and starts a new loop from 
+    there, splicing it into the circuit.
+
+    Time complexity: O(E)
+        * E = edges in multigraph
+    """
+
+    # Give each edge an index so that using it from one side also uses it 
+    # from the other side.
+    edges = {node: [] for node in multigraph}
+    edge_count = 0
+    for node in multigraph:
+        for neighbour in multigraph[node]:
+            # Each edge is listed by both of its nodes, so only number it the 
+            # first time around. Sorting the pair gives a standard order.
+            if not node < neighbour:
+                continue
+            edges[node].append((neighbour, edge_count))
+            edges[neighbour].append((node, edge_count))
+            edge_count += 1
+
+    used = [False] * edge_count
+    next_edge = {node: 0 for node in multigraph}  # Skips the used edges.
+    stack = [start]
+    circuit = []
+
+    while stack:
+        node = stack[-1]
+        node_edges = edges[node]
+        while (next_edge[node] < len(node_edges) 
+               and used[node_edges[next_edge[node]][1]]):
+            next_edge[node] += 1
+
+        if next_edge[node] == len(node_edges):
+            # Stuck: this node is done, add it to the circuit.
+            circuit.append(stack.pop())
         else:
-            for destination in node_connection_dict[current_node]:  # O(1)
+            neighbour, edge = node_edges[next_edge[node]]
+            used[edge] = True
+            stack.append(neighbour)
+
+    circuit.reverse()
+    return circuit
+
+
+def shortcut_circuit(circuit: list):
+    """Make a Hamiltonian circuit out of the Eulerian circuit by skipping the 
+    nodes that were already visited.
+
+    Thanks to the triangle inequality, going straight to the next unvisited 
+    node is never longer than following the Eulerian circuit. The result 
+    lists every node once, in the order in which it is visited; the return to 
+    the first node is implied.
+
+    Time complexity: O(n)
+        * n = circuit
+    """
+
+    visited_nodes = set()
+    tour = []
+    for node in circuit:
+        if node not in visited_nodes:
+            visited_nodes.add(node)
+            tour.append(node)
+
+    return tour
+
+
+def tour_to_graph(tour: list):
+    """Converts a list of nodes in visiting order into the {node: set()} 
+    graph used by chain_routes() and deliver_packages(), where each node is 
+    connected to the nodes before and after it in the circuit.
+
+    Time complexity: O(n)
+        * n = tour
+    """
+
+    graph = {node: set() for node in tour}
+    if len(tour) < 2:
+        return graph
+
+    for i, node in enumerate(tour):
+        next_node = tour[(i + 1) % len(tour)]
+        graph[node].add(next_node)
+        graph[next_node].add(node)
+
+    return graph
+
+
+def reaches_nearby(node_connection_dict, node, targets, limit=1024):
+    """Checks if the node can reach any of the targets by only visiting the 
+    nodes near them.
+
+    Two searches take turns visiting one node at a time: one starts at the 
+    node and the other at the targets. They stop as soon as they meet (the 
+    node can reach the targets) or as soon as either one runs out of nodes 
+    (it can't), so a split is found in time proportional to the smaller side 
+    of the graph. Returns None if neither happened after visiting limit 
+    nodes. This is a helper function for simplify_edges(), where the 
+    destinations being reconnected are usually just a few edges away from 
+    the node.
+
+    Time complexity: O(1)
+        * at most limit nodes are visited
+    """
+
+    searches = [({node}, [node]), (set(targets), list(targets))]
+    visited_count = 0
+    while visited_count < limit:
+        for i, (visited_nodes, unvisited_nodes) in enumerate(searches):
+            if not unvisited_nodes:
+                return False
+            other_visited_nodes = searches[1 - i][0]
+            current_node = unvisited_nodes.pop()
+            visited_count += 1
+            for destination in node_connection_dict[current_node]:
+                if destination in other_visited_nodes:
+                    return True
                 if destination not in visited_nodes:
+                    visited_nodes.add(destination)
                     unvisited_nodes.append(destination)
 
-        visited_nodes.add(current_node)
-        current_node = unvisited_nodes.pop()
+    return None
 
-    return len(visited_nodes) != complete_node_count
+
+def get_components_without(node_connection_dict, node, original_paths):
+    """Returns the connected components of the graph before a reconnection, 
+    after removing the node being simplified and all of its edges, as a 
+    DisjointSet.
+
+    original_paths holds the connections of the nodes that the reconnection 
+    changed, from before it happened. simplify_edges() only ever changes the 
+    edges of the node it is working on and the edges between that node's 
+    destinations, so these components stay the same for every reconnection 
+    it tries on the node. This is a helper function for simplify_edges().
+
+    Time complexity: O(E)
+        * E = edges in node_connection_dict
+    """
+
+    components = DisjointSet(other for other in node_connection_dict 
+                             if other != node)
+    for origin in node_connection_dict:
+        if origin == node:
+            continue
+        for destination in original_paths.get(origin, 
+                                              node_connection_dict[origin]):
+            if destination != node:
+                components.union(origin, destination)
+
+    return components
+
+
+def stays_connected(node_connection_dict, node, components, new_edge):
+    """Checks if the graph is still connected after reconnecting the edges of 
+    a node.
+
+    components are the connected components of the graph without the node 
+    (see get_components_without()). The graph is connected if the node's 
+    remaining edges, together with the new edge between two of its 
+    destinations, link all of those components to each other. Only the 
+    node's edges need to be looked at, instead of traversing the whole graph. 
+    This is a helper function for simplify_edges().
+
+    Time complexity: O(d)
+        * d = edges of node
+    """
+
+    if components.count == 0:
+        return True
+
+    reached = {components.find(destination) 
+               for destination in node_connection_dict[node]}
+    x = components.find(new_edge[0])
+    y = components.find(new_edge[1])
+    if x in reached or y in reached:
+        reached.update((x, y))
+
+    return len(reached) == components.count
 
 
 def reconnect_nodes(node_connection_dict, n, x, y):
@@ -214,7 +662,8 @@ def reconnect_nodes(node_connection_dict, n, x, y):
 
     For nodes that have more than two connections, we want to make a direct 
     path between its connections by replacing [(n, x), (n, y)] with [(x, y)]. 
-    This is a helper function for simplify_edges().
+    This is a helper function for simplify_edges(). Returns the pair of 
+    destinations that ended up connected to each other.
 
     Time complexity: O(n)
         * n = connections
@@ -256,6 +705,8 @@ def reconnect_nodes(node_connection_dict, n, x, y):
             node_connection_dict[y].remove(n)
             node_connection_dict[n].remove(y)
 
+    return x, y
+
 
 def simplify_edges(distance_graph, merged_graph):
     """Makes a hamiltonian circuit out of the merged MST and MPM graphs.
@@ -264,7 +715,14 @@ def simplify_edges(distance_graph, merged_graph):
     once. For our Hamiltonian circuit, we are also adding the restriction that 
     each node needs to have exactly two edges. 
 
-    Time complexity: O(n^3log(n))
+    A reconnection can only split the graph by cutting the node off from the 
+    destinations that were reconnected, so each reconnection is first checked 
+    by searching near the node (see reaches_nearby()). If that is not enough, 
+    the components of the graph without the node are found once and reused 
+    for every other reconnection tried on it (see stays_connected()), instead 
+    of traversing the whole graph after every attempt.
+
+    Time complexity: O(n^3)
         * n = node_connections
     """
     
@@ -291,12 +749,13 @@ def simplify_edges(distance_graph, merged_graph):
             # slightly faster with [(n-i):].
             for end_node in destination_nodes[(n-i):]:
                 destination_node_distances.append((
-                    distance_graph[start_node.id][end_node.id], 
+                    distance_graph[start_node.id, end_node.id], 
                     start_node, 
                     end_node))
             i -= 1
 
         heapq.heapify(destination_node_distances)
+        components = None  # Only found if a reconnection needs them.
 
         # 3) Remove extra paths from the origin node by reconnecting those 
         #    paths to the destinations with the smallest distance between 
@@ -315,9 +774,8 @@ def simplify_edges(distance_graph, merged_graph):
             tried_pairs.add(pair)
 
             original_paths = {
-                "node": node_connections[node].copy(),
-                "start": node_connections[start_node].copy(),
-                "end": node_connections[end_node].copy()
+                changed_node: node_connections[changed_node].copy()
+                for changed_node in (node, start_node, end_node)
             }
 
             # Prevent nodes from having two paths directing them to the same 
@@ -325,15 +783,22 @@ def simplify_edges(distance_graph, merged_graph):
             if (node != start_node 
                 and node != end_node 
                 and start_node != end_node):
-                reconnect_nodes(node_connections, node, start_node, end_node)
+                new_edge = reconnect_nodes(node_connections, node, 
+                                           start_node, end_node)
+
+                connected = reaches_nearby(node_connections, node, 
+                                           new_edge)
+                if connected is None:
+                    if components is None:
+                        components = get_components_without(
+                            node_connections, node, original_paths)
+                    connected = stays_connected(node_connections, node, 
+                                                components, new_edge)
 
                 # Undo changes if disjoint, break if the reconnection was 
                 # successful.
-                if is_disjoint(node_connections, start_node, 
-                               len(node_connections)):
-                    node_connections[node] = original_paths["node"]
-                    node_connections[start_node] = original_paths["start"]
-                    node_connections[end_node] = original_paths["end"]
+                if not connected:
+                    node_connections.update(original_paths)
                 else:
                     break 
         
@@ -350,15 +815,280 @@ def simplify_edges(distance_graph, merged_graph):
     return node_connections
 
 
-def christofides(places_list, distance_graph, places):
+def get_tree_edges(distances, root=0, rng=None):
+    """Returns the edges of the minimum spanning tree of the nodes as two 
+    arrays of node indices (the children and their parents).
+
+    distances is a square NumPy array with the distance between every pair 
+    of nodes. If a NumPy random generator (rng) is given, the tree grows from 
+    a random node and the nodes are looked at in a random order, which 
+    changes which edge is picked when two have the same weight.
+
+    Time complexity: O(n^2)
+        * n = distances
+    """
+
+    n = len(distances)
+    order = np.arange(n)
+    if rng is not None:
+        order = rng.permutation(n)
+        root = int(rng.integers(n))
+        distances = distances[np.ix_(order, order)]
+
+    parents = np.asarray(prim_tree(distances, root), dtype=np.intp)
+    children = np.flatnonzero(parents != np.arange(n))
+    return order[children], order[parents[children]]
+
+
+def get_matching_edges(distances, odd_nodes, method="exact", 
+                       exact_limit=EXACT_MATCHING_LIMIT, rng=None, 
+                       perturbation=MATCHING_PERTURBATION):
+    """Returns the edges of a perfect matching of the odd nodes as two arrays 
+    of node indices, in the same way as get_mpm().
+
+    distances is a square NumPy array with the distance between every pair 
+    of nodes, and odd_nodes holds the indices of the nodes to match. The 
+    greedy matching sorts every pair of them by distance at once and then 
+    takes each pair whose nodes are both still unmatched.
+
+    Time complexity: O(k^3) (exact) or O(k^2log(k)) (greedy)
+        * k = odd_nodes
+    """
+
+    k = len(odd_nodes)
+    odd_distances = distances[np.ix_(odd_nodes, odd_nodes)]
+    if rng is not None:
+        noise = rng.random((k, k))
+        odd_distances = odd_distances * (
+            1 + perturbation * (noise + noise.T) / 2)
+
+    if method == "exact" and k <= exact_limit:
+        pairs = min_weight_perfect_matching(odd_distances)
+        pairs = np.array(pairs, dtype=np.intp).reshape(-1, 2)
+        return odd_nodes[pairs[:, 0]], odd_nodes[pairs[:, 1]]
+
+    rows, columns = np.triu_indices(k, 1)
+    order = np.argsort(odd_distances[rows, columns], kind="stable")
+    matched = np.zeros(k, dtype=bool)
+    pairs = []
+    for i, j in zip(rows[order].tolist(), columns[order].tolist()):
+        if matched[i] or matched[j]:
+            continue
+        matched[i] = matched[j] = True
+        pairs.append((i, j))
+        if 2 * len(pairs) == k:
+            break
+
+    pairs = np.array(pairs, dtype=np.intp).reshape(-1, 2)
+    return odd_nodes[pairs[:, 0]], odd_nodes[pairs[:, 1]]
+
+
+def get_circuit(n, origins, destinations, start=0, rng=None):
+    """Returns a Eulerian circuit of the multigraph with n nodes and the 
+    given edges, starting and ending at the start node, using Hierholzer's 
+    algorithm (see get_eulerian_circuit()).
+
+    The edges of each node are kept in flat arrays sorted by node (a 
+    compressed sparse row layout), so the walk only ever looks up integers. 
+    If a NumPy random generator (rng) is given, the edges of each node are 
+    taken in a random order.
+
+    Time complexity: O(n + E*log(E))
+        * E = edges
+    """
+
+    m = len(origins)
+    heads = np.concatenate([origins, destinations])
+    tails = np.concatenate([destinations, origins])
+    edge_ids = np.concatenate([np.arange(m), np.arange(m)])
+    if rng is not None:
+        shuffle = rng.permutation(2 * m)
+        heads, tails, edge_ids = (heads[shuffle], tails[shuffle], 
+                                  edge_ids[shuffle])
+
+    by_node = np.argsort(heads, kind="stable")
+    counts = np.bincount(heads, minlength=n)
+    ends = np.cumsum(counts)
+    next_edge = (ends - counts).tolist()
+    ends = ends.tolist()
+    neighbours = tails[by_node].tolist()
+    edges = edge_ids[by_node].tolist()
+
+    used = bytearray(m)
+    stack = [start]
+    circuit = []
+    while stack:
+        node = stack[-1]
+        i = next_edge[node]
+        while i < ends[node] and used[edges[i]]:
+            i += 1
+
+        if i == ends[node]:
+            # Stuck: this node is done, add it to the circuit.
+            next_edge[node] = i
+            circuit.append(stack.pop())
+        else:
+            used[edges[i]] = True
+            next_edge[node] = i + 1
+            stack.append(neighbours[i])
+
+    circuit.reverse()
+    return np.array(circuit, dtype=np.intp)
+
+
+def christofides_tour(distances, start=0, matching="exact", 
+                      exact_limit=EXACT_MATCHING_LIMIT, rng=None, 
+                      perturbation=MATCHING_PERTURBATION):
+    """Returns the Christofides tour of the nodes as an array of node indices 
+    that starts at the start node.
+
+    distances is a square NumPy array with the distance between every pair 
+    of nodes. Every step works on arrays of node indices:
+    1) The MST comes from prim_tree() (see get_tree_edges()).
+    2) The nodes with an odd number of edges are counted with np.bincount().
+    3) They are matched (see get_matching_edges()).
+    4) The edges of both are walked as a Eulerian circuit (see 
+       get_circuit()).
+    5) The circuit is shortcut by keeping the first visit of each node.
+    matching, exact_limit, rng, and perturbation work like in get_mpm(), and 
+    rng also randomizes the MST and the circuit like in christofides().
+
+    Time complexity: O(n^2 + k^3) (exact) or O(n^2 + k^2log(k)) (greedy)
+        * n = distances
+        * k = nodes with an odd number of edges in the MST
+    """
+
+    if matching not in ("exact", "greedy"):
+        raise ValueError(f"Unknown matching method {matching}.")
+
+    distances = np.asarray(distances, dtype=np.float64)
+    n = len(distances)
+    if n < 3:
+        return np.roll(np.arange(n), -start)
+
+    # 1) and 2)
+    children, parents = get_tree_edges(distances, start, rng)
+    degrees = np.bincount(children, minlength=n) + np.bincount(parents, 
+                                                               minlength=n)
+    odd_nodes = np.flatnonzero(degrees % 2)
+
+    # 3) and 4)
+    matched_a, matched_b = get_matching_edges(distances, odd_nodes, 
+                                              matching, exact_limit, rng, 
+                                              perturbation)
+    circuit = get_circuit(n, np.concatenate([children, matched_a]), 
+                          np.concatenate([parents, matched_b]), start, rng)
+
+    # 5) np.unique() finds the first visit of each node.
+    _, first_visits = np.unique(circuit, return_index=True)
+    return circuit[np.sort(first_visits)]
+
+
+def christofides_ids(ids, distance_graph, start_id=None, matching="exact", 
+                     exact_limit=EXACT_MATCHING_LIMIT, rng=None, 
+                     perturbation=MATCHING_PERTURBATION):
+    """Returns the Christofides tour of the places with the given IDs as an 
+    array of IDs that starts at start_id (the first ID by default).
+
+    The distances between the places are read from distance_graph once, with 
+    DistanceMatrix.submatrix() or np.ix_(), and christofides_tour() only 
+    works with their positions in ids. Raises ValueError if start_id is not 
+    one of the IDs.
+
+    Time complexity: see christofides_tour()
+    """
+
+    ids = np.asarray(ids, dtype=np.intp)
+    if len(ids) == 0:
+        return ids
+
+    start = 0
+    if start_id is not None:
+        matches = np.flatnonzero(ids == start_id)
+        if not len(matches):
+            raise ValueError(f"Place {start_id} is not in the group.")
+        start = int(matches[0])
+
+    if isinstance(distance_graph, DistanceMatrix):
+        distances = distance_graph.submatrix(ids)
+    else:
+        distances = np.asarray(distance_graph, dtype=np.float64)[
+            np.ix_(ids, ids)]
+
+    return ids[christofides_tour(distances, start, matching, exact_limit, 
+                                 rng, perturbation)]
+
+
+def christofides(places_list, distance_graph, places, matching="exact", 
+                 circuit="euler", neighbour_index=None, cache=None, 
+                 seed=None):
     """Assembling all the parts of the algorithm to make up the Christofides 
     algorithm.
+
+    matching selects how get_mpm() matches the nodes with uneven edges 
+    ("exact" or "greedy"). circuit selects how the merged MST and MPM are 
+    turned into a Hamiltonian circuit: "euler" walks a Eulerian circuit and 
+    shortcuts it, while "repair" uses the original simplify_edges(). If a 
+    NeighbourIndex is given, the MST and the greedy matching only look at the 
+    edges between nearby places whenever they can.
+
+    If a RouteCache is given, the route is looked up by the IDs of the places 
+    and the version of distance_graph before it is solved, and stored in the 
+    cache afterwards. A route from the cache is a fresh copy that can be 
+    changed freely.
+
+    If a seed is given, the MST root, the order in which edges with the same 
+    weight are picked, the matching (see get_mpm()), and the order of the 
+    Eulerian circuit are randomized, so each seed can give a different route. 
+    The same seed always gives the same route. Randomized routes are never 
+    cached.
     
-    Time complexity: O(n^3log(n))
+    Time complexity: O(n^3) (euler) or O(n^3log(n)) (repair)
     """
-    mst = get_mst(places_list, distance_graph, places)
-    mpm = get_mpm(mst, distance_graph)
-    merged = merge_graphs(mst, mpm)
-    best_path = simplify_edges(distance_graph, merged)
+
+    if circuit not in ("euler", "repair"):
+        raise ValueError(f"Unknown circuit method {circuit}.")
+
+    rng = None if seed is None else np.random.default_rng(seed)
+
+    if cache is not None and rng is None:
+        # A matrix without a version is only ever equal to itself.
+        version = getattr(distance_graph, "version", None)
+        if version is None:
+            version = id(distance_graph)
+        key = cache.make_key(places_list, version, matching, circuit, 
+                             neighbour_index is not None)
+        best_path = cache.get(key)
+        if best_path is not None:
+            return best_path
+        best_path = christofides(places_list, distance_graph, places, 
+                                 matching, circuit, neighbour_index)
+        cache.put(key, best_path)
+        return best_path
+
+    hub = places.get(places.address_to_place("HUB"))  # Node 0
+    if circuit == "euler" and neighbour_index is None:
+        # The dense pipeline only needs the IDs of the places.
+        nodes = sorted(places_list)
+        by_id = {node.id: node for node in nodes}
+        tour_ids = christofides_ids(list(by_id), distance_graph, 
+                                    hub.id if hub in nodes else None, 
+                                    matching, rng=rng)
+        return Tour(tour_ids).to_graph(by_id)
+
+    mst = get_mst(places_list, distance_graph, places, neighbour_index, rng)
+    mpm = get_mpm(mst, distance_graph, matching, 
+                  neighbour_index=neighbour_index, rng=rng)
+
+    if circuit == "repair":
+        merged = merge_graphs(mst, mpm)
+        return simplify_edges(distance_graph, merged)
+
+    multigraph = get_multigraph(mst, mpm, rng)
+    if not multigraph:
+        return {}
+    start = hub if hub in multigraph else next(iter(multigraph))
+    eulerian_circuit = get_eulerian_circuit(multigraph, start)
+    best_path = tour_to_graph(shortcut_circuit(eulerian_circuit))
 
     return best_path
\ No newline at end of file
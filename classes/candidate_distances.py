@@ -0,0 +1,186 @@
+import numpy as np
+
+from .distance_matrix import DistanceMatrix
+
+class DistanceRow(dict):
+    """
+    A class used to represent the known distances from one node of a
+    CandidateDistances table, keyed by the index of the other node.
+
+    Reading a distance that is not known yet looks it up in the distance
+    matrix and remembers it, so a row can be read like a row of a full
+    matrix (row[b]).
+
+    Attributes
+    ----------
+    table : CandidateDistances
+        The table the row belongs to
+    node : int
+        The index of the node the distances start from
+
+    Methods
+    -------
+    __missing__(other)
+        Looks up the distance to another node and remembers it
+    """
+
+    def __init__(self, table, node):
+        """
+        Parameters
+        ----------
+        table : CandidateDistances
+            The table the row belongs to
+        node : int
+            The index of the node the distances start from
+
+        Raises
+        ------
+        N/A
+        """
+
+        super().__init__()
+        self.table = table
+        self.node = node
+
+    def __missing__(self, other):
+        """Looks up the distance to another node in the distance matrix,
+        remembers it in both rows, and returns it.
+
+        Parameters
+        ----------
+        other : int
+            The index of the other node
+
+        Raises
+        ------
+        IndexError
+            If the other node is not in the table.
+        """
+
+        distance = self.table.lookup(self.node, other)
+        self[other] = distance
+        self.table.rows[other][self.node] = distance
+        return distance
+
+
+class CandidateDistances:
+    """
+    A class used to represent the distances between the nodes of a group
+    without reading all of them.
+
+    Local search only compares the edges of the route with the edges to the
+    nearest neighbours of each node (see local_search.py), so most of the
+    n x n distances of a large group are never read. The table starts with
+    the distances to the candidate neighbours of each node, read from the
+    distance matrix all at once, and any other distance is looked up the
+    first time it is needed. It takes O(n*k) memory, plus one entry for each
+    distance read later, instead of O(n^2).
+
+    Nodes are indices into ids, and table[a][b] is the distance between
+    nodes a and b, like with a list of lists.
+
+    Attributes
+    ----------
+    ids : list
+        The place ID of each node
+    distance_graph : DistanceMatrix or list
+        The distances between every pair of places, indexed by place ID
+    rows : list
+        The DistanceRow of each node
+
+    Methods
+    -------
+    lookup(a, b)
+        Returns the distance between two nodes from the distance matrix
+    __getitem__(a)
+        Returns the DistanceRow of a node
+    __len__()
+        Returns how many nodes are in the table
+    """
+
+    def __init__(self, ids, candidates, distance_graph):
+        """
+        Parameters
+        ----------
+        ids : list
+            The place ID of each node
+        candidates : list
+            The candidate neighbours of each node, as lists of node indices
+            (see NeighbourIndex.candidate_lists())
+        distance_graph : DistanceMatrix or list
+            The distances between every pair of places, indexed by place ID
+
+        Raises
+        ------
+        IndexError
+            If a candidate is not one of the nodes.
+        """
+
+        self.ids = list(ids)
+        self.distance_graph = distance_graph
+        self.rows = [DistanceRow(self, a) for a in range(len(self.ids))]
+
+        origins = [a for a, row in enumerate(candidates) for _ in row]
+        destinations = [b for row in candidates for b in row]
+        if not origins:
+            return
+        if isinstance(distance_graph, DistanceMatrix):
+            ids = np.asarray(self.ids, dtype=np.intp)
+            distances = distance_graph.pairs(
+                ids[origins], ids[destinations]).tolist()
+        else:
+            distances = [self.lookup(a, b)
+                         for a, b in zip(origins, destinations)]
+        for a, b, distance in zip(origins, destinations, distances):
+            self.rows[a][b] = distance
+            self.rows[b][a] = distance
+
+    def lookup(self, a, b):
+        """Returns the distance between two nodes from the distance matrix.
+
+        Parameters
+        ----------
+        a : int
+            The index of the first node
+        b : int
+            The index of the second node
+
+        Raises
+        ------
+        IndexError
+            If either node is not in the table.
+        """
+
+        if isinstance(self.distance_graph, DistanceMatrix):
+            return self.distance_graph.distance(self.ids[a], self.ids[b])
+        return float(self.distance_graph[self.ids[a]][self.ids[b]])
+
+    def __getitem__(self, a):
+        """Returns the DistanceRow of a node.
+
+        Parameters
+        ----------
+        a : int
+            The index of the node
+
+        Raises
+        ------
+        IndexError
+            If the node is not in the table.
+        """
+
+        return self.rows[a]
+
+    def __len__(self):
+        """Returns how many nodes are in the table.
+
+        Parameters
+        ----------
+        N/A
+
+        Raises
+        ------
+        N/A
+        """
+
+        return len(self.rows)
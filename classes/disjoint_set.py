@@ -0,0 +1,132 @@
+class DisjointSet:
+    """
+    A union-find structure used to keep track of connected components.
+
+    Each component is a tree of its members whose root represents it. Finding
+    the root compresses the path to it and unions attach the smaller tree to
+    the larger one, so both operations take nearly constant amortized time.
+
+    Attributes
+    ----------
+    parent : dict
+        The parent of each member in its component's tree
+    size : dict
+        The number of members in the component of each root
+    count : int
+        The number of components
+
+    Methods
+    -------
+    add(member)
+        Adds a member in a component of its own
+    find(member)
+        Returns the root that represents the component of the member
+    union(a, b)
+        Merges the components of two members
+    connected(a, b)
+        Checks if two members are in the same component
+    """
+
+    def __init__(self, members=()):
+        """
+        Parameters
+        ----------
+        members : iterable
+            The members to start with, each in its own component (default
+            empty)
+        """
+
+        self.parent = {}
+        self.size = {}
+        self.count = 0
+        for member in members:
+            self.add(member)
+
+    def add(self, member):
+        """Adds a member in a component of its own.
+
+        Parameters
+        ----------
+        member : hashable
+            The member to add. Nothing happens if it was already added.
+
+        Raises
+        ------
+        N/A
+        """
+
+        if member not in self.parent:
+            self.parent[member] = member
+            self.size[member] = 1
+            self.count += 1
+
+    def find(self, member):
+        """Returns the root that represents the component of the member.
+
+        Parameters
+        ----------
+        member : hashable
+            The member whose component we want
+
+        Raises
+        ------
+        KeyError
+            If the member was never added.
+        """
+
+        root = member
+        while self.parent[root] != root:
+            root = self.parent[root]
+
+        # Point every member on the path straight at the root.
+        while self.parent[member] != root:
+            self.parent[member], member = root, self.parent[member]
+
+        return root
+
+    def union(self, a, b):
+        """Merges the components of two members. Returns False if they were
+        already in the same component.
+
+        Parameters
+        ----------
+        a : hashable
+            A member of the first component
+        b : hashable
+            A member of the second component
+
+        Raises
+        ------
+        KeyError
+            If either member was never added.
+        """
+
+        root_a = self.find(a)
+        root_b = self.find(b)
+        if root_a == root_b:
+            return False
+
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size.pop(root_b)
+        self.count -= 1
+        return True
+
+    def connected(self, a, b):
+        """Checks if two members are in the same component.
+
+        Parameters
+        ----------
+        a : hashable
+            The first member
+        b : hashable
+            The second member
+
+        Raises
+        ------
+        KeyError
+            If either member was never added.
+        """
+
+        return self.find(a) == self.find(b)
@@ -0,0 +1,397 @@
+import numpy as np
+
+# Name of each encoding -> (NumPy type used for storage, stored units per
+# mile). uint16 stores tenths of a mile, which is lossless for the distance
+# table because its distances only have one decimal place.
+ENCODINGS = {
+    "float64": (np.float64, 1),
+    "float32": (np.float32, 1),
+    "uint16": (np.uint16, 10),
+}
+
+class DistanceMatrix:
+    """
+    A class used to represent the distances between every pair of places.
+
+    The distances are kept in a single contiguous NumPy array instead of a
+    list of lists, so rows and whole groups of places can be pulled out with
+    NumPy indexing. Indexing the matrix the same way as the old list of lists
+    (matrix[a][b]) still works, but matrix[a, b] avoids building the
+    intermediate row.
+
+    By default the full n x n matrix is stored as float64. Since the matrix is
+    symmetric and its diagonal is all zeros, it can also be stored condensed:
+    only the n(n - 1)/2 distances above the diagonal are kept in a 1D array,
+    and the distance between places i < j is found at index
+    n*i - i*(i + 1)/2 + (j - i - 1). Either layout can use a smaller encoding
+    (float32, or uint16 tenths of a mile). Distances are always returned as
+    float64 miles, whatever the storage.
+
+    Attributes
+    ----------
+    data : numpy.ndarray
+        The stored distances, either n x n or condensed into 1D
+    size : int
+        The number of places in the matrix
+    condensed : bool
+        Whether data only holds the distances above the diagonal
+    encoding : str
+        The name of the encoding of data (float64, float32, or uint16)
+    version : hashable
+        Identifies the distances the matrix was built from, such as the
+        checksum of the csv file. None if it is unknown.
+    array : numpy.ndarray
+        The full symmetric n x n matrix of distances as float64 (in miles)
+
+    Methods
+    -------
+    from_places(place_list, condensed=False, encoding="float64")
+        Builds the matrix from the lower-triangular distances of each place
+    distance(origin_id, destination_id)
+        Returns the distance between two places as a float
+    row(origin_id)
+        Returns the distances from a place to every other place
+    rows(origin_ids)
+        Returns the distances from each of the places to every other place
+    pairs(origin_ids, destination_ids)
+        Returns the distances between each origin and its destination
+    submatrix(ids)
+        Returns the distances between every pair of places in ids
+    __getitem__(key)
+        Gives the matrix the same indexing as a 2D NumPy array
+    __len__()
+        Returns how many places are in the matrix
+    """
+
+    def __init__(self, data, condensed=False, encoding="float64", size=None,
+                 version=None):
+        """
+        Parameters
+        ----------
+        data : numpy.ndarray
+            A square array with the distances between each pair of places, or
+            the condensed distances above its diagonal
+        condensed : bool
+            Whether data only holds the distances above the diagonal (default
+            False)
+        encoding : str
+            The name of the encoding of data (default float64)
+        size : int
+            The number of places. Only needed if data is condensed, since it
+            can't always be told apart from its length (default None)
+        version : hashable
+            Identifies the distances the matrix was built from (default None)
+
+        Raises
+        ------
+        ValueError
+            If the encoding is unknown or data does not have the expected
+            shape.
+        """
+
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown distance encoding {encoding}.")
+
+        self.condensed = condensed
+        self.encoding = encoding
+        self.data = np.ascontiguousarray(data, dtype=ENCODINGS[encoding][0])
+
+        if condensed:
+            if size is None:
+                # Solving n(n - 1)/2 = len(data) for n
+                size = int((1 + (1 + 8 * len(self.data)) ** 0.5) / 2)
+            if self.data.shape != (size * (size - 1) // 2,):
+                raise ValueError("Condensed distances do not match the "
+                                 f"number of places ({size}).")
+        else:
+            if self.data.ndim != 2 or self.data.shape[0] != self.data.shape[1]:
+                raise ValueError("The distance matrix must be square.")
+            size = self.data.shape[0]
+        self.size = size
+        self.version = version
+
+    @classmethod
+    def from_places(cls, place_list, condensed=False, encoding="float64"):
+        """Builds the matrix from the lower-triangular distances of each
+        place.
+
+        The place with ID i holds the distances to the places with IDs 0 to i
+        (see load_distance_data() in main.py), so reading them in order fills
+        the lower triangle row by row. The upper triangle is a mirror of it.
+        Each place's list of distance strings is cleared once it has been
+        read, since the matrix replaces it.
+
+        Parameters
+        ----------
+        place_list : list
+            A list of places sorted by their ID
+        condensed : bool
+            Whether to only store the distances above the diagonal (default
+            False)
+        encoding : str
+            The name of the encoding used to store the distances (default
+            float64)
+
+        Raises
+        ------
+        ValueError
+            If the encoding is unknown or cannot store the distances without
+            losing precision.
+        """
+
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown distance encoding {encoding}.")
+        dtype, scale = ENCODINGS[encoding]
+
+        n = len(place_list)
+        if condensed:
+            data = np.zeros(n * (n - 1) // 2, dtype=dtype)
+        else:
+            data = np.zeros((n, n), dtype=dtype)
+
+        for place in place_list:
+            i = place.id
+            miles = np.array(place.distances[:i], dtype=np.float64)
+            values = np.rint(miles * scale) if scale != 1 else miles
+            if scale != 1 and (np.any(values / scale != miles)
+                               or np.any(values > np.iinfo(dtype).max)):
+                raise ValueError(f"The distances of {place.address} cannot "
+                                 f"be stored as {encoding}.")
+
+            # Column i above the diagonal mirrors row i below it.
+            if condensed:
+                j = np.arange(i)
+                data[n * j - j * (j + 1) // 2 + (i - j - 1)] = values
+            else:
+                data[i, :i] = values
+                data[:i, i] = values
+            place.distances = []
+
+        return cls(data, condensed, encoding, n)
+
+    def _decode(self, values):
+        """Converts stored values into float64 miles."""
+
+        scale = ENCODINGS[self.encoding][1]
+        values = np.asarray(values, dtype=np.float64)
+        return values / scale if scale != 1 else values
+
+    def _condensed_index(self, origin_ids, destination_ids):
+        """Returns the indices in data of the given pairs of places, along
+        with a mask of the pairs that are on the diagonal. The index of those
+        pairs is 0, so their value must be discarded."""
+
+        low = np.minimum(origin_ids, destination_ids)
+        high = np.maximum(origin_ids, destination_ids)
+        diagonal = low == high
+        index = self.size * low - low * (low + 1) // 2 + (high - low - 1)
+        return np.where(diagonal, 0, index), diagonal
+
+    @property
+    def array(self):
+        """The full symmetric n x n matrix of distances as float64 (in
+        miles). It is only built (and copied) if the matrix is not already
+        stored that way."""
+
+        if not self.condensed and self.encoding == "float64":
+            return self.data
+        return self.submatrix(np.arange(self.size))
+
+    def distance(self, origin_id, destination_id):
+        """Returns the distance between two places as a float.
+
+        Parameters
+        ----------
+        origin_id : int
+            The ID of the place where the path starts
+        destination_id : int
+            The ID of the place where the path ends
+
+        Raises
+        ------
+        IndexError
+            If either ID is not in the matrix.
+        """
+
+        if not self.condensed:
+            value = self.data[origin_id, destination_id]
+        elif origin_id == destination_id:
+            return 0.0
+        else:
+            if not (0 <= origin_id < self.size
+                    and 0 <= destination_id < self.size):
+                raise IndexError("Place ID out of the bounds of the matrix.")
+            low, high = sorted((int(origin_id), int(destination_id)))
+            value = self.data[self.size * low - low * (low + 1) // 2
+                              + (high - low - 1)]
+
+        return float(value) / ENCODINGS[self.encoding][1]
+
+    def row(self, origin_id):
+        """Returns the distances from a place to every other place.
+
+        Parameters
+        ----------
+        origin_id : int
+            The ID of the place where the paths start
+
+        Raises
+        ------
+        IndexError
+            If the ID is not in the matrix.
+        """
+
+        if not self.condensed:
+            return self._decode(self.data[origin_id])
+
+        if not 0 <= origin_id < self.size:
+            raise IndexError("Place ID out of the bounds of the matrix.")
+        index, diagonal = self._condensed_index(origin_id,
+                                                np.arange(self.size))
+        row = self._decode(self.data[index])
+        row[diagonal] = 0
+        return row
+
+    def rows(self, origin_ids):
+        """Returns the distances from each of the places to every other
+        place.
+
+        Row i of the result belongs to the place with ID origin_ids[i].
+
+        Parameters
+        ----------
+        origin_ids : list
+            The IDs of the places where the paths start
+
+        Raises
+        ------
+        IndexError
+            If any of the IDs is not in the matrix.
+        """
+
+        origin_ids = np.asarray(origin_ids, dtype=np.intp)
+        if not self.condensed:
+            return self._decode(self.data[origin_ids])
+
+        if origin_ids.size and (origin_ids.min() < 0
+                                or origin_ids.max() >= self.size):
+            raise IndexError("Place ID out of the bounds of the matrix.")
+        index, diagonal = self._condensed_index(origin_ids[:, None],
+                                                np.arange(self.size)[None, :])
+        rows = self._decode(self.data[index])
+        rows[diagonal] = 0
+        return rows
+
+    def pairs(self, origin_ids, destination_ids):
+        """Returns the distances between each origin and its destination.
+
+        The arrays of IDs are broadcast against each other, like any other
+        NumPy operation.
+
+        Parameters
+        ----------
+        origin_ids : numpy.ndarray
+            The IDs of the places where the paths start
+        destination_ids : numpy.ndarray
+            The IDs of the places where the paths end
+
+        Raises
+        ------
+        IndexError
+            If any of the IDs is not in the matrix.
+        """
+
+        origin_ids = np.asarray(origin_ids, dtype=np.intp)
+        destination_ids = np.asarray(destination_ids, dtype=np.intp)
+        if not self.condensed:
+            return self._decode(self.data[origin_ids, destination_ids])
+
+        for ids in (origin_ids, destination_ids):
+            if ids.size and (ids.min() < 0 or ids.max() >= self.size):
+                raise IndexError("Place ID out of the bounds of the matrix.")
+        index, diagonal = self._condensed_index(origin_ids, destination_ids)
+        distances = self._decode(self.data[index])
+        distances[diagonal] = 0
+        return distances
+
+    def submatrix(self, ids):
+        """Returns the distances between every pair of places in ids.
+
+        Row and column i of the result belong to the place with ID ids[i].
+
+        Parameters
+        ----------
+        ids : list
+            The IDs of the places in the group
+
+        Raises
+        ------
+        IndexError
+            If any of the IDs is not in the matrix.
+        """
+
+        ids = np.asarray(ids, dtype=np.intp)
+        if not self.condensed:
+            return self._decode(self.data[np.ix_(ids, ids)])
+
+        if ids.size and (ids.min() < 0 or ids.max() >= self.size):
+            raise IndexError("Place ID out of the bounds of the matrix.")
+        index, diagonal = self._condensed_index(ids[:, None], ids[None, :])
+        submatrix = self._decode(self.data[index])
+        submatrix[diagonal] = 0
+        return submatrix
+
+    def __getitem__(self, key):
+        """Gives the matrix the same indexing as a 2D NumPy array.
+
+        A condensed or smaller encoding only supports the keys that can be
+        answered from a single row: an ID, a pair of IDs, or an ID along with
+        any index of the other axis. Any other key would need the whole n x n
+        matrix to be built, so pairs(), rows(), or submatrix() should be used
+        instead.
+
+        Parameters
+        ----------
+        key : int, tuple, or numpy.ndarray
+            An ID for a row, a pair of IDs for a single distance, or any other
+            NumPy index
+
+        Raises
+        ------
+        IndexError
+            If the key is out of the bounds of the matrix.
+        TypeError
+            If the matrix is condensed or uses a smaller encoding, and the key
+            needs more than one row of the matrix.
+        """
+
+        if not self.condensed and self.encoding == "float64":
+            return self.data[key]
+        if isinstance(key, (int, np.integer)):
+            return self.row(key)
+        if isinstance(key, tuple) and len(key) == 2:
+            origin, destination = key
+            if isinstance(origin, (int, np.integer)):
+                if isinstance(destination, (int, np.integer)):
+                    return self.distance(origin, destination)
+                return self.row(origin)[destination]
+            # The matrix is symmetric, so a column is the same as a row.
+            if isinstance(destination, (int, np.integer)):
+                return self.row(destination)[origin]
+        raise TypeError("A condensed or encoded matrix can only be indexed "
+                        "one row at a time. Use pairs(), rows(), or "
+                        "submatrix() instead.")
+
+    def __len__(self):
+        """Returns how many places are in the matrix.
+
+        Parameters
+        ----------
+        N/A
+
+        Raises
+        ------
+        N/A
+        """
+
+        return self.size
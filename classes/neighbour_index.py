@@ -0,0 +1,236 @@
+import numpy as np
+
+class NeighbourIndex:
+    """
+    A class used to represent the k nearest neighbours of every place.
+
+    Most of the stages of the route planning only need the edges between
+    places that are close to each other: the shortest routes, spanning trees,
+    and matchings are almost entirely made of them. The index keeps the IDs
+    of the k closest places to each place, closest first, so that those
+    stages can look at O(n*k) candidate edges instead of all O(n^2) of them.
+    It is computed once from the distance matrix and can be cached next to it
+    (see distance_cache.py).
+
+    An index can also cover a single group of places (see from_matrix()),
+    in which case it only has a row for each place of the group.
+
+    Attributes
+    ----------
+    neighbours : numpy.ndarray
+        An n x k array with the IDs of the nearest places to each place,
+        closest first
+    ids : numpy.ndarray
+        The ID of the place of each row of neighbours, or None if row i
+        belongs to the place with ID i
+    size : int
+        The number of places in the index
+    k : int
+        The number of neighbours kept for each place
+
+    Methods
+    -------
+    from_matrix(matrix, k, block_size=1024, ids=None)
+        Builds the index from a distance matrix
+    neighbours_of(place_id)
+        Returns the IDs of the nearest places to a place, closest first
+    candidate_lists(ids, k=None, min_candidates=1)
+        Returns the nearest neighbours of each place within a group of places
+    __len__()
+        Returns how many places are in the index
+    """
+
+    def __init__(self, neighbours, ids=None):
+        """
+        Parameters
+        ----------
+        neighbours : numpy.ndarray
+            An n x k array with the IDs of the nearest places to each place,
+            closest first
+        ids : numpy.ndarray
+            The ID of the place of each row of neighbours (default None, row
+            i belongs to the place with ID i)
+
+        Raises
+        ------
+        ValueError
+            If neighbours is not a 2D array, or ids does not have one ID for
+            each row.
+        """
+
+        if np.ndim(neighbours) != 2:
+            raise ValueError("The neighbour index must be a 2D array.")
+        if ids is not None and len(ids) != len(neighbours):
+            raise ValueError("The neighbour index needs one ID for each row.")
+
+        self.neighbours = neighbours
+        self.ids = None if ids is None else np.asarray(ids, dtype=np.intp)
+        self.size, self.k = neighbours.shape
+
+    @classmethod
+    def from_matrix(cls, matrix, k, block_size=1024, ids=None):
+        """Builds the index from a distance matrix.
+
+        The rows of the matrix are read in blocks of block_size places, so
+        that a condensed or memory-mapped matrix never has to be expanded
+        all at once. np.argpartition() finds the k closest places of every
+        row of a block in linear time, and only those k are sorted.
+
+        If ids is given, only the places in it get neighbours, picked among
+        each other, and the index only has their rows. This gives an index
+        that always covers that group (see candidate_lists()) in O(n*k)
+        memory, however many places the matrix has.
+
+        Parameters
+        ----------
+        matrix : DistanceMatrix or numpy.ndarray
+            The distances between every pair of places
+        k : int
+            The number of neighbours to keep for each place. It is lowered to
+            n - 1 if there are not enough places.
+        block_size : int
+            How many rows of the matrix are processed at a time (default
+            1024)
+        ids : list
+            The IDs of the places in the group to index (default all of the
+            places)
+
+        Raises
+        ------
+        ValueError
+            If k is not positive.
+        """
+
+        if k <= 0:
+            raise ValueError("The number of neighbours must be positive.")
+
+        n = len(matrix)
+        group = np.arange(n) if ids is None else np.asarray(ids, np.intp)
+        k = min(k, len(group) - 1)
+        neighbours = np.zeros((len(group), max(k, 0)), dtype=np.int32)
+        if k <= 0:
+            return cls(neighbours, None if ids is None else group)
+
+        for start in range(0, len(group), block_size):
+            rows = np.arange(start, min(start + block_size, len(group)))
+            origins = group[rows]
+            if ids is None:
+                if isinstance(matrix, np.ndarray):
+                    block = np.array(matrix[origins], dtype=np.float64)
+                else:
+                    block = matrix.rows(origins)
+            elif isinstance(matrix, np.ndarray):
+                block = np.array(matrix[np.ix_(origins, group)],
+                                 dtype=np.float64)
+            else:
+                block = matrix.pairs(origins[:, None], group[None, :])
+
+            # A place must never be its own neighbour, even if another place
+            # is at a distance of 0 from it.
+            block[np.arange(len(rows)), rows] = np.inf
+            closest = np.argpartition(block, k - 1, axis=1)[:, :k]
+            order = np.argsort(np.take_along_axis(block, closest, axis=1),
+                               axis=1, kind="stable")
+            neighbours[rows] = group[np.take_along_axis(closest, order,
+                                                        axis=1)]
+
+        return cls(neighbours, None if ids is None else group)
+
+    def _rows_of(self, place_ids):
+        """Returns the row of neighbours of each of the place IDs."""
+
+        place_ids = np.asarray(place_ids, dtype=np.intp)
+        if self.ids is None:
+            if place_ids.size and (place_ids.min() < 0
+                                   or place_ids.max() >= self.size):
+                raise IndexError("Place ID out of the bounds of the index.")
+            return place_ids
+
+        sorter = np.argsort(self.ids, kind="stable")
+        found = np.searchsorted(self.ids, place_ids, sorter=sorter)
+        found = sorter[np.minimum(found, self.size - 1)]
+        if self.size == 0 or np.any(self.ids[found] != place_ids):
+            raise IndexError("Place ID not in the index.")
+        return found
+
+    def neighbours_of(self, place_id):
+        """Returns the IDs of the nearest places to a place, closest first.
+
+        Parameters
+        ----------
+        place_id : int
+            The ID of the place
+
+        Raises
+        ------
+        IndexError
+            If the ID is not in the index.
+        """
+
+        return self.neighbours[self._rows_of(place_id)]
+
+    def candidate_lists(self, ids, k=None, min_candidates=1):
+        """Returns the nearest neighbours of each place within a group of
+        places, closest first.
+
+        Each list holds positions in ids rather than place IDs, so that it
+        lines up with get_distances_between() and the neighbour lists used
+        by local_search.py. The neighbours of a place that are not in the
+        group are dropped, so a small group in a large distance table can
+        keep very few of them. Returns None when any place keeps fewer than
+        min_candidates neighbours, in which case the caller should fall back
+        to looking at every pair of places in the group.
+
+        Parameters
+        ----------
+        ids : list
+            The IDs of the places in the group
+        k : int
+            The largest number of neighbours to return for each place
+            (default all of the neighbours in the index)
+        min_candidates : int
+            The smallest number of neighbours each place must keep (default
+            1)
+
+        Raises
+        ------
+        IndexError
+            If any of the IDs is not in the index.
+        """
+
+        ids = np.asarray(ids, dtype=np.intp)
+        if k is None:
+            k = self.k
+        if len(ids) < 2:
+            return [[] for _ in ids]
+
+        # Position of each neighbour in the group, or -1 if it is not in it.
+        # The group is searched in sorted order, so that no array as large
+        # as the whole distance table is needed.
+        neighbours = self.neighbours[self._rows_of(ids)]
+        sorter = np.argsort(ids, kind="stable")
+        found = sorter[np.minimum(np.searchsorted(ids, neighbours,
+                                                  sorter=sorter),
+                                  len(ids) - 1)]
+        kept = ids[found] == neighbours
+        mapped = np.where(kept, found, -1)
+
+        needed = min(min_candidates, len(ids) - 1)
+        if kept.sum(axis=1).min() < needed:
+            return None
+
+        return [row[mask][:k].tolist() for row, mask in zip(mapped, kept)]
+
+    def __len__(self):
+        """Returns how many places are in the index.
+
+        Parameters
+        ----------
+        N/A
+
+        Raises
+        ------
+        N/A
+        """
+
+        return self.size
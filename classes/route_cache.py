@@ -0,0 +1,167 @@
+from collections import OrderedDict
+
+class RouteCache:
+    """
+    A class used to remember the routes found for groups of places.
+
+    The same group of places is often routed more than once (for example, the
+    same deadline group on a rerun of the day). Each route is stored under a
+    key made from the IDs of the places in the group and the version of the
+    distance matrix it was found with, so a route is never reused after the
+    distances change. When the cache is full, the route that was used least
+    recently is evicted.
+
+    Routes are {Place: set()} graphs, which can be changed in place by
+    whoever uses them, so a copy of each route is stored and a fresh copy is
+    handed out on every hit.
+
+    Attributes
+    ----------
+    capacity : int
+        The largest number of routes kept in the cache
+    routes : collections.OrderedDict
+        The cached routes, from least to most recently used
+    hits : int
+        The number of times a route was found in the cache
+    misses : int
+        The number of times a route was not in the cache
+
+    Methods
+    -------
+    make_key(places_list, version, *options)
+        Returns the key of a group of places
+    get(key)
+        Returns a copy of the route stored under the key
+    put(key, route)
+        Stores a copy of the route under the key
+    clear()
+        Removes every route and resets the counters
+    __len__()
+        Returns how many routes are in the cache
+    """
+
+    def __init__(self, capacity=128):
+        """
+        Parameters
+        ----------
+        capacity : int
+            The largest number of routes kept in the cache (default 128)
+
+        Raises
+        ------
+        ValueError
+            If the capacity is not positive.
+        """
+
+        if capacity <= 0:
+            raise ValueError("The capacity of the cache must be positive.")
+
+        self.capacity = capacity
+        self.routes = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(places_list, version, *options):
+        """Returns the key of a group of places.
+
+        The order of the places does not matter, only which ones are in the
+        group. Any other setting that changes the route (like the matching
+        method) should be passed in options.
+
+        Parameters
+        ----------
+        places_list : iterable
+            The places in the group
+        version : hashable
+            The version of the distance matrix used to find the route
+        options : hashable
+            Any other settings that change the route
+
+        Raises
+        ------
+        N/A
+        """
+
+        return (frozenset(place.id for place in places_list), version,
+                options)
+
+    @staticmethod
+    def _copy(route):
+        """Returns a copy of a route that shares no sets with it."""
+
+        return {node: set(route[node]) for node in route}
+
+    def get(self, key):
+        """Returns a copy of the route stored under the key, or None if it is
+        not in the cache.
+
+        Parameters
+        ----------
+        key : tuple
+            The key of the group of places (see make_key())
+
+        Raises
+        ------
+        N/A
+        """
+
+        route = self.routes.get(key)
+        if route is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.routes.move_to_end(key)
+        return self._copy(route)
+
+    def put(self, key, route):
+        """Stores a copy of the route under the key, evicting the least
+        recently used route if the cache is full.
+
+        Parameters
+        ----------
+        key : tuple
+            The key of the group of places (see make_key())
+        route : dict
+            The route found for the group
+
+        Raises
+        ------
+        N/A
+        """
+
+        self.routes[key] = self._copy(route)
+        self.routes.move_to_end(key)
+        if len(self.routes) > self.capacity:
+            self.routes.popitem(last=False)
+
+    def clear(self):
+        """Removes every route and resets the counters.
+
+        Parameters
+        ----------
+        N/A
+
+        Raises
+        ------
+        N/A
+        """
+
+        self.routes.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        """Returns how many routes are in the cache.
+
+        Parameters
+        ----------
+        N/A
+
+        Raises
+        ------
+        N/A
+        """
+
+        return len(self.routes)
@@ -0,0 +1,344 @@
+import numpy as np
+
+class Tour:
+    """
+    A class used to represent a route as the IDs of its places in visiting
+    order.
+
+    The rest of the program passes routes around as {Place: set()} graphs,
+    where each place is connected to the places before and after it. Walking
+    such a graph means picking, at every place, the neighbour that isn't the
+    previous place, and each place costs a whole set. A tour keeps the IDs in
+    a NumPy array instead, along with the position of each ID in it, so the
+    next place, the previous place, and the position of a place can be found
+    in constant time. It can be made from a graph with from_graph() and
+    turned back into one with to_graph().
+
+    The tour is a circuit: the place after the last one is the first one.
+
+    Attributes
+    ----------
+    order : numpy.ndarray
+        The IDs of the places in visiting order
+    positions : numpy.ndarray
+        The position of each ID in order, indexed by ID (-1 for the IDs that
+        are not in the tour)
+
+    Methods
+    -------
+    from_graph(route, start=None)
+        Builds the tour of a {Place: set()} route
+    to_graph(place_list)
+        Returns the tour as a {Place: set()} route
+    position(place_id)
+        Returns the position of a place in the tour
+    following(place_id, step=1)
+        Returns the ID of the place step positions after a place
+    successor(place_id)
+        Returns the ID of the place after a place
+    predecessor(place_id)
+        Returns the ID of the place before a place
+    reverse(i, j)
+        Reverses the part of the tour between two positions
+    move_segment(segment, place_id, first)
+        Moves a segment of the tour to right after a place
+    rotate(place_id)
+        Returns the same tour, starting at a place
+    __getitem__(i)
+        Returns the ID of the place at a position
+    __iter__()
+        Returns an iterator over the IDs in visiting order
+    __len__()
+        Returns how many places are in the tour
+    """
+
+    def __init__(self, order):
+        """
+        Parameters
+        ----------
+        order : list
+            The IDs of the places in visiting order
+
+        Raises
+        ------
+        ValueError
+            If order is not a 1D array of non-negative IDs or visits a place
+            more than once.
+        """
+
+        order = np.array(order, dtype=np.intp)
+        if order.ndim != 1:
+            raise ValueError("A tour must be a 1D array of place IDs.")
+        if len(order) and order.min() < 0:
+            raise ValueError("Place IDs can't be negative.")
+
+        size = int(order.max()) + 1 if len(order) else 0
+        positions = np.full(size, -1, dtype=np.intp)
+        positions[order] = np.arange(len(order))
+        if len(order) and np.count_nonzero(positions >= 0) != len(order):
+            raise ValueError("A tour must visit each place once.")
+
+        self.order = order
+        self.positions = positions
+
+    @classmethod
+    def from_graph(cls, route, start=None):
+        """Builds the tour of a {Place: set()} route, starting at the start
+        place.
+
+        Parameters
+        ----------
+        route : dict
+            The route, where each place is connected to the places before and
+            after it
+        start : Place
+            The place to start at (default the first place of the route)
+
+        Raises
+        ------
+        ValueError
+            If the route is not a single circuit through all of its places.
+        """
+
+        if not route:
+            return cls([])
+        if start is None:
+            start = next(iter(route))
+        if len(route) < 3:
+            return cls([start.id] + [place.id for place in route
+                                     if place is not start])
+
+        order = [start.id]
+        previous_place = None
+        current_place = start
+        while len(order) < len(route):
+            for destination in route[current_place]:
+                if destination != previous_place and destination != start:
+                    break
+            else:
+                raise ValueError("The route does not visit every place once.")
+            previous_place = current_place
+            current_place = destination
+            order.append(current_place.id)
+
+        return cls(order)
+
+    def to_graph(self, place_list):
+        """Returns the tour as a {Place: set()} route, where each place is
+        connected to the places before and after it (the same format as
+        christofides()).
+
+        Parameters
+        ----------
+        place_list : list
+            The places, indexed by ID (a list or a dictionary)
+
+        Raises
+        ------
+        KeyError
+            If place_list is a dictionary without one of the IDs.
+        """
+
+        tour = [place_list[place_id] for place_id in self.order.tolist()]
+        graph = {place: set() for place in tour}
+        if len(tour) < 2:
+            return graph
+
+        for i, place in enumerate(tour):
+            next_place = tour[(i + 1) % len(tour)]
+            graph[place].add(next_place)
+            graph[next_place].add(place)
+
+        return graph
+
+    def position(self, place_id):
+        """Returns the position of a place in the tour.
+
+        Parameters
+        ----------
+        place_id : int
+            The ID of the place
+
+        Raises
+        ------
+        KeyError
+            If the place is not in the tour.
+        """
+
+        if (not 0 <= place_id < len(self.positions)
+            or self.positions[place_id] < 0):
+            raise KeyError(f"Place {place_id} is not in the tour.")
+        return int(self.positions[place_id])
+
+    def following(self, place_id, step=1):
+        """Returns the ID of the place step positions after a place (before
+        it if step is negative), wrapping around the end of the tour.
+
+        Parameters
+        ----------
+        place_id : int
+            The ID of the place
+        step : int
+            How many positions to move forward (default 1)
+
+        Raises
+        ------
+        KeyError
+            If the place is not in the tour.
+        """
+
+        return int(self.order[(self.position(place_id) + step) % len(self)])
+
+    def successor(self, place_id):
+        """Returns the ID of the place after a place.
+
+        Parameters
+        ----------
+        place_id : int
+            The ID of the place
+
+        Raises
+        ------
+        KeyError
+            If the place is not in the tour.
+        """
+
+        return self.following(place_id, 1)
+
+    def predecessor(self, place_id):
+        """Returns the ID of the place before a place.
+
+        Parameters
+        ----------
+        place_id : int
+            The ID of the place
+
+        Raises
+        ------
+        KeyError
+            If the place is not in the tour.
+        """
+
+        return self.following(place_id, -1)
+
+    def reverse(self, i, j):
+        """Reverses the part of the tour from position i to position j (going
+        forward and wrapping around the end).
+
+        Reversing a segment of a circuit gives the same circuit as reversing
+        everything outside of it, so the shorter of the two is reversed, and
+        the places outside of the segment may end up reversed instead.
+
+        Parameters
+        ----------
+        i : int
+            The position where the segment starts
+        j : int
+            The position where the segment ends
+
+        Raises
+        ------
+        N/A
+        """
+
+        n = len(self)
+        length = (j - i) % n + 1
+        if 2 * length > n:
+            i, j = (j + 1) % n, (i - 1) % n
+            length = n - length
+        if length < 2:
+            return
+
+        segment = (i + np.arange(length)) % n
+        self.order[segment] = self.order[segment[::-1]]
+        self.positions[self.order[segment]] = segment
+
+    def move_segment(self, segment, place_id, first):
+        """Moves a segment of the tour (a list of consecutive IDs) to right
+        after a place, with the place first at the start of the segment.
+
+        Parameters
+        ----------
+        segment : list
+            The IDs of the places in the segment, in visiting order
+        place_id : int
+            The ID of the place the segment goes after
+        first : int
+            The ID of the end of the segment that goes right after the place
+
+        Raises
+        ------
+        KeyError
+            If the place is not in the tour.
+        """
+
+        if first != segment[0]:
+            segment = segment[::-1]
+        remaining = self.order[~np.isin(self.order, segment)]
+        matches = np.flatnonzero(remaining == place_id)
+        if not len(matches):
+            raise KeyError(f"Place {place_id} is not in the tour.")
+        i = int(matches[0]) + 1
+
+        self.order = np.concatenate([remaining[:i], segment, remaining[i:]])
+        self.positions[self.order] = np.arange(len(self.order))
+
+    def rotate(self, place_id):
+        """Returns the same tour, starting at a place.
+
+        Parameters
+        ----------
+        place_id : int
+            The ID of the place to start at
+
+        Raises
+        ------
+        KeyError
+            If the place is not in the tour.
+        """
+
+        return Tour(np.roll(self.order, -self.position(place_id)))
+
+    def __getitem__(self, i):
+        """Returns the ID of the place at a position.
+
+        Parameters
+        ----------
+        i : int
+            The position in the tour
+
+        Raises
+        ------
+        IndexError
+            If the position is out of the bounds of the tour.
+        """
+
+        return int(self.order[i])
+
+    def __iter__(self):
+        """Returns an iterator over the IDs in visiting order.
+
+        Parameters
+        ----------
+        N/A
+
+        Raises
+        ------
+        N/A
+        """
+
+        return iter(self.order.tolist())
+
+    def __len__(self):
+        """Returns how many places are in the tour.
+
+        Parameters
+        ----------
+        N/A
+
+        Raises
+        ------
+        N/A
+        """
+
+        return len(self.order)
@@ -5,9 +5,8 @@ class Truck:
     A class used to represent a truck.
 
     The trucks at other facilites may have different average speeds and 
-    capacities. If that is the case, future developers will need to change the 
-    hardcoded values of the speed and capacity attributes in the init method 
-    or initialize them with parameters.
+    capacities. If that is the case, they can be given when the truck is 
+    initialized.
 
     Attributes
     ----------
@@ -40,7 +39,8 @@ class Truck:
         Returns the package without unloading it
     """
 
-    def __init__(self, id, depart_time = TimeMod(8, 0)):
+    def __init__(self, id, depart_time = TimeMod(8, 0), capacity = 16, 
+                 speed = 18):
         """
         Parameters
         ----------
@@ -50,15 +50,16 @@ class Truck:
             The time at which the truck leaves the facility. Default value is 
             8:00 AM.
         capacity : int
-            How many packages the truck can hold
-        packages: set
-            A set of the packages in the truck
+            How many packages the truck can hold. Default value is 16.
+        speed : int
+            The average speed at which the truck travels, in miles per hour. 
+            Default value is 18.
         """
         
         self.id = id
         self.depart_time = depart_time
-        self.speed = 18
-        self.capacity = 16
+        self.speed = speed
+        self.capacity = capacity
         self.packages = set()
 
     def is_full(self):
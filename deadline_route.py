@@ -0,0 +1,395 @@
+"""
+Contains the deadline-aware route solver, which finds a single short route
+through all of the stops of a truck that still reaches every stop before the
+deadline of its packages.
+
+get_delivery_details() in delivery.py puts the stops in groups by deadline and
+the routes of the groups are driven one after the other (see chain_routes()),
+so every 10:30 stop is visited before any EOD stop, even one right next door.
+Here, the deadline of each stop is a time window instead (it can be reached
+at any time up to its deadline), and the stops of all of the deadlines share
+a single route:
+1) Start from the route of the deadline groups and from a route built by
+   inserting the stops (earliest deadline first) where they make the route
+   the least longer without making any stop late, each in both directions.
+2) Improve each of them with moves that shorten the route and keep every
+   stop on time: moving one stop somewhere else (relocation) and reversing a
+   segment of the route (2-opt).
+3) Keep the route with the fewest late stops, then the shortest one.
+Routes that start on time stay on time, so the result is never later or
+longer than the route of the deadline groups.
+
+Checking a move would normally mean driving the whole route again. Instead,
+each route keeps two arrays, indexed by position (the hub is at position 0,
+and again at position n on the way back):
+- arrival[i]: the minute at which the truck reaches the stop at position i.
+- slack[i]: the smallest deadline[j] - arrival[j] over every position j from
+  i on, which is how much later all of those stops could be reached and still
+  be on time.
+A move that makes every stop from position i on later by delta minutes is on
+time if delta <= slack[i], which is checked in O(1). The arrays are rebuilt
+with NumPy after each move that is applied, in O(n) time.
+
+A stop can also have a ready time: the earliest minute at which it can be
+reached (such as the correct address of the "wrong address" package, see
+get_ready_minutes() in delivery.py). The moves never make the truck wait,
+so a third array is kept:
+- early[i]: the smallest arrival[j] - ready[j] over every position j from i
+  on, which is how much earlier all of those stops could be reached and
+  still be ready.
+A move that makes every stop from position i on earlier by delta minutes
+(a negative delay) keeps them ready if delta <= early[i]. Some stops can
+only be reached after their ready time by driving out of the way, though,
+so the routes are compared as they are driven by deliver_packages(): the
+truck waits at a stop that isn't ready yet, which makes every later stop
+later too. The routes to start from are then also improved without their
+ready times and kept as they are, so the result is never later than the
+route of the deadline groups either way.
+
+Times are in minutes since midnight (see tour_evaluation.py), and deadlines
+are an array of minutes indexed by place ID (see get_deadline_minutes()).
+"""
+
+import numpy as np
+
+from christofides import get_distances_between
+from classes.tour import Tour
+from tour_evaluation import evaluate_tours
+
+# Moves that shorten the route by less than this are ignored, to avoid
+# looping forever over floating-point rounding errors.
+EPSILON = 1e-9
+
+
+def get_schedule(order, distances, depart_minutes, pace, deadlines,
+                 ready=None):
+    """Returns the arrival, slack, and early arrays of a route (see the top
+    of this module), each with one more entry than the route for the way
+    back to the hub.
+
+    order holds node indices starting at the hub, distances is a square
+    NumPy array of the distances between the nodes, pace is the number of
+    minutes it takes to drive a mile, and deadlines is an array of minutes
+    indexed by node (infinity for the hub and the stops without one). ready
+    is an optional array of the ready time of each node (minus infinity for
+    the hub and the stops without one).
+
+    Time complexity: O(n)
+        * n = order
+    """
+
+    closed = np.append(order, order[0])
+    legs = distances[closed[:-1], closed[1:]]
+    arrival = depart_minutes + pace * np.concatenate([[0.0], np.cumsum(legs)])
+    slack = np.minimum.accumulate((deadlines[closed] - arrival)[::-1])[::-1]
+    if ready is None:
+        early = np.full(len(closed), np.inf)
+    else:
+        early = np.minimum.accumulate((arrival - ready[closed])[::-1])[::-1]
+    return arrival, slack, early
+
+
+def count_late(order, distances, depart_minutes, pace, deadlines,
+               ready=None):
+    """Returns how many stops of the route are reached after their deadline
+    when the truck waits at each stop that isn't ready yet.
+
+    Waiting at stop j until ready[j] makes every later stop later by the
+    same number of minutes, so the truck is at position i at
+    drive[i] + max(depart_minutes, ready[j] - drive[j] over every j <= i),
+    where drive[i] is how many minutes it takes to get there without
+    waiting.
+
+    Time complexity: O(n)
+        * n = order
+    """
+
+    arrival, _, _ = get_schedule(order, distances, depart_minutes, pace,
+                                 deadlines)
+    if ready is not None:
+        drive = arrival - depart_minutes
+        closed = np.append(order, order[0])
+        arrival = drive + np.maximum.accumulate(
+            np.maximum(ready[closed] - drive, depart_minutes))
+    missed = arrival[:-1] > deadlines[order]
+    return int(np.count_nonzero(missed))
+
+
+def get_insertion(order, node, distances, schedule, pace, deadlines,
+                  ready=None):
+    """Returns the position after which the node makes the route the least
+    longer without making any stop late, along with how much longer it
+    makes the route, or (-1, infinity) if it can't go anywhere on time.
+
+    schedule is the (arrival, slack, early) arrays of the route. The node
+    goes between the stops at positions i and i + 1. It is reached at
+    arrival[i] plus the drive to it, and every stop from i + 1 on is reached
+    later by the added distance, which slack[i + 1] and early[i + 1] check.
+    The stops up to position i don't move, so they must already be ready.
+    Every position is checked at once.
+
+    Time complexity: O(n)
+        * n = order
+    """
+
+    arrival, slack, early = schedule
+    before = order
+    after = np.roll(order, -1)
+    added = (distances[before, node] + distances[node, after]
+             - distances[before, after])
+    reached = arrival[:-1] + pace * distances[before, node]
+    on_time = ((reached <= deadlines[node])
+               & (pace * added <= slack[1:])
+               & (pace * added >= -early[1:]))
+    if ready is not None:
+        on_time &= ((reached >= ready[node])
+                    & np.logical_and.accumulate(arrival[:-1]
+                                                >= ready[order]))
+    if not on_time.any():
+        return -1, np.inf
+
+    added = np.where(on_time, added, np.inf)
+    i = int(np.argmin(added))
+    return i, float(added[i])
+
+
+def build_route(stops, distances, depart_minutes, pace, deadlines, start=0,
+                ready=None):
+    """Returns a route (node indices starting at the start node) made by
+    inserting the stops one by one, earliest deadline first and farthest
+    from the start first among stops with the same deadline, each where it
+    makes the route the least longer without making any stop late.
+
+    Stops with a ready time are inserted after all of the others, latest
+    ready time last, since they can only go where the route has already
+    taken long enough. A stop that can't go anywhere on time goes where it
+    makes the route the least longer, and the route will be late.
+
+    Time complexity: O(n^2)
+        * n = stops
+    """
+
+    stops = np.asarray(stops, dtype=np.intp)
+    ready_times = (np.full(len(stops), -np.inf) if ready is None
+                   else ready[stops])
+    keys = np.lexsort((-distances[start, stops], deadlines[stops],
+                       ready_times))
+    order = np.array([start], dtype=np.intp)
+
+    for node in stops[keys].tolist():
+        schedule = get_schedule(order, distances, depart_minutes, pace,
+                                deadlines, ready)
+        i, _ = get_insertion(order, node, distances, schedule, pace,
+                             deadlines, ready)
+        if i == -1:
+            after = np.roll(order, -1)
+            i = int(np.argmin(distances[order, node] + distances[node, after]
+                              - distances[order, after]))
+        order = np.insert(order, i + 1, node)
+
+    return order
+
+
+def try_relocate(order, distances, depart_minutes, pace, deadlines,
+                 ready=None):
+    """Looks for a stop that can be moved somewhere else in the route to make
+    it shorter without making any stop late, and returns the new route, or
+    None if there is none.
+
+    Taking a stop out only makes the stops after it earlier, so the rest of
+    the route is always before its deadlines, and the stop is then put back
+    with get_insertion(), which also checks the ready times.
+
+    Time complexity: O(n^2)
+        * n = order
+    """
+
+    n = len(order)
+    for k in range(1, n):
+        node = order[k]
+        previous_node = order[k - 1]
+        next_node = order[(k + 1) % n]
+        saved = (distances[previous_node, node] + distances[node, next_node]
+                 - distances[previous_node, next_node])
+        if saved <= EPSILON:
+            continue
+
+        rest = np.delete(order, k)
+        schedule = get_schedule(rest, distances, depart_minutes, pace,
+                                deadlines, ready)
+        i, added = get_insertion(rest, node, distances, schedule, pace,
+                                 deadlines, ready)
+        if i != -1 and added < saved - EPSILON:
+            return np.insert(rest, i + 1, node)
+
+    return None
+
+
+def try_two_opt(order, distances, depart_minutes, pace, deadlines,
+                ready=None):
+    """Looks for a segment of the route that can be reversed to make it
+    shorter without making any stop late, and returns the new route, or None
+    if there is none.
+
+    Reversing the stops from position i + 1 to j replaces the edges
+    (a, b) = (order[i], order[i + 1]) and (c, d) = (order[j], order[j + 1])
+    with (a, c) and (b, d). With cum[k] the distance driven up to position k:
+    - The stop at position k in the segment is then reached at
+      arrival[i] + pace * (d(a, c) + cum[j] - cum[k]), so the segment is on
+      time if arrival[i] + pace * (d(a, c) + cum[j]) is at most the smallest
+      deadline[k] + pace * cum[k] in it. That minimum is kept as a running
+      minimum over j. Likewise, the segment is ready if that same minute is
+      at least the largest ready[k] + pace * cum[k] in it.
+    - Every stop after the segment is reached later by the added distance,
+      which slack[j + 1] and early[j + 1] check.
+    Every j is checked at once for each i.
+
+    Time complexity: O(n^2)
+        * n = order
+    """
+
+    n = len(order)
+    if n < 4:
+        return None
+
+    closed = np.append(order, order[0])
+    arrival, slack, early = get_schedule(order, distances, depart_minutes,
+                                         pace, deadlines, ready)
+    cum = (arrival - depart_minutes) / pace
+    latest = deadlines[closed] + pace * cum
+    earliest = (np.full(len(closed), -np.inf) if ready is None
+                else ready[closed] + pace * cum)
+
+    for i in range(n - 2):
+        a = closed[i]
+        b = closed[i + 1]
+        js = np.arange(i + 2, n)
+        c = closed[js]
+        d = closed[js + 1]
+        delta = (distances[a, c] + distances[b, d]
+                 - distances[a, b] - distances[c, d])
+        segment_latest = np.minimum.accumulate(latest[i + 1:n])[1:]
+        segment_earliest = np.maximum.accumulate(earliest[i + 1:n])[1:]
+        start = arrival[i] + pace * (distances[a, c] + cum[js])
+        on_time = ((start <= segment_latest)
+                   & (start >= segment_earliest)
+                   & (pace * delta <= slack[js + 1])
+                   & (pace * delta >= -early[js + 1]))
+        delta = np.where(on_time, delta, np.inf)
+        best = int(np.argmin(delta))
+        if delta[best] < -EPSILON:
+            j = int(js[best])
+            return np.concatenate([order[:i + 1], order[i + 1:j + 1][::-1],
+                                   order[j + 1:]])
+
+    return None
+
+
+def improve_with_deadlines(order, distances, depart_minutes, pace, deadlines,
+                           max_moves=10000, ready=None):
+    """Improves a route with relocation and 2-opt moves that keep every stop
+    on time, until neither can shorten it (or after max_moves moves), and
+    returns the new route.
+
+    Stops that are already late (or early) would have a negative slack and
+    block every move, so their deadlines (or ready times) are left out: the
+    moves keep every other stop on time, and never make more stops late.
+
+    Time complexity: O(m*n^2)
+        * m = moves applied
+        * n = order
+    """
+
+    arrival, _, _ = get_schedule(order, distances, depart_minutes, pace,
+                                 deadlines)
+    late = arrival[:-1] > deadlines[order]
+    if late.any():
+        deadlines = deadlines.copy()
+        deadlines[order[late]] = np.inf
+    if ready is not None:
+        early = arrival[:-1] < ready[order]
+        if early.any():
+            ready = ready.copy()
+            ready[order[early]] = -np.inf
+
+    for _ in range(max_moves):
+        improved = try_relocate(order, distances, depart_minutes, pace,
+                                deadlines, ready)
+        if improved is None:
+            improved = try_two_opt(order, distances, depart_minutes, pace,
+                                   deadlines, ready)
+        if improved is None:
+            break
+        order = improved
+
+    return order
+
+
+def solve_with_deadlines(stops, distance_graph, places, deadlines,
+                         depart_minutes=480, speed=18, initial=None,
+                         ready=None):
+    """Returns a short Tour of the IDs of the stops (see classes/tour.py),
+    starting at the hub, that reaches as many stops as possible before their
+    deadline, and every one of them if the initial tour does.
+
+    deadlines is an array of minutes indexed by place ID (see
+    get_deadline_minutes() in tour_evaluation.py), depart_minutes is when
+    the truck leaves the hub, and speed is its speed in miles per hour.
+    initial is an optional route to start from, as a list of place IDs in
+    visiting order (such as the route of the deadline groups); it is tried in
+    both directions. ready is an optional array of the ready time of each
+    stop, in minutes indexed by place ID (see get_ready_minutes() in
+    delivery.py). See the top of this module for the steps of the solver.
+
+    Time complexity: O(m*n^2)
+        * m = moves applied
+        * n = stops
+    """
+
+    hub = places.get(places.address_to_place("HUB"))  # Node 0
+    nodes = [hub] + sorted(stop for stop in stops if stop is not hub)
+    ids = np.array([node.id for node in nodes], dtype=np.intp)
+    if len(nodes) < 3:
+        return Tour(ids)
+
+    distances = np.asarray(get_distances_between(nodes, distance_graph),
+                           dtype=np.float64)
+    local_deadlines = np.asarray(deadlines, dtype=np.float64)[ids]
+    local_deadlines[0] = np.inf
+    local_ready = None
+    if ready is not None:
+        local_ready = np.asarray(ready, dtype=np.float64)[ids]
+        local_ready[0] = -np.inf
+    pace = 60 / speed
+
+    # 1) The routes to start from, in both directions.
+    built = build_route(np.arange(1, len(nodes)), distances, depart_minutes,
+                        pace, local_deadlines, ready=local_ready)
+    starts = [built]
+    if initial is not None:
+        positions = {place_id: i for i, place_id in enumerate(ids.tolist())}
+        order = Tour([positions[place_id] for place_id in initial]).rotate(0)
+        starts.append(order.order)
+    starts += [np.concatenate([[0], order[1:][::-1]]) for order in starts]
+
+    # 2) and 3) With ready times, each route is also improved with its
+    #    deadlines alone (the truck may then wait), and kept as it is.
+    candidates = []
+    for order in starts:
+        candidates.append(improve_with_deadlines(
+            order, distances, depart_minutes, pace, local_deadlines,
+            ready=local_ready))
+        if local_ready is not None:
+            candidates += [improve_with_deadlines(
+                order, distances, depart_minutes, pace, local_deadlines),
+                order]
+
+    best = None
+    for order in candidates:
+        late = count_late(order, distances, depart_minutes, pace,
+                          local_deadlines, local_ready)
+        length = evaluate_tours(order, distances)[0][0]
+        if best is None or (late, length) < best[:2]:
+            best = (late, length, order)
+
+    return Tour(ids[best[2]])
@@ -6,10 +6,22 @@ packages that go in each truck.
 import heapq
 from itertools import zip_longest
 
+import numpy as np
+
+from classes.distance_matrix import DistanceMatrix
 from classes.timemod import TimeMod
 from classes.package_hash import PackageHash
 from classes.places_hash import PlacesHash
+from classes.tour import Tour
 from classes.truck import Truck
+from tour_evaluation import to_minutes
+
+# The "wrong address" package, the time at which its address gets corrected, 
+# and its correct address. The assignment gives them, not any document that 
+# we can parse.
+WRONG_ADDRESS_PACKAGE = 9
+ADDRESS_UPDATE_TIME = TimeMod(10, 20)
+CORRECT_ADDRESS = "410 S State St"
 
 
 def print_truck_contents(trucks: list):
@@ -92,11 +104,12 @@ def load_trucks(trucks: list, packages: PackageHash,
     As it is, this function does not account for having more than two trucks 
     in use, so future developers would have to heavily edit this function to 
     make it work with their trucks if they plan to use more than two at a 
-    time. In addition, "wrong address" packages are simply added to the late 
-    truck because it's the assignment that specifies when the address will 
-    change, not any document that we can parse. The logic for this would need 
-    to change if the time at which the address gets updated appeared in a 
-    document we could parse.
+    time (plan_fleet() in savings_router.py loads and routes a fleet of any 
+    size, but does not read the notes). In addition, "wrong address" 
+    packages are simply added to the late truck because it's the assignment 
+    that specifies when the address will change, not any document that we 
+    can parse. The logic for this would need to change if the time at which 
+    the address gets updated appeared in a document we could parse.
     """
 
     # deliver_together will contain sets with the IDs of the linked packages.
@@ -225,6 +238,35 @@ def load_trucks(trucks: list, packages: PackageHash,
             packages_to_deliver.remove(package) 
 
 
+def is_misaddressed(package):
+    """Returns true if the package is the "wrong address" package and its 
+    address has not been corrected yet."""
+
+    return (package.id == WRONG_ADDRESS_PACKAGE 
+            and package.address != CORRECT_ADDRESS)
+
+
+def get_ready_minutes(packages: list, places: PlacesHash, size: int):
+    """Returns an array with the earliest minute (since midnight) at which 
+    the truck can reach each place and deliver all of its packages, indexed 
+    by place ID.
+
+    The correct address of the "wrong address" package can only be reached 
+    once the address is corrected, if the package is in packages. Every 
+    other place can be reached at any time (minus infinity).
+
+    Time complexity: O(n + p)
+        * n = size
+        * p = packages
+    """
+
+    ready = np.full(size, -np.inf)
+    if any(is_misaddressed(package) for package in packages):
+        place_id = places.address_to_place(CORRECT_ADDRESS).id
+        ready[place_id] = to_minutes(ADDRESS_UPDATE_TIME)
+    return ready
+
+
 def get_delivery_details(packages: list, places: PlacesHash):
     """Determines which places the truck needs to visit to deliver all of its 
     packages. 
@@ -236,6 +278,10 @@ def get_delivery_details(packages: list, places: PlacesHash):
     efficient route for each of these groups and assemble them together to 
     make the full route. This function returns a tuple with a list of the 
     routes and a dictionary that helps tie each package to a Place object.
+
+    The "wrong address" package is tied to the place it is listed with until 
+    deliver_packages() corrects its address, but the truck needs to drive 
+    to its correct address, so that is the place that goes in its route.
     """
 
     hub = places.get(places.address_to_place("HUB"))
@@ -248,6 +294,11 @@ def get_delivery_details(packages: list, places: PlacesHash):
     for package in packages:
         destination = places.get(places.address_to_place(package.address))
         deadline = package.deadline.time_to_str()
+        if is_misaddressed(package):
+            where_to_deliver.setdefault(destination, []).append(package)
+            destination = places.get(places.address_to_place(
+                CORRECT_ADDRESS))
+            where_to_deliver.setdefault(destination, [])
 
         # 2) Set each package into the route that corresponds with its 
         #    deadline.
@@ -256,7 +307,8 @@ def get_delivery_details(packages: list, places: PlacesHash):
         else:
             routes[deadline] = {destination}
 
-        where_to_deliver.setdefault(destination, []).append(package)
+        if not is_misaddressed(package):
+            where_to_deliver.setdefault(destination, []).append(package)
 
     # Sorting the keys so that routes_list is also sorted based on package 
     # deadlines, despite routes_list not having that information.
@@ -279,108 +331,132 @@ def get_delivery_details(packages: list, places: PlacesHash):
     return routes_list, where_to_deliver
 
 
-def connect_paths(route1: dict, route2: dict, distances: list, 
-                  places: PlacesHash):
-    """Connects the routes with different delivery deadlines together.
-    
-    After each of the groups in routes_list returned by get_delivery_details() 
-    are put through christofides(), they need to be connected together to make 
-    up the full route for the delivery. We do this by finding the shortest 
-    path between the nodes that need to be reconnected (the hub and two of the 
-    places to which it is connected). If there is only one place connected to 
-    the hub in one of the groups, simply integrate it into the larger route. 
-    This function returns the merged route.
+def get_distances(origin_ids, destination_ids, distances):
+    """Returns the distances between each origin and its destination as a 
+    NumPy array. The arrays of IDs are broadcast against each other, like in 
+    DistanceMatrix.pairs().
+
+    Time complexity: O(n)
+        * n = size of the broadcast arrays
     """
-    
+
+    origin_ids = np.asarray(origin_ids, dtype=np.intp)
+    destination_ids = np.asarray(destination_ids, dtype=np.intp)
+    if isinstance(distances, DistanceMatrix):
+        return distances.pairs(origin_ids, destination_ids)
+    return np.asarray(distances, dtype=np.float64)[origin_ids, 
+                                                   destination_ids]
+
+
+def chain_routes(routes: list, distances, places: PlacesHash, cuts=4):
+    """Chains the routes of the deadline groups into the full route, in the 
+    order of the groups.
+
+    Each route from get_delivery_details() and christofides() is a circuit 
+    through the hub. Without the hub, the places of a group form a circuit 
+    of their own, which can be cut open at any of its edges and driven in 
+    either direction. The full route leaves the hub, drives the path of each 
+    group in turn, and comes back to the hub. For each group, the best of 
+    the following ways to drive it is picked:
+    1) Cut the circuit where the hub was, or at one of its cuts - 1 longest 
+       edges, and drive the path forwards or backwards. Each way has an 
+       entry, an exit, and the length of the path.
+    2) Going through the groups in order, the shortest chain that ends with 
+       each way of driving a group is the shortest chain up to the previous 
+       group plus the distance from its exit to the entry, plus the path.
+       The distances between the exits of a group and the entries of the 
+       next one are read all at once.
+    3) Close the chain back at the hub, and follow the best ways back from 
+       the last group to the first.
+    A place that is in more than one group is only visited with the first 
+    of them. This function returns the full route as a {Place: set()} 
+    graph.
+
+    Time complexity: O(n + g*c^2)
+        * n = places in all of the routes
+        * g = routes
+        * c = cuts
+    """
+
     hub = places.get(places.address_to_place("HUB"))
-    r1_connections = list(route1[hub])
-    r2_connections = list(route2[hub])
-    minimum = 1000
-
-    # 1) Determine whether there is only one connection in either of the 
-    #    routes
-    if len(r1_connections) < 2:
-        stray = r1_connections[0]
-        # Assign x and y according to which distance between the stray node 
-        # and the other hub connections is smaller.
-        if (distances[stray.id][r2_connections[0].id] 
-            < distances[stray.id][r2_connections[1].id]):
-            x = r2_connections[0]
-            y = r2_connections[1]
-        else:
-            x = r2_connections[1]
-            y = r2_connections[0]
-
-        # Simply add the node to the existing dict.
-        route2[hub].remove(x)
-        route2[x].remove(hub)
-        route2[x].add(stray)
-        route1[stray].add(x)
-
-    elif len(r2_connections) < 2:
-        stray = r2_connections[0]
-        if (distances[stray.id][r1_connections[0].id] 
-            < distances[stray.id][r1_connections[1].id]):
-            x = r1_connections[0]
-            y = r1_connections[1]
-        else:
-            x = r1_connections[1]
-            y = r1_connections[0]
+    by_id = {hub.id: hub}
+    paths = []
 
-        route1[hub].remove(x)
-        route1[x].remove(hub)
-        route2[x].add(stray)
-        route2[stray].add(x)
-        
-    # 2) If not, compare the distances between the nodes that connect to the 
-    #    hub in the two lists.
-    else:
-        for i in range(4):
-            j = 0
-            if i >= 2:
-                j = 1
-            r1 = r1_connections[j]      # Connection to the hub from route1
-            r2 = r2_connections[i % 2]  # Connection to the hub from route2
-            
-            if distances[r1.id][r2.id] < minimum:
-                minimum = distances[r1.id][r2.id]
-
-                # r1 and r2 may not have the values that align with the 
-                # minimum distance by the end of the loop, so we need new 
-                # variables.
-                x = r1 
-                y = r2
-
-        # 2) Connect the nodes from the two different routes that have the 
-        #    least distance between them.
-        route1[hub].remove(x)
-        route2[hub].remove(y)
-
-        route1[x].remove(hub)
-        route1[x].add(y)
-
-        route2[y].remove(hub)
-        route2[y].add(x)
-
-    # Merge the connections of the hub in each route
-    route1[hub].update(route2[hub])
-    # Merge the two dictionaries
-    route2.update(route1)
-    
-    return route2
+    # Take the hub out of each circuit, and the places that were already 
+    # visited with an earlier group.
+    for route in routes:
+        if len(route) < 2:
+            continue
+        order = [place_id for place_id in Tour.from_graph(route, hub)
+                 if place_id not in by_id]
+        by_id.update((place.id, place) for place in route)
+        if order:
+            paths.append(np.array(order, dtype=np.intp))
+    if not paths:
+        return {hub: set()}
+
+    # 1) The entry, exit, and length of each way of driving each group. 
+    #    Cutting before position i drives path[i:] + path[:i].
+    ways = []
+    for path in paths:
+        edges = get_distances(np.roll(path, 1), path, distances)
+        cut_at = np.unique(np.concatenate(
+            [[0], np.argsort(-edges, kind="stable")[:cuts - 1]]))
+        lengths = edges.sum() - edges[cut_at]
+        entries = np.concatenate([path[cut_at], path[cut_at - 1]])
+        exits = np.concatenate([path[cut_at - 1], path[cut_at]])
+        ways.append((cut_at, entries, exits, np.tile(lengths, 2)))
+
+    # 2) The shortest chain that ends with each way of driving each group.
+    _, entries, _, lengths = ways[0]
+    chain = get_distances(hub.id, entries, distances) + lengths
+    previous_ways = []
+    for (_, _, exits, _), (_, entries, _, lengths) in zip(ways, ways[1:]):
+        totals = chain[:, None] + get_distances(exits[:, None], 
+                                                entries[None, :], distances)
+        best = np.argmin(totals, axis=0)
+        previous_ways.append(best)
+        chain = totals[best, np.arange(len(entries))] + lengths
+
+    # 3) Close the chain at the hub and follow it back.
+    _, _, exits, _ = ways[-1]
+    way = int(np.argmin(chain + get_distances(exits, hub.id, distances)))
+    picked = [way]
+    for best in reversed(previous_ways):
+        way = int(best[way])
+        picked.append(way)
+    picked.reverse()
+
+    full_tour = [hub.id]
+    for path, (cut_at, _, _, _), way in zip(paths, ways, picked):
+        cut = cut_at[way % len(cut_at)]
+        driven = np.roll(path, -cut)
+        if way >= len(cut_at):
+            driven = driven[::-1]
+        full_tour.extend(driven.tolist())
+
+    return Tour(full_tour).to_graph(by_id)
     
 
 def deliver_packages(route: dict, where_to_deliver: dict, 
                      distances: list, truck: Truck, 
-                     places: PlacesHash, delivery_time_info: list):
+                     places: PlacesHash, delivery_time_info: list, 
+                     first_place=None):
     """Visits each place in the delivery route, unloads the necessary 
     packages, and shows update messages at each stop.
 
+    The truck starts with first_place if it is given (it must be connected 
+    to the hub), and otherwise with the place next to the hub that has the 
+    earliest deadline.
+
     Once again, the logic that handles packages with a wrong address is 
     simplified because we already know which package it is and at what time 
     its address gets updated. Future developers would need to change that 
     logic if they did not know what packages have a wrong address and at what 
-    time their addresses are updated.
+    time their addresses are updated. The package is never unloaded at the 
+    address it is listed with, and if the truck reaches its correct address 
+    before the address is corrected, the truck waits there until it is (see 
+    get_ready_minutes() and deadline_route.py).
     """
 
     current_time = truck.depart_time
@@ -390,14 +466,17 @@ def deliver_packages(route: dict, where_to_deliver: dict,
 
     # 1) Find the node that will start the priority path (earliest deadline)
     minimum = TimeMod(23, 59)
-    for i, connection in enumerate(route[previous_place]):
-        for package in where_to_deliver[connection]:
-            if package.deadline < minimum:
-                minimum = package.deadline
+    if first_place is not None:
+        current_place = first_place
+    else:
+        for i, connection in enumerate(route[previous_place]):
+            for package in where_to_deliver[connection]:
+                if package.deadline < minimum:
+                    minimum = package.deadline
+                    current_place = connection
+            # If both connections have EOD as their deadlines
+            if i == len(route[previous_place]) - 1 and current_place is None:
                 current_place = connection
-        # If both connections have EOD as their deadlines
-        if i == len(route[previous_place]) - 1 and current_place is None:
-            current_place = connection
             
     for place in route[current_place]:
         if place.id != 0:
@@ -405,15 +484,15 @@ def deliver_packages(route: dict, where_to_deliver: dict,
             break
     
     # For the "wrong address" package 
-    if truck.has_package(9):
-        change_address = True
-    else:
-        change_address = False
+    change_address = (truck.has_package(WRONG_ADDRESS_PACKAGE) 
+                      and is_misaddressed(
+                          truck.get_package(WRONG_ADDRESS_PACKAGE)))
+    correct_place = places.get(places.address_to_place(CORRECT_ADDRESS))
 
     while current_place.id != 0:
         print(f"At place with ID {current_place.id}")
         # 2) Add distance to total_distance
-        distance = distances[previous_place.id][current_place.id]
+        distance = distances[previous_place.id, current_place.id]
         total_distance +=  distance
 
         # 3) Translate distance to time
@@ -421,20 +500,33 @@ def deliver_packages(route: dict, where_to_deliver: dict,
         temp.distance_to_time(distance, truck.speed)
         current_time = current_time.add_time(temp)
 
+        # Wait at the correct address of the "wrong address" package until 
+        # the address is corrected.
+        if (change_address and current_place is correct_place 
+            and current_time < ADDRESS_UPDATE_TIME):
+            print("Waiting for the address of package "
+                  f"{WRONG_ADDRESS_PACKAGE} to be corrected.")
+            current_time = ADDRESS_UPDATE_TIME
+
         # Update the address of the "wrong address" package
-        if current_time >= TimeMod(10, 20) and change_address:
-            package_to_change = truck.get_package(9)
+        if current_time >= ADDRESS_UPDATE_TIME and change_address:
+            package_to_change = truck.get_package(WRONG_ADDRESS_PACKAGE)
             old_place = places.address_to_place(package_to_change.address)
             where_to_deliver[old_place].remove(package_to_change)
 
-            package_to_change.address = "410 S State St"
+            package_to_change.address = CORRECT_ADDRESS
             new_place = places.address_to_place(package_to_change.address)
-            where_to_deliver[new_place].append(package_to_change)
+            where_to_deliver.setdefault(new_place, []).append(
+                package_to_change)
             
             change_address = False
 
-        # 4) Unload packages
-        packages = where_to_deliver[current_place]
+        # 4) Unload packages, except the "wrong address" package before its 
+        #    address is corrected.
+        packages = [package for package 
+                    in where_to_deliver.get(current_place, []) 
+                    if not (change_address 
+                            and package.id == WRONG_ADDRESS_PACKAGE)]
         for package in packages:
             print(f"Unloading package with ID {package.id}.")
             truck.unload_package(package)
@@ -463,7 +555,7 @@ def deliver_packages(route: dict, where_to_deliver: dict,
         
     # We also need to count the distance and time taken by the truck to return 
     # to the warehouse
-    distance = distances[previous_place.id][current_place.id]
+    distance = distances[previous_place.id, current_place.id]
     total_distance +=  distance
     temp = TimeMod()
     temp.distance_to_time(distance, truck.speed)
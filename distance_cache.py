@@ -0,0 +1,192 @@
+"""
+Contains the functions that compile the distance table into a binary cache and
+load it back without parsing the csv file.
+
+The cache file has the following layout:
+1) A fixed-size header with a magic string, the format version, the number of
+   places, how the matrix is stored (full or condensed, and its encoding), the
+   SHA-256 checksum of the csv file it was compiled from, the size of the
+   place table, and the offset at which the matrix starts.
+2) The place table: a UTF-8 JSON list with the name and address of each
+   place, in ID order.
+3) The stored distances of the matrix as raw little-endian values, aligned
+   to 64 bytes so that they can be memory-mapped directly.
+
+The k-nearest-neighbour index of the places (see classes/neighbour_index.py)
+is cached in a separate file next to it, with its own header (magic string,
+format version, number of places, k, checksum of the csv file, and offset of
+the index) followed by the neighbour IDs as little-endian int32 values.
+"""
+
+import hashlib
+import json
+import struct
+
+import numpy as np
+
+from classes.place import Place
+from classes.distance_matrix import ENCODINGS, DistanceMatrix
+from classes.neighbour_index import NeighbourIndex
+
+MAGIC = b"WGUPSDM\0"
+VERSION = 2
+# magic, version, place count, condensed flag, encoding, checksum, place table
+# size, matrix offset
+HEADER = struct.Struct("<8sIIHH32sQQ")
+# The encoding is stored as its position in this tuple.
+ENCODING_CODES = tuple(ENCODINGS)
+ALIGNMENT = 64
+
+NEIGHBOUR_MAGIC = b"WGUPSNN\0"
+NEIGHBOUR_VERSION = 1
+# magic, version, place count, k, checksum, index offset
+NEIGHBOUR_HEADER = struct.Struct("<8sIII32sQ")
+
+
+def file_checksum(file_path: str):
+    """Returns the SHA-256 checksum of a file.
+
+    Time complexity: O(n)
+        * n = size of the file
+    """
+
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 16), b''):
+            sha.update(block)
+    return sha.digest()
+
+
+def write_distance_cache(cache_path: str, checksum: bytes, place_list: list,
+                         matrix: DistanceMatrix):
+    """Writes the places and their distance matrix to a binary cache file.
+
+    Time complexity: O(n^2)
+        * n = place_list
+    """
+
+    place_table = json.dumps(
+        [[place.name, place.address] for place in place_list]).encode()
+    matrix_offset = HEADER.size + len(place_table)
+    # Pad the place table so that the matrix starts at an aligned offset.
+    padding = -matrix_offset % ALIGNMENT
+    matrix_offset += padding
+
+    with open(cache_path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(place_list),
+                               matrix.condensed,
+                               ENCODING_CODES.index(matrix.encoding),
+                               checksum, len(place_table), matrix_offset))
+        file.write(place_table)
+        file.write(b"\0" * padding)
+        file.write(matrix.data.astype(matrix.data.dtype.newbyteorder('<'),
+                                      copy=False).tobytes())
+
+
+def read_distance_cache(cache_path: str, checksum: bytes, condensed=False,
+                        encoding="float64"):
+    """Returns the places and a memory-mapped distance matrix from a binary
+    cache file.
+
+    The matrix is not read into memory: its pages are loaded by the operating
+    system the first time they are accessed. Raises FileNotFoundError if the
+    cache does not exist and ValueError if it is corrupt, was compiled from a
+    different version of the csv file, or stores the matrix in a different
+    layout or encoding than the one requested.
+
+    Time complexity: O(n)
+        * n = number of places in the cache
+    """
+
+    with open(cache_path, 'rb') as file:
+        header = file.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError(f"{cache_path} is not a distance cache.")
+
+        (magic, version, place_count, cached_condensed, encoding_code,
+         cached_checksum, table_size, matrix_offset) = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{cache_path} is not a distance cache or was "
+                             "written by an unsupported version.")
+        if cached_checksum != checksum:
+            raise ValueError(f"{cache_path} is stale, the distance table has "
+                             "changed since it was compiled.")
+        if (bool(cached_condensed) != condensed
+            or encoding_code >= len(ENCODING_CODES)
+            or ENCODING_CODES[encoding_code] != encoding):
+            raise ValueError(f"{cache_path} does not store the distances in "
+                             "the requested layout.")
+
+        place_table = json.loads(file.read(table_size).decode())
+
+    places = [Place(place_id, name, address)
+              for place_id, (name, address) in enumerate(place_table)]
+    if condensed:
+        shape = (place_count * (place_count - 1) // 2,)
+    else:
+        shape = (place_count, place_count)
+    dtype = np.dtype(ENCODINGS[encoding][0]).newbyteorder('<')
+    data = np.memmap(cache_path, dtype=dtype, mode='r', offset=matrix_offset,
+                     shape=shape)
+
+    return places, DistanceMatrix(data, condensed, encoding, place_count,
+                                  checksum)
+
+
+def write_neighbour_cache(cache_path: str, checksum: bytes,
+                          index: NeighbourIndex):
+    """Writes the k-nearest-neighbour index of the places to a binary cache
+    file.
+
+    Time complexity: O(n*k)
+        * n = places in the index
+        * k = neighbours of each place
+    """
+
+    index_offset = NEIGHBOUR_HEADER.size
+    padding = -index_offset % ALIGNMENT
+    index_offset += padding
+
+    with open(cache_path, 'wb') as file:
+        file.write(NEIGHBOUR_HEADER.pack(NEIGHBOUR_MAGIC, NEIGHBOUR_VERSION,
+                                         index.size, index.k, checksum,
+                                         index_offset))
+        file.write(b"\0" * padding)
+        file.write(index.neighbours.astype('<i4', copy=False).tobytes())
+
+
+def read_neighbour_cache(cache_path: str, checksum: bytes, k: int):
+    """Returns a memory-mapped k-nearest-neighbour index from a binary cache
+    file.
+
+    Raises FileNotFoundError if the cache does not exist and ValueError if
+    it is corrupt, was compiled from a different version of the csv file, or
+    keeps a different number of neighbours than the k requested.
+
+    Time complexity: O(1)
+    """
+
+    with open(cache_path, 'rb') as file:
+        header = file.read(NEIGHBOUR_HEADER.size)
+    if len(header) < NEIGHBOUR_HEADER.size:
+        raise ValueError(f"{cache_path} is not a neighbour cache.")
+
+    (magic, version, place_count, cached_k, cached_checksum,
+     index_offset) = NEIGHBOUR_HEADER.unpack(header)
+    if magic != NEIGHBOUR_MAGIC or version != NEIGHBOUR_VERSION:
+        raise ValueError(f"{cache_path} is not a neighbour cache or was "
+                         "written by an unsupported version.")
+    if cached_checksum != checksum:
+        raise ValueError(f"{cache_path} is stale, the distance table has "
+                         "changed since it was compiled.")
+    if cached_k != min(k, max(place_count - 1, 0)):
+        raise ValueError(f"{cache_path} does not keep {k} neighbours for "
+                         "each place.")
+
+    if place_count * cached_k == 0:
+        return NeighbourIndex(np.zeros((place_count, cached_k),
+                                       dtype=np.int32))
+    neighbours = np.memmap(cache_path, dtype='<i4', mode='r',
+                           offset=index_offset,
+                           shape=(place_count, cached_k))
+    return NeighbourIndex(neighbours)
@@ -0,0 +1,123 @@
+"""
+Contains the Held-Karp algorithm, which finds the shortest route through a
+small group of places exactly.
+
+Most deadline groups only have a handful of places, and for those the
+shortest route can be found by dynamic programming over subsets of places
+instead of approximating it with christofides(). With the start node fixed,
+let cost[S][j] be the length of the shortest path that leaves the start,
+visits every node in the set S exactly once, and ends at node j (in S). Then:
+1) cost[{j}][j] = d(start, j)
+2) cost[S][j] = min over i in S - {j} of cost[S - {j}][i] + d(i, j)
+3) The shortest route is the min over j of cost[all][j] + d(j, start).
+The route itself is rebuilt backwards by remembering which i gave each
+minimum.
+
+Each set is stored as a bitmask of the nodes other than the start, so the
+table is a single (2^(n-1)) x (n-1) NumPy array of lengths, with a table of
+the same shape holding the node that came before (as int8). Step 2 is done
+for every set of the same size at once with NumPy. It takes O(2^n*n^2) time
+and O(2^n*n) memory, which is fine up to around 16 places.
+"""
+
+import numpy as np
+
+from christofides import get_distances_between, tour_to_graph
+
+# Groups with at most this many places are routed exactly (see plan_route()
+# in route_templates.py). 15 places take around 20 milliseconds.
+HELD_KARP_LIMIT = 15
+# The largest group held_karp_tour() accepts, since its tables double in size
+# with every place.
+HELD_KARP_MAX = 20
+
+
+def held_karp_tour(distances, start=0):
+    """Returns the shortest tour of the nodes as a list of node indices that
+    starts at the start node, along with its length.
+
+    distances is a square matrix (a NumPy array or a list of lists) with the
+    distance between every pair of nodes, indexed from 0. Raises ValueError if
+    there are more than HELD_KARP_MAX nodes.
+
+    Time complexity: O(2^n*n^2)
+        * n = distances
+    """
+
+    distances = np.asarray(distances, dtype=np.float64)
+    n = len(distances)
+    if n > HELD_KARP_MAX:
+        raise ValueError(f"Held-Karp can only route up to {HELD_KARP_MAX} "
+                         "places.")
+    if n <= 3:
+        tour = list(range(n))
+        tour = tour[start:] + tour[:start]
+        length = sum(distances[tour[i - 1], tour[i]] for i in range(n))
+        return tour, float(length)
+
+    # The other nodes are numbered 0 to m - 1 in the bitmasks.
+    others = [node for node in range(n) if node != start]
+    m = len(others)
+    d = distances[np.ix_(others, others)]
+    from_start = distances[start, others]
+    to_start = distances[others, start]
+
+    full = (1 << m) - 1
+    cost = np.full((full + 1, m), np.inf)
+    previous = np.full((full + 1, m), -1, dtype=np.int8)
+
+    # 1) Paths that only visit one node.
+    singles = 1 << np.arange(m)
+    cost[singles, np.arange(m)] = from_start
+
+    # Every set of nodes, grouped by how many nodes they have.
+    masks = np.arange(full + 1)
+    sizes = np.zeros(full + 1, dtype=np.int64)
+    for bit in range(m):
+        sizes += (masks >> bit) & 1
+
+    # 2) Grow the paths one node at a time.
+    for size in range(2, m + 1):
+        layer = masks[sizes == size]
+        for j in range(m):
+            with_j = layer[(layer >> j) & 1 == 1]
+            before = cost[with_j ^ (1 << j)] + d[:, j]
+            best = np.argmin(before, axis=1)
+            cost[with_j, j] = before[np.arange(len(with_j)), best]
+            previous[with_j, j] = best
+
+    # 3) Close the tour back at the start.
+    totals = cost[full] + to_start
+    last = int(np.argmin(totals))
+    length = float(totals[last])
+
+    tour = []
+    mask = full
+    while last != -1:
+        tour.append(others[last])
+        mask, last = mask ^ (1 << last), int(previous[mask, last])
+    tour.append(start)
+    tour.reverse()
+
+    return tour, length
+
+
+def held_karp(places_list, distance_graph, places):
+    """Returns the shortest route through the places as a {Place: set()}
+    graph, starting and ending at the hub, in the same format as
+    christofides().
+
+    Time complexity: O(2^n*n^2)
+        * n = places_list
+    """
+
+    nodes = sorted(places_list)
+    if not nodes:
+        return {}
+
+    hub = places.get(places.address_to_place("HUB"))  # Node 0
+    start = nodes.index(hub) if hub in nodes else 0
+    distances = get_distances_between(nodes, distance_graph)
+    tour, _ = held_karp_tour(distances, start)
+
+    return tour_to_graph([nodes[i] for i in tour])
@@ -0,0 +1,446 @@
+"""
+Contains the functions that improve a finished route with local search.
+
+The routes that come out of christofides() and chain_routes() can usually be
+shortened by small changes. This module uses two kinds of moves:
+- 2-opt removes two edges of the route and reconnects it the other way
+  around, which reverses the segment between them. This untangles routes
+  that cross themselves.
+- Or-opt moves a segment of one to three consecutive places to a different
+  spot in the route, optionally reversing it.
+- Lin-Kernighan-style moves chain several 2-opt swaps together, so that the
+  route can get past swaps that only pay off in combination. They are meant
+  for large routes where 2-opt quickly runs out of improvements.
+
+Checking every possible move takes O(n^2) time per pass. Instead, each place
+only considers moves that connect it to one of its k nearest neighbours (a
+shorter route almost always connects places that are close to each other),
+and places whose surroundings have not changed since they last failed to find
+an improving move are skipped ("don't-look bits"). Each pass then takes close
+to O(n*k) time.
+
+Routes are improved as a Tour (see classes/tour.py) of local indices into the
+distances between the places in the route, which is much faster to work with
+than the {Place: set()} graph used by the rest of the program.
+"""
+
+import time
+from collections import deque
+
+import numpy as np
+
+from christofides import get_distances_between
+from classes.candidate_distances import CandidateDistances
+from classes.tour import Tour
+
+# Improvements smaller than this are ignored to avoid looping forever over
+# floating-point rounding errors.
+EPSILON = 1e-9
+
+
+def graph_to_tour(route: dict, start):
+    """Returns the places of a {Place: set()} route in the order in which
+    they are visited, starting at the start place.
+
+    Time complexity: O(n)
+        * n = route
+    """
+
+    tour = [start]
+    previous_place = None
+    current_place = start
+    while len(tour) < len(route):
+        for destination in route[current_place]:
+            if destination != previous_place and destination != start:
+                break
+        else:
+            # Only possible with routes that are not a single circuit.
+            raise ValueError("The route does not visit every place once.")
+        previous_place = current_place
+        current_place = destination
+        tour.append(current_place)
+
+    return tour
+
+
+def get_neighbour_lists(distances, k):
+    """Returns the k nearest neighbours of each node, closest first.
+
+    distances is a square NumPy array with the distances between every pair
+    of nodes. np.argpartition() finds the k closest nodes of every row in
+    linear time, and only those k are sorted.
+
+    Time complexity: O(n^2 + n*k*log(k))
+        * n = distances
+    """
+
+    n = len(distances)
+    k = min(k, n - 1)
+    if k <= 0:
+        return [[] for _ in range(n)]
+
+    # A node must never be its own neighbour, even if another node is at a
+    # distance of 0 from it.
+    distances = np.array(distances, dtype=np.float64)
+    np.fill_diagonal(distances, np.inf)
+    closest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    order = np.argsort(np.take_along_axis(distances, closest, axis=1), axis=1)
+
+    return np.take_along_axis(closest, order, axis=1).tolist()
+
+
+def get_deadline(time_limit=None, deadline=None):
+    """Returns the time.perf_counter() value at which a search has to stop:
+    the earlier of time_limit seconds from now and the deadline, or None if
+    neither is given.
+
+    Time complexity: O(1)
+    """
+
+    if time_limit is not None:
+        limit = time.perf_counter() + time_limit
+        deadline = limit if deadline is None else min(deadline, limit)
+    return deadline
+
+
+def try_two_opt(a, tour: Tour, distances, neighbours):
+    """Looks for a 2-opt move that removes one of the edges of node a, and
+    applies the first one that shortens the tour. Returns the nodes whose
+    edges changed, or an empty list.
+
+    Only neighbours that are closer to a than the edge being removed can
+    lead to an improvement, so the search stops at the first one that isn't.
+
+    Time complexity: O(k + n)
+        * k = neighbours of a
+        * n = tour (to apply the move)
+    """
+
+    row = distances[a]
+    for direction in (1, -1):
+        b = tour.following(a, direction)
+        removed = row[b]
+        for c in neighbours[a]:
+            added = row[c]
+            if added >= removed:
+                break
+            d = tour.following(c, direction)
+            if c == b or d == a:
+                continue
+
+            delta = added + distances[b][d] - removed - distances[c][d]
+            if delta < -EPSILON:
+                # Replace (a, b) and (c, d) with (a, c) and (b, d).
+                if direction == 1:
+                    tour.reverse(tour.position(b), tour.position(c))
+                else:
+                    tour.reverse(tour.position(c), tour.position(b))
+                return [a, b, c, d]
+
+    return []
+
+
+def try_or_opt(a, tour: Tour, distances, neighbours, max_length=3):
+    """Looks for an Or-opt move of a segment of 1 to max_length nodes that
+    starts or ends at node a, and applies the first one that shortens the
+    tour. Returns the nodes whose edges changed, or an empty list.
+
+    The segment is taken out of the tour and put back between two nodes u
+    and v, with one of its ends next to one of that end's neighbours.
+
+    Time complexity: O(max_length*k + n)
+        * k = neighbours of the ends of the segment
+        * n = tour (to apply the move)
+    """
+
+    n = len(tour)
+    if n < 5:
+        return []
+
+    for length in range(1, min(max_length, n - 3) + 1):
+        for offset in (0, 1 - length):
+            start = (tour.position(a) + offset) % n
+            segment = [tour[(start + i) % n] for i in range(length)]
+            first = segment[0]
+            last = segment[-1]
+            before = tour[(start - 1) % n]
+            after = tour[(start + length) % n]
+            # What is saved by taking the segment out and closing the gap.
+            removal_gain = (distances[before][first] + distances[last][after]
+                            - distances[before][after])
+            if removal_gain <= EPSILON:
+                continue
+
+            for end, other_end in ((first, last), (last, first)):
+                for c in neighbours[end]:
+                    if distances[end][c] >= removal_gain:
+                        break
+                    if c in segment:
+                        continue
+
+                    # The segment can go right after c or right before it.
+                    for u, v in ((c, tour.successor(c)),
+                                 (tour.predecessor(c), c)):
+                        if u in segment or v in segment:
+                            continue
+                        # end is next to c, and other_end is next to the
+                        # other node of the edge.
+                        other = v if u == c else u
+                        delta = (distances[end][c]
+                                 + distances[other_end][other]
+                                 - distances[u][v] - removal_gain)
+                        if delta < -EPSILON:
+                            tour.move_segment(segment, u,
+                                              end if u == c else other_end)
+                            return [before, after, u, v, first, last]
+
+    return []
+
+
+def improve_tour(tour: Tour, distances, neighbours, time_limit=None,
+                 deadline=None):
+    """Improves a tour with 2-opt and Or-opt moves until no node can find an
+    improving move. The tour is a Tour of node indices and is changed in
+    place.
+
+    Every node starts in a queue of nodes to look at. A node whose moves
+    could not improve the tour leaves the queue (its don't-look bit is set)
+    until a move changes the edges of a node next to it. The search stops
+    early, between two moves, when time_limit seconds have passed or when
+    time.perf_counter() reaches the deadline, whichever comes first.
+
+    Time complexity: O(p*n*k)
+        * p = number of passes until no improvement is found
+        * n = tour
+        * k = neighbours of each node
+    """
+
+    n = len(tour)
+    if n < 4:
+        return tour
+    deadline = get_deadline(time_limit, deadline)
+
+    queue = deque(tour)
+    in_queue = [True] * n
+    while queue:
+        if deadline is not None and time.perf_counter() > deadline:
+            break
+        a = queue.popleft()
+        in_queue[a] = False
+
+        changed = try_two_opt(a, tour, distances, neighbours)
+        if not changed:
+            changed = try_or_opt(a, tour, distances, neighbours)
+
+        # Clear the don't-look bits of the nodes whose edges changed.
+        for node in changed:
+            if not in_queue[node]:
+                in_queue[node] = True
+                queue.append(node)
+
+    return tour
+
+
+def lin_kernighan(tour: Tour, distances, neighbours, max_depth=6, breadth=5, 
+                  time_limit=None, deadline=None):
+    """Improves a tour with Lin-Kernighan-style variable-depth moves. The tour 
+    is a Tour of node indices and is changed in place.
+
+    2-opt stops at the first pair of edges that improves the tour, so it 
+    gets stuck once every single swap makes the tour longer. A variable-depth 
+    move chains several swaps together, accepting ones that make the tour 
+    longer as long as the chain as a whole can still make it shorter:
+    1) Remove the edge (t1, t2), keeping the gain g = d(t1, t2).
+    2) Pick a neighbour t3 of t2 with g - d(t2, t3) > 0. Let t4 be the node 
+       before t3. Reversing the segment from t2 to t4 replaces the edges 
+       (t1, t2) and (t4, t3) with (t2, t3) and (t1, t4).
+    3) The tour is now shorter by g - d(t2, t3) + d(t4, t3) - d(t1, t4). 
+       Remember the best depth so far, then repeat 2) from t2 = t4 until 
+       max_depth swaps were made or no neighbour has a positive gain.
+    4) Undo the swaps that come after the best depth. If the best depth is 0, 
+       the tour is back to where it started.
+    The first swap of a chain tries up to breadth different neighbours, and 
+    the deeper swaps only try the one with the best gain. Edges added by a 
+    chain are never removed by the same chain. Each swap is a segment 
+    reversal on the tour, which only costs the length of the segment.
+
+    Like improve_tour(), nodes that could not start an improving chain are 
+    skipped until the edges around them change, and the search stops early, 
+    between two chains, when time_limit seconds have passed or when 
+    time.perf_counter() reaches the deadline.
+
+    Time complexity: O(p*n*b*d*(k + n))
+        * p = number of passes until no improvement is found
+        * n = tour
+        * b = breadth
+        * d = max_depth
+        * k = neighbours of each node
+    """
+
+    n = len(tour)
+    if n < 5:
+        return tour
+    deadline = get_deadline(time_limit, deadline)
+
+    def get_swaps(t1, t2, gain, step, added_edges):
+        """Returns the (gain after the swap, t3, t4) options to continue the 
+        chain from t2, best first."""
+
+        swaps = []
+        for t3 in neighbours[t2]:
+            partial_gain = gain - distances[t2][t3]
+            if partial_gain <= 0:
+                break
+            t4 = tour.following(t3, -step)
+            if (t3 == t1 or t3 == t2 or t4 == t2
+                or (min(t3, t4), max(t3, t4)) in added_edges):
+                continue
+            swaps.append((partial_gain + distances[t4][t3], t3, t4))
+        swaps.sort(reverse=True)
+        return swaps
+
+    def swap(t1, t2, t4, step):
+        """Reverses the segment from t2 to t4, going in the direction of 
+        step, and returns the direction in which t4 now follows t1."""
+
+        if step == 1:
+            tour.reverse(tour.position(t2), tour.position(t4))
+        else:
+            tour.reverse(tour.position(t4), tour.position(t2))
+        # Reversing the shorter side of the tour can flip which way is 
+        # forwards.
+        if tour.following(t1, step) != t4:
+            step = -step
+        return step
+
+    def run_chain(t1, t2, step, first_swap):
+        """Makes a chain of swaps starting with first_swap, keeps the best 
+        prefix of it, and returns the nodes it touched (empty if the tour 
+        could not be improved)."""
+
+        gain = distances[t1][t2]
+        swaps = []
+        added_edges = set()
+        best_improvement = EPSILON
+        best_depth = 0
+        option = first_swap
+
+        while option is not None:
+            gain, t3, t4 = option
+            step = swap(t1, t2, t4, step)
+            swaps.append((t2, t4))
+            added_edges.add((min(t2, t3), max(t2, t3)))
+
+            # 3) Closing the tour at this depth would remove (t1, t4).
+            improvement = gain - distances[t1][t4]
+            if improvement > best_improvement:
+                best_improvement = improvement
+                best_depth = len(swaps)
+
+            t2 = t4
+            option = None
+            if len(swaps) < max_depth:
+                options = get_swaps(t1, t2, gain, step, added_edges)
+                if options:
+                    option = options[0]
+
+        # 4) Undo the swaps past the best depth, last one first. Swapping 
+        #    the reversed segment back restores the old edges.
+        while len(swaps) > best_depth:
+            t2, t4 = swaps.pop()
+            step = swap(t1, t4, t2, step)
+
+        return [node for pair in swaps for node in pair]
+
+    queue = deque(tour)
+    in_queue = [True] * n
+    while queue:
+        if deadline is not None and time.perf_counter() > deadline:
+            break
+        t1 = queue.popleft()
+        in_queue[t1] = False
+
+        changed = []
+        for step in (1, -1):
+            # 1) Remove the edge (t1, t2).
+            t2 = tour.following(t1, step)
+            for first_swap in get_swaps(t1, t2, distances[t1][t2], step, 
+                                        set())[:breadth]:
+                changed = run_chain(t1, t2, step, first_swap)
+                if changed:
+                    break
+            if changed:
+                break
+
+        # Clear the don't-look bits around every node of the chain.
+        if changed:
+            changed.append(t1)
+        for node in changed:
+            for neighbour in (node, tour.successor(node),
+                              tour.predecessor(node)):
+                if not in_queue[neighbour]:
+                    in_queue[neighbour] = True
+                    queue.append(neighbour)
+
+    return tour
+
+
+def improve_route(route: dict, distance_graph, places, k=8, 
+                  method="two_opt", max_depth=6, time_limit=None,
+                  neighbour_index=None):
+    """Shortens a {Place: set()} route with local search and returns the 
+    improved route in the same format.
+
+    It can be used on the route of a single deadline group (the output of
+    christofides()) or on a full route made by chain_routes(). Each place
+    only looks at moves involving its k nearest places in the route. The 
+    method can be:
+    - "two_opt": 2-opt and Or-opt moves (see improve_tour()).
+    - "lin_kernighan": variable-depth moves of up to max_depth swaps, 
+      stopping after time_limit seconds (see lin_kernighan()), followed by 
+      Or-opt and 2-opt moves. It is slower, but finds shorter routes for 
+      large groups where 2-opt gets stuck.
+
+    If a NeighbourIndex is given and every place keeps some of its nearest
+    neighbours within the route, those are used instead of sorting the
+    distances of every place in the route. The distances between every pair
+    of places are then never read either: only the distances to those
+    neighbours are, plus the few others the moves need (see
+    classes/candidate_distances.py).
+
+    Time complexity: O(n^2 + p*n*k) (two_opt), or O(p*n*k) with
+    neighbour_index
+        * n = route
+        * p = number of passes until no improvement is found
+    """
+
+    if method not in ("two_opt", "lin_kernighan"):
+        raise ValueError(f"Unknown local search method {method}.")
+
+    if len(route) < 4:
+        return route
+
+    hub = places.get(places.address_to_place("HUB"))  # Node 0
+    start = hub if hub in route else next(iter(route))
+    place_tour = graph_to_tour(route, start)
+
+    ids = [place.id for place in place_tour]
+    neighbours = None
+    if neighbour_index is not None:
+        neighbours = neighbour_index.candidate_lists(ids, k)
+    if neighbours is not None:
+        distances = CandidateDistances(ids, neighbours, distance_graph)
+    else:
+        distances = get_distances_between(place_tour, distance_graph)
+        neighbours = get_neighbour_lists(distances, k)
+        # Plain lists are much faster than NumPy arrays for reading one 
+        # distance at a time.
+        distances = np.asarray(distances, dtype=np.float64).tolist()
+
+    tour = Tour(range(len(place_tour)))
+    if method == "lin_kernighan":
+        lin_kernighan(tour, distances, neighbours, max_depth, 
+                      time_limit=time_limit)
+    improve_tour(tour, distances, neighbours)
+
+    return tour.to_graph(place_tour)
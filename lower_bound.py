@@ -0,0 +1,144 @@
+"""
+Contains the functions that find a lower bound on the length of the shortest
+route through a group of places, using Held-Karp 1-trees.
+
+A route can be checked against the lower bound to know how far from the
+shortest route it can be at most (its gap). Once the gap is small enough,
+there is no point in trying to improve the route any further.
+
+A 1-tree is a minimum spanning tree of every node except a special one, plus
+the two shortest edges of the special node. Every route is a 1-tree in which
+every node has exactly two edges, so the weight of the minimum 1-tree is a
+lower bound on the length of the shortest route. The bound is tightened with
+subgradient optimization:
+1) Give every node a penalty pi (starting at 0) and add pi(i) + pi(j) to the
+   distance between every pair of nodes i and j. The length of every route
+   goes up by exactly 2 * sum(pi), so the weight of the minimum 1-tree minus
+   2 * sum(pi) is still a lower bound.
+2) Find the minimum 1-tree with the penalties, using the dense version of
+   Prim's algorithm (see prim_tree() in christofides.py).
+3) Raise the penalty of nodes with more than two edges and lower the penalty
+   of nodes with only one, which pushes the 1-tree towards being a route.
+   The step size starts large and is halved whenever the bound stops
+   improving.
+4) Repeat 1-3, keeping the best bound. If the 1-tree is a route, it is the
+   shortest one and the bound is exact.
+Each iteration takes O(n^2) time with NumPy.
+"""
+
+import time
+
+import numpy as np
+
+from christofides import prim_tree
+
+
+def get_one_tree(distances, special=0):
+    """Returns the weight of the minimum 1-tree and the number of edges of
+    each node in it.
+
+    distances is a square NumPy array with the distance between every pair
+    of nodes.
+
+    Time complexity: O(n^2)
+        * n = distances
+    """
+
+    n = len(distances)
+    others = np.delete(np.arange(n), special)
+    tree_distances = distances[np.ix_(others, others)]
+    parents = np.asarray(prim_tree(tree_distances, 0))
+
+    degrees = np.zeros(n, dtype=np.int64)
+    children = np.arange(1, n - 1)  # Every node but the root has a parent.
+    weight = tree_distances[children, parents[children]].sum()
+    np.add.at(degrees, others[children], 1)
+    np.add.at(degrees, others[parents[children]], 1)
+
+    # The two shortest edges of the special node.
+    row = distances[special, others]
+    closest = np.argpartition(row, 1)[:2]
+    weight += row[closest].sum()
+    degrees[special] = 2
+    np.add.at(degrees, others[closest], 1)
+
+    return float(weight), degrees
+
+
+def get_lower_bound(distances, upper_bound=None, iterations=100,
+                    time_limit=None, special=0):
+    """Returns a lower bound on the length of the shortest tour through the
+    nodes, using subgradient-optimized 1-trees.
+
+    distances is a square matrix (a NumPy array or a list of lists) with the
+    distance between every pair of nodes. upper_bound is the length of any
+    tour (such as the best one found so far), which sets the size of the
+    steps. Without it, twice the weight of the first 1-tree is used. The
+    search stops after iterations steps or time_limit seconds.
+
+    Time complexity: O(i*n^2)
+        * i = iterations
+        * n = distances
+    """
+
+    distances = np.asarray(distances, dtype=np.float64)
+    n = len(distances)
+    if n < 2:
+        return 0.0
+    if n < 3:
+        return float(2 * distances[0, 1])
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+
+    penalties = np.zeros(n)
+    best_bound = -np.inf
+    step_scale = 2.0
+    # Halve the steps after this many iterations without a better bound.
+    patience = max(5, iterations // 10)
+    stalled = 0
+
+    for _ in range(iterations):
+        # 1) and 2) The minimum 1-tree with the penalties.
+        weight, degrees = get_one_tree(
+            distances + penalties[:, None] + penalties[None, :], special)
+        bound = weight - 2 * penalties.sum()
+        if upper_bound is None:
+            upper_bound = 2 * weight
+
+        if bound > best_bound:
+            best_bound = bound
+            stalled = 0
+        else:
+            stalled += 1
+            if stalled >= patience:
+                step_scale /= 2
+                stalled = 0
+
+        # 3) Move the penalties towards a 1-tree where every node has two
+        #    edges.
+        subgradient = degrees - 2
+        norm = float(subgradient @ subgradient)
+        if norm == 0:
+            # The 1-tree is a tour, so no tour can be shorter.
+            break
+        step = step_scale * max(upper_bound - bound, 0) / norm
+        if step == 0:
+            break
+        penalties += step * subgradient
+
+        if deadline is not None and time.perf_counter() > deadline:
+            break
+
+    return float(min(best_bound, upper_bound))
+
+
+def get_gap(length: float, lower_bound: float):
+    """Returns how much longer a route is than the lower bound, as a fraction
+    of the lower bound. The route is at most that much longer than the
+    shortest route.
+
+    Time complexity: O(1)
+    """
+
+    if lower_bound <= 0:
+        return 0.0 if length <= 0 else float("inf")
+    return max(length - lower_bound, 0.0) / lower_bound
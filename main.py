@@ -12,8 +12,17 @@ from classes.truck import Truck
 from classes.places_hash import PlacesHash
 from classes.package_hash import PackageHash
 from classes.timemod import TimeMod
-
-from christofides import christofides
+from classes.distance_matrix import DistanceMatrix
+from classes.neighbour_index import NeighbourIndex
+from classes.tour import Tour
+
+from route_templates import load_templates, save_templates, remember_route
+from parallel import start_planner, plan_groups, stop_planner
+from deadline_route import solve_with_deadlines
+from tour_evaluation import get_deadline_minutes, to_minutes
+from distance_cache import (file_checksum, read_distance_cache, 
+                            write_distance_cache, read_neighbour_cache, 
+                            write_neighbour_cache)
 from delivery import *
 
 def load_package_data(file_path: str):
@@ -64,134 +73,249 @@ def load_distance_data(file_path: str):
     return places
 
 
-def load_distance_graph(place_list: list):
-    """Makes a symmetric 2D matrix from the distance attribute of each place 
-    in the list."""
-    
-    graph = []
-    for place in place_list:
-        row = [float(distance) for distance in place.distances]
-
-        # Loading the rest of the distances from the column that corresponds 
-        # to the place ID
-        for destination in place_list[place.id + 1:]:
-            row.append(float(destination.distances[place.id]))
-        graph.append(row)
+def load_distance_graph(place_list: list, condensed=False, 
+                        encoding="float64"):
+    """Makes a symmetric distance matrix from the distance attribute of each 
+    place in the list.
+
+    The matrix can store only the distances above its diagonal (condensed) 
+    and use a smaller encoding (float32, or uint16 tenths of a mile) to save 
+    memory on large distance tables."""
     
-    return graph
-
-
-# Keep in mind that the size of each hash should be adjusted according to the 
-# average number of packages delivered in a day and the types of addresses 
-# that come up most frequently.
-package_hash = PackageHash(45)  # Average number of packages in a day + 5.
-places_hash = PlacesHash(1000)  # Could be 100 depending on collisions.
-
-packages = load_package_data('./data/package_data.csv')
-places = load_distance_data('./data/distance_data.csv')
-trucks = {1: Truck(1, TimeMod(8, 0)), 2: Truck(2, TimeMod(9, 30))}
-
-package_hash.load(packages)
-places_hash.load(places)
-distance_graph = load_distance_graph(places)
-
-# Making a priority queue that sorts the packages by their deadline.
-packages_to_deliver = []
-for package in packages:
-    packages_to_deliver.append(package)
-heapq.heapify(packages_to_deliver)
-
-# Essentially a hash table that uses package IDs to get relevant information
-delivery_time_info = [None] * (len(packages) + 1)
-
-total_distance_travelled = 0
-j = 0
-print("STARTING DELIVERY DAY")
-while packages_to_deliver:
-    if trucks[1].is_empty() and trucks[2].is_empty():
-        print("LOADING TRUCKS")
-        load_trucks(trucks, package_hash, 
-                    packages_to_deliver, delivery_time_info)
-        print_truck_contents(trucks)
-
-    # Alternate between trucks each time the loop repeats. We're concentrating
-    # on one delivery at a time, even if the trucks are technically delivering
-    # packages at the same time.
-    truck = trucks[(j % 2) + 1]
-
-    route_info = get_delivery_details(truck.packages, places_hash)
-    where_to_unload = route_info[1]
-
-    # This separates the routes into chunks according to each package 
-    # deadline. For each group of packages with the same deadline, it will get 
-    # the best route for just that group and put it in a list.
-    routes = []
-    for i, route in enumerate(route_info[0]):
-        routes.append(christofides(route, distance_graph, places_hash))
-
-    # Now we join each deadline group together, making the full route.
-    if len(routes) > 1:
-        for i in range(1, len(routes)):
-            if i == 1:
-                full_route = connect_paths(routes[i - 1], routes[i], 
-                                           distance_graph, places_hash)
-            else:
-                full_route = connect_paths(routes[i], full_route, 
-                                           distance_graph, places_hash)
-    else:
-        full_route = routes[0]
-
-    # Uncomment to see the graph that represents the route the truck will take.
-    # print(f"TRUCK {truck.id} ROUTE:")
-    # for place in full_route:
-    #     print(f"{place.id}: ", end="")
-    #     for i, p in enumerate(full_route[place]):
-    #         if i < len(full_route[place]) - 1:
-    #             print(f"{p.id}, ", end="")
-    #         else:
-    #             print(p.id)
-
-    print(f"TRUCK {truck.id} DELIVERY:")
-    update_info = deliver_packages(full_route, where_to_unload, 
-                                   distance_graph, truck,
-                                   places_hash, delivery_time_info)
-    total_distance_travelled += update_info[0]
-    truck.depart_time = update_info[1]
-
-    print("Total distance covered by all trucks: "
-          f"{total_distance_travelled} miles.\n")
-    print("-" * 100, "\n")
-
-    j += 1
-
-print("ENDED DELIVERY DAY\n")
-
-# Asking the user if they want to check the progress of the packages at a 
-# specific time in the day and printing the status of the packages accordingly
-answer = ""
-while answer != "N":
-    print("Type Y to get the delivery progress report of the packages at a "
-          "specific time of day. Type N to exit.")
-    answer = input("Answer: ")
-    if answer == "N" or answer == "n":
-        break
-    elif answer == "Y" or answer == "y":
-        time_str = input("Please provide the time at which you would like to "
-                         "see the progress report. Format your time in a "
-                         "24-hour format (for example, 13:12 instead of 1:12 "
-                         "PM): ")
-
-        try:
-            time = TimeMod()
-            time.str_to_time(time_str)
-        except ValueError:
-            print("The time you provided is invalid. Please make sure that "
-                  "you are not putting any spaces before the hour and that "
-                  "you're using a colon to separate the hours and minutes.\n")
-            continue
-
-        print_delivery_status(time, delivery_time_info, 
-                              package_hash, places_hash)
-    else:
-        print("Invalid input, please try again")
-    print()  # New line
\ No newline at end of file
+    return DistanceMatrix.from_places(place_list, condensed, encoding)
+
+
+def load_distance_table(file_path: str, cache_path: str, condensed=False, 
+                        encoding="float64"):
+    """Returns the places and the distance matrix, loading them from the 
+    compiled cache when it is up to date with the csv file.
+
+    If the cache is missing, was compiled from an older version of the csv 
+    file, or stores the matrix in a different layout, the csv file is parsed 
+    and the cache is compiled again for the next run."""
+
+    checksum = file_checksum(file_path)
+    try:
+        return read_distance_cache(cache_path, checksum, condensed, encoding)
+    except (FileNotFoundError, ValueError):
+        pass
+
+    place_list = load_distance_data(file_path)
+    graph = load_distance_graph(place_list, condensed, encoding)
+    graph.version = checksum
+    write_distance_cache(cache_path, checksum, place_list, graph)
+
+    return place_list, graph
+
+
+def load_neighbour_index(file_path: str, cache_path: str, graph, k=16):
+    """Returns the k nearest neighbours of every place, loading them from 
+    their cache when it is up to date with the csv file.
+
+    The index is computed from the distance matrix and cached next to it the 
+    first time, or whenever the csv file or k changes."""
+
+    checksum = file_checksum(file_path)
+    try:
+        return read_neighbour_cache(cache_path, checksum, k)
+    except (FileNotFoundError, ValueError):
+        pass
+
+    index = NeighbourIndex.from_matrix(graph, k)
+    write_neighbour_cache(cache_path, checksum, index)
+
+    return index
+
+
+def main():
+    """Plans and drives the delivery day, then reports the status of the 
+    packages at the times the user asks for.
+
+    The process pool that plans the routes (see parallel.py) starts worker 
+    processes, which import this module. Keeping the script in main() stops 
+    them from running the whole delivery day again when they are started 
+    with spawn instead of fork (the default on Windows and macOS)."""
+
+    # Keep in mind that the size of each hash should be adjusted according to 
+    # the average number of packages delivered in a day and the types of 
+    # addresses that come up most frequently.
+    package_hash = PackageHash(45)  # Average number of packages in a day + 5.
+    places_hash = PlacesHash(1000)  # Could be 100 depending on collisions.
+
+    packages = load_package_data('./data/package_data.csv')
+    places, distance_graph = load_distance_table('./data/distance_data.csv',
+                                                 './data/distance_data.bin')
+    neighbour_index = load_neighbour_index('./data/distance_data.csv',
+                                           './data/distance_data.knn',
+                                           distance_graph)
+    # Routes driven on earlier runs, used as a starting point for similar 
+    # routes.
+    try:
+        route_templates = load_templates('./data/route_templates.json')
+    except ValueError:
+        route_templates = {}
+    # load_trucks() only works with these two trucks. A fleet of any size can 
+    # be loaded and routed with plan_fleet() in savings_router.py instead.
+    trucks = {1: Truck(1, TimeMod(8, 0)), 2: Truck(2, TimeMod(9, 30))}
+
+    package_hash.load(packages)
+    places_hash.load(places)
+
+    # Making a priority queue that sorts the packages by their deadline.
+    packages_to_deliver = []
+    for package in packages:
+        packages_to_deliver.append(package)
+    heapq.heapify(packages_to_deliver)
+
+    # Essentially a hash table that uses package IDs to get relevant 
+    # information
+    delivery_time_info = [None] * (len(packages) + 1)
+
+    # Plans the routes of the deadline groups in parallel, using a process for 
+    # each CPU. Set workers to 1 to plan them one by one instead.
+    planner = start_planner(distance_graph, places, places_hash, 
+                            neighbour_index, workers=None)
+
+    # Set to True to see how the route of each deadline group was found.
+    show_reports = False
+
+    total_distance_travelled = 0
+    j = 0
+    print("STARTING DELIVERY DAY")
+    while packages_to_deliver:
+        if trucks[1].is_empty() and trucks[2].is_empty():
+            print("LOADING TRUCKS")
+            load_trucks(trucks, package_hash, 
+                        packages_to_deliver, delivery_time_info)
+            print_truck_contents(trucks)
+
+            # This separates the routes of each truck into chunks according to 
+            # each package deadline. The best route for each group of packages 
+            # with the same deadline (starting from a similar route the truck 
+            # drove before, if there is one) is found and shortened with local 
+            # search. The groups of both trucks are planned at the same time.
+            groups = []
+            regions = []
+            deliveries = {}  # Key = truck ID, values = (first group, groups, 
+                             # where to unload)
+            for truck_id in trucks:
+                route_info = get_delivery_details(trucks[truck_id].packages, 
+                                                  places_hash)
+                deliveries[truck_id] = (len(groups), len(route_info[0]), 
+                                        route_info[1])
+                groups.extend(route_info[0])
+                regions.extend([f"truck {truck_id}"] * len(route_info[0]))
+
+            # When show_reports is True, each report also says how much longer 
+            # the route of its group can be than the shortest one (see 
+            # lower_bound.py). The bound takes a while to compute, so it is 
+            # only computed when the reports are printed.
+            reports = []
+            planned_routes = plan_groups(planner, groups, regions, 
+                                         route_templates, reports, 
+                                         bound=show_reports)
+            for route, region in zip(planned_routes, regions):
+                remember_route(route, distance_graph, places_hash, 
+                               route_templates, region)
+
+            if show_reports:
+                for report in reports:
+                    print(f"{report['places']} places ({report['solver']}): "
+                          f"{report['cost']:.1f} miles, at most "
+                          f"{report['gap']:.1%} longer than the shortest "
+                          "route")
+
+        # Alternate between trucks each time the loop repeats. We're 
+        # concentrating on one delivery at a time, even if the trucks are 
+        # technically delivering packages at the same time.
+        truck = trucks[(j % 2) + 1]
+
+        first_group, group_count, where_to_unload = deliveries[truck.id]
+        routes = planned_routes[first_group:first_group + group_count]
+
+        # Now we join each deadline group together, in order of their 
+        # deadlines, making the full route.
+        full_route = chain_routes(routes, distance_graph, places_hash)
+
+        # The deadlines then become time windows on a single route, which can 
+        # mix stops with different deadlines whenever that is shorter and 
+        # still on time (see deadline_route.py). The correct address of the 
+        # "wrong address" package can't be reached before it is corrected.
+        hub = places_hash.get(places_hash.address_to_place("HUB"))
+        deadlines = get_deadline_minutes(truck.packages, places_hash, 
+                                         len(distance_graph))
+        ready = get_ready_minutes(truck.packages, places_hash, 
+                                  len(distance_graph))
+        tour = solve_with_deadlines(full_route, distance_graph, places_hash, 
+                                    deadlines, to_minutes(truck.depart_time), 
+                                    truck.speed, 
+                                    initial=Tour.from_graph(full_route, hub), 
+                                    ready=ready)
+        by_id = {place.id: place for place in full_route}
+        full_route = tour.to_graph(by_id)
+
+        # Uncomment to see the graph that represents the route the truck will 
+        # take.
+        # print(f"TRUCK {truck.id} ROUTE:")
+        # for place in full_route:
+        #     print(f"{place.id}: ", end="")
+        #     for i, p in enumerate(full_route[place]):
+        #         if i < len(full_route[place]) - 1:
+        #             print(f"{p.id}, ", end="")
+        #         else:
+        #             print(p.id)
+
+        print(f"TRUCK {truck.id} DELIVERY:")
+        first_place = by_id[tour[1]] if len(tour) > 1 else None
+        update_info = deliver_packages(full_route, where_to_unload, 
+                                       distance_graph, truck,
+                                       places_hash, delivery_time_info, 
+                                       first_place)
+        total_distance_travelled += update_info[0]
+        truck.depart_time = update_info[1]
+
+        print("Total distance covered by all trucks: "
+              f"{total_distance_travelled} miles.\n")
+        print("-" * 100, "\n")
+
+        j += 1
+
+    print("ENDED DELIVERY DAY\n")
+    stop_planner(planner)
+    save_templates('./data/route_templates.json', route_templates)
+
+    # Asking the user if they want to check the progress of the packages at a 
+    # specific time in the day and printing the status of the packages 
+    # accordingly
+    answer = ""
+    while answer != "N":
+        print("Type Y to get the delivery progress report of the packages at "
+              "a specific time of day. Type N to exit.")
+        answer = input("Answer: ")
+        if answer == "N" or answer == "n":
+            break
+        elif answer == "Y" or answer == "y":
+            time_str = input("Please provide the time at which you would "
+                             "like to see the progress report. Format your "
+                             "time in a 24-hour format (for example, 13:12 "
+                             "instead of 1:12 PM): ")
+
+            try:
+                time = TimeMod()
+                time.str_to_time(time_str)
+            except ValueError:
+                print("The time you provided is invalid. Please make sure "
+                      "that you are not putting any spaces before the hour "
+                      "and that you're using a colon to separate the hours "
+                      "and minutes.\n")
+                continue
+
+            print_delivery_status(time, delivery_time_info, 
+                                  package_hash, places_hash)
+        else:
+            print("Invalid input, please try again")
+        print()  # New line
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,514 @@
+"""
+Contains Edmonds' blossom algorithm for finding an exact minimum-weight
+perfect matching, used by christofides.get_mpm().
+
+Edmonds' algorithm grows alternating trees out of the unmatched nodes and
+augments the matching whenever two trees meet through an edge with no slack.
+When an edge closes an odd cycle inside a tree, the cycle is shrunk into a
+single "blossom" node, which is expanded again later. Dual variables on the
+nodes and blossoms guarantee that the matching it finds is optimal. This
+implementation follows the O(n^3) primal-dual formulation by Galil ("Efficient
+algorithms for finding maximum matching in graphs", 1986).
+
+The algorithm is written for maximum-weight matchings. A minimum-weight
+perfect matching of a complete graph with an even number of nodes is found by
+asking for the maximum-weight matching with the most edges, after flipping the
+weights so that the shortest distances weigh the most.
+"""
+
+# Distances are converted into integer units of this size (in miles) so that
+# the dual variables never suffer from floating-point rounding errors.
+RESOLUTION = 0.001
+
+
+def min_weight_perfect_matching(distances):
+    """Returns the pairs of nodes of the minimum-weight perfect matching of a
+    complete graph.
+
+    distances is a square matrix (a NumPy array or a list of lists) with the
+    distance between every pair of nodes, indexed from 0. The graph must have
+    an even number of nodes. The result is a list of (i, j) tuples with i < j.
+
+    Time complexity: O(n^3)
+        * n = distances
+    """
+
+    n = len(distances)
+    if n % 2 == 1:
+        raise ValueError("A perfect matching needs an even number of nodes.")
+
+    units = [[round(float(distances[i][j]) / RESOLUTION) for j in range(n)]
+             for i in range(n)]
+    longest = max((max(row) for row in units), default=0)
+    # Flip the weights so that the shortest distance has the largest weight.
+    # All the weights stay positive, so the maximum-cardinality matching
+    # with the largest weight is the perfect matching with the smallest
+    # distance.
+    edges = [(i, j, longest + 1 - units[i][j])
+             for i in range(n) for j in range(i + 1, n)]
+    mate = max_weight_matching(edges, max_cardinality=True)
+
+    return [(i, mate[i]) for i in range(n) if i < mate[i]]
+
+
+def max_weight_matching(edges, max_cardinality=False):
+    """Returns the maximum-weight matching of a general graph.
+
+    edges is a list of (i, j, weight) tuples with integer nodes starting at 0
+    and integer weights. If max_cardinality is True, the matching is the one
+    with the largest weight among those with the most edges. The result is a
+    list where mate[i] is the node matched with i, or -1 if i is unmatched.
+
+    Edge k has two endpoints, 2k (node i) and 2k + 1 (node j). The matching,
+    the labels, and the blossoms store endpoints instead of nodes, since an
+    endpoint tells us both the edge and the node on the other side of it
+    (endpoint p ^ 1).
+
+    Time complexity: O(n^3)
+        * n = number of nodes
+    """
+
+    if not edges:
+        return []
+
+    edge_count = len(edges)
+    node_count = 1 + max(max(i, j) for i, j, _ in edges)
+    max_weight = max(0, max(weight for _, _, weight in edges))
+
+    # endpoint[p] is the node at endpoint p, and neighbour_ends[i] lists the
+    # remote endpoints of the edges of node i.
+    endpoint = [edges[p // 2][p % 2] for p in range(2 * edge_count)]
+    neighbour_ends = [[] for _ in range(node_count)]
+    for k, (i, j, _) in enumerate(edges):
+        neighbour_ends[i].append(2 * k + 1)
+        neighbour_ends[j].append(2 * k)
+
+    # Remote endpoint of the matched edge of each node, or -1.
+    mate = [-1] * node_count
+    # Label of each top-level blossom (0 = free, 1 = S, 2 = T) and the
+    # endpoint through which it got its label. Nodes are blossoms
+    # 0 to node_count - 1, and non-trivial blossoms use the rest of the IDs.
+    label = [0] * (2 * node_count)
+    label_end = [-1] * (2 * node_count)
+    # Top-level blossom that contains each node.
+    in_blossom = list(range(node_count))
+    blossom_parent = [-1] * (2 * node_count)
+    # Sub-blossoms of each blossom, ordered around its cycle starting at the
+    # base, and the endpoints of the edges that connect them.
+    blossom_children = [None] * (2 * node_count)
+    blossom_ends = [None] * (2 * node_count)
+    blossom_base = list(range(node_count)) + [-1] * node_count
+    # Least-slack edge to a different S-blossom, for every blossom.
+    best_edge = [-1] * (2 * node_count)
+    blossom_best_edges = [None] * (2 * node_count)
+    unused_blossoms = list(range(node_count, 2 * node_count))
+    # Dual variables: node duals start at the largest weight, blossom duals
+    # at 0. Duals are kept at twice their value so everything stays integer.
+    dual = [max_weight] * node_count + [0] * node_count
+    allowed_edge = [False] * edge_count
+    queue = []
+
+    def slack(k):
+        """Returns twice the slack of edge k."""
+
+        i, j, weight = edges[k]
+        return dual[i] + dual[j] - 2 * weight
+
+    def blossom_leaves(b):
+        """Yields the nodes inside blossom b."""
+
+        if b < node_count:
+            yield b
+        else:
+            for child in blossom_children[b]:
+                if child < node_count:
+                    yield child
+                else:
+                    yield from blossom_leaves(child)
+
+    def assign_label(w, t, p):
+        """Labels node w, and the top-level blossom that contains it, with t
+        through endpoint p. A T-blossom passes an S label on to its mate."""
+
+        b = in_blossom[w]
+        label[w] = label[b] = t
+        label_end[w] = label_end[b] = p
+        best_edge[w] = best_edge[b] = -1
+        if t == 1:
+            queue.extend(blossom_leaves(b))
+        else:
+            base = blossom_base[b]
+            assign_label(endpoint[mate[base]], 1, mate[base] ^ 1)
+
+    def scan_blossom(v, w):
+        """Traces back from nodes v and w to find the base of a new blossom,
+        or returns -1 if they belong to different trees (an augmenting
+        path)."""
+
+        path = []
+        base = -1
+        while v != -1 or w != -1:
+            b = in_blossom[v]
+            # Label 5 marks a blossom that was already visited on this scan.
+            if label[b] & 4:
+                base = blossom_base[b]
+                break
+            path.append(b)
+            label[b] = 5
+            if label_end[b] == -1:
+                # The root of the tree: stop tracing this path.
+                v = -1
+            else:
+                v = endpoint[label_end[b]]
+                b = in_blossom[v]
+                v = endpoint[label_end[b]]
+            # Alternate between the two paths.
+            if w != -1:
+                v, w = w, v
+
+        for b in path:
+            label[b] = 1
+        return base
+
+    def add_blossom(base, k):
+        """Shrinks the odd cycle closed by edge k into a new S-blossom with
+        the given base."""
+
+        v, w, _ = edges[k]
+        base_blossom = in_blossom[base]
+        bv = in_blossom[v]
+        bw = in_blossom[w]
+        b = unused_blossoms.pop()
+        blossom_base[b] = base
+        blossom_parent[b] = -1
+        blossom_parent[base_blossom] = b
+        blossom_children[b] = path = []
+        blossom_ends[b] = ends = []
+
+        # Trace back from v to the base.
+        while bv != base_blossom:
+            blossom_parent[bv] = b
+            path.append(bv)
+            ends.append(label_end[bv])
+            v = endpoint[label_end[bv]]
+            bv = in_blossom[v]
+        path.append(base_blossom)
+        path.reverse()
+        ends.reverse()
+        ends.append(2 * k)
+
+        # Trace back from w to the base.
+        while bw != base_blossom:
+            blossom_parent[bw] = b
+            path.append(bw)
+            ends.append(label_end[bw] ^ 1)
+            w = endpoint[label_end[bw]]
+            bw = in_blossom[w]
+
+        label[b] = 1
+        label_end[b] = label_end[base_blossom]
+        dual[b] = 0
+        # T-nodes inside the new blossom become S-nodes, so they need to be
+        # scanned.
+        for leaf in blossom_leaves(b):
+            if label[in_blossom[leaf]] == 2:
+                queue.append(leaf)
+            in_blossom[leaf] = b
+
+        # Keep the least-slack edge from the new blossom to each S-blossom.
+        best_edge_to = [-1] * (2 * node_count)
+        for child in path:
+            if blossom_best_edges[child] is None:
+                edge_lists = [[p // 2 for p in neighbour_ends[leaf]]
+                              for leaf in blossom_leaves(child)]
+            else:
+                edge_lists = [blossom_best_edges[child]]
+            for edge_list in edge_lists:
+                for edge in edge_list:
+                    i, j, _ = edges[edge]
+                    if in_blossom[j] == b:
+                        i, j = j, i
+                    bj = in_blossom[j]
+                    if (bj != b and label[bj] == 1
+                        and (best_edge_to[bj] == -1
+                             or slack(edge) < slack(best_edge_to[bj]))):
+                        best_edge_to[bj] = edge
+            blossom_best_edges[child] = None
+            best_edge[child] = -1
+
+        blossom_best_edges[b] = [edge for edge in best_edge_to if edge != -1]
+        best_edge[b] = -1
+        for edge in blossom_best_edges[b]:
+            if best_edge[b] == -1 or slack(edge) < slack(best_edge[b]):
+                best_edge[b] = edge
+
+    def expand_blossom(b, end_stage):
+        """Turns the sub-blossoms of blossom b back into top-level
+        blossoms, relabeling them if b was a T-blossom in the middle of a
+        stage."""
+
+        for child in blossom_children[b]:
+            blossom_parent[child] = -1
+            if child < node_count:
+                in_blossom[child] = child
+            elif end_stage and dual[child] == 0:
+                expand_blossom(child, end_stage)
+            else:
+                for leaf in blossom_leaves(child):
+                    in_blossom[leaf] = child
+
+        if not end_stage and label[b] == 2:
+            # Relabel the sub-blossoms on the even-length path from the
+            # child through which b was labeled to its base.
+            entry_child = in_blossom[endpoint[label_end[b] ^ 1]]
+            j = blossom_children[b].index(entry_child)
+            if j & 1:
+                # Go forward and wrap around.
+                j -= len(blossom_children[b])
+                j_step = 1
+                end_trick = 0
+            else:
+                j_step = -1
+                end_trick = 1
+
+            p = label_end[b]
+            while j != 0:
+                label[endpoint[p ^ 1]] = 0
+                label[endpoint[blossom_ends[b][j - end_trick]
+                               ^ end_trick ^ 1]] = 0
+                assign_label(endpoint[p ^ 1], 2, p)
+                allowed_edge[blossom_ends[b][j - end_trick] // 2] = True
+                j += j_step
+                p = blossom_ends[b][j - end_trick] ^ end_trick
+                allowed_edge[p // 2] = True
+                j += j_step
+
+            # The base sub-blossom keeps the T label of b.
+            child = blossom_children[b][j]
+            label[endpoint[p ^ 1]] = label[child] = 2
+            label_end[endpoint[p ^ 1]] = label_end[child] = p
+            best_edge[child] = -1
+
+            # The sub-blossoms on the odd-length path lose their labels,
+            # unless one of their nodes is reachable from outside.
+            j += j_step
+            while blossom_children[b][j] != entry_child:
+                child = blossom_children[b][j]
+                if label[child] == 1:
+                    j += j_step
+                    continue
+                for leaf in blossom_leaves(child):
+                    if label[leaf] != 0:
+                        break
+                if label[leaf] != 0:
+                    label[leaf] = 0
+                    label[endpoint[mate[blossom_base[child]]]] = 0
+                    assign_label(leaf, 2, label_end[leaf])
+                j += j_step
+
+        label[b] = label_end[b] = -1
+        blossom_children[b] = blossom_ends[b] = None
+        blossom_base[b] = -1
+        blossom_best_edges[b] = None
+        best_edge[b] = -1
+        unused_blossoms.append(b)
+
+    def augment_blossom(b, v):
+        """Swaps the matched and unmatched edges on the even-length path from
+        node v to the base of blossom b, making v the new base."""
+
+        t = v
+        while blossom_parent[t] != b:
+            t = blossom_parent[t]
+        if t >= node_count:
+            augment_blossom(t, v)
+
+        i = j = blossom_children[b].index(t)
+        if i & 1:
+            j -= len(blossom_children[b])
+            j_step = 1
+            end_trick = 0
+        else:
+            j_step = -1
+            end_trick = 1
+
+        while j != 0:
+            j += j_step
+            t = blossom_children[b][j]
+            p = blossom_ends[b][j - end_trick] ^ end_trick
+            if t >= node_count:
+                augment_blossom(t, endpoint[p])
+            j += j_step
+            t = blossom_children[b][j]
+            if t >= node_count:
+                augment_blossom(t, endpoint[p ^ 1])
+            mate[endpoint[p]] = p ^ 1
+            mate[endpoint[p ^ 1]] = p
+
+        # Rotate the children so that the new base comes first.
+        blossom_children[b] = (blossom_children[b][i:]
+                               + blossom_children[b][:i])
+        blossom_ends[b] = blossom_ends[b][i:] + blossom_ends[b][:i]
+        blossom_base[b] = blossom_base[blossom_children[b][0]]
+
+    def augment_matching(k):
+        """Swaps the matched and unmatched edges on the augmenting path
+        through edge k, which connects two different trees."""
+
+        v, w, _ = edges[k]
+        for s, p in ((v, 2 * k + 1), (w, 2 * k)):
+            while True:
+                bs = in_blossom[s]
+                if bs >= node_count:
+                    augment_blossom(bs, s)
+                mate[s] = p
+                if label_end[bs] == -1:
+                    # Reached the root of the tree.
+                    break
+                t = endpoint[label_end[bs]]
+                bt = in_blossom[t]
+                s = endpoint[label_end[bt]]
+                j = endpoint[label_end[bt] ^ 1]
+                if bt >= node_count:
+                    augment_blossom(bt, j)
+                mate[j] = label_end[bt]
+                p = label_end[bt] ^ 1
+
+    # Each stage either augments the matching by one edge or proves that it
+    # is already maximum.
+    for _ in range(node_count):
+        label[:] = [0] * (2 * node_count)
+        best_edge[:] = [-1] * (2 * node_count)
+        blossom_best_edges[node_count:] = [None] * node_count
+        allowed_edge[:] = [False] * edge_count
+        queue[:] = []
+
+        # Every unmatched node is the root of a tree.
+        for v in range(node_count):
+            if mate[v] == -1 and label[in_blossom[v]] == 0:
+                assign_label(v, 1, -1)
+
+        augmented = False
+        while True:
+            # 1) Grow the trees through edges with no slack.
+            while queue and not augmented:
+                v = queue.pop()
+                for p in neighbour_ends[v]:
+                    k = p // 2
+                    w = endpoint[p]
+                    if in_blossom[v] == in_blossom[w]:
+                        continue
+                    if not allowed_edge[k]:
+                        k_slack = slack(k)
+                        if k_slack <= 0:
+                            allowed_edge[k] = True
+
+                    if allowed_edge[k]:
+                        if label[in_blossom[w]] == 0:
+                            # w is free: it joins the tree as a T-node.
+                            assign_label(w, 2, p ^ 1)
+                        elif label[in_blossom[w]] == 1:
+                            # w is an S-node: either a blossom or an
+                            # augmenting path.
+                            base = scan_blossom(v, w)
+                            if base >= 0:
+                                add_blossom(base, k)
+                            else:
+                                augment_matching(k)
+                                augmented = True
+                                break
+                        elif label[w] == 0:
+                            # w is inside a T-blossom but has no label yet.
+                            label[w] = 2
+                            label_end[w] = p ^ 1
+                    elif label[in_blossom[w]] == 1:
+                        b = in_blossom[v]
+                        if best_edge[b] == -1 or k_slack < slack(best_edge[b]):
+                            best_edge[b] = k
+                    elif label[w] == 0:
+                        if best_edge[w] == -1 or k_slack < slack(best_edge[w]):
+                            best_edge[w] = k
+
+            if augmented:
+                break
+
+            # 2) No edge is tight: pick the smallest change of the dual
+            #    variables that makes progress.
+            delta_type = -1
+            delta = delta_edge = delta_blossom = None
+
+            if not max_cardinality:
+                delta_type = 1
+                delta = min(dual[:node_count])
+
+            for v in range(node_count):
+                if label[in_blossom[v]] == 0 and best_edge[v] != -1:
+                    d = slack(best_edge[v])
+                    if delta_type == -1 or d < delta:
+                        delta = d
+                        delta_type = 2
+                        delta_edge = best_edge[v]
+
+            for b in range(2 * node_count):
+                if (blossom_parent[b] == -1 and label[b] == 1
+                    and best_edge[b] != -1):
+                    d = slack(best_edge[b]) // 2
+                    if delta_type == -1 or d < delta:
+                        delta = d
+                        delta_type = 3
+                        delta_edge = best_edge[b]
+
+            for b in range(node_count, 2 * node_count):
+                if (blossom_base[b] >= 0 and blossom_parent[b] == -1
+                    and label[b] == 2
+                    and (delta_type == -1 or dual[b] < delta)):
+                    delta = dual[b]
+                    delta_type = 4
+                    delta_blossom = b
+
+            if delta_type == -1:
+                # No further improvement is possible, the matching already
+                # has the most edges.
+                delta_type = 1
+                delta = max(0, min(dual[:node_count]))
+
+            # 3) Update the dual variables.
+            for v in range(node_count):
+                if label[in_blossom[v]] == 1:
+                    dual[v] -= delta
+                elif label[in_blossom[v]] == 2:
+                    dual[v] += delta
+            for b in range(node_count, 2 * node_count):
+                if blossom_base[b] >= 0 and blossom_parent[b] == -1:
+                    if label[b] == 1:
+                        dual[b] += delta
+                    elif label[b] == 2:
+                        dual[b] -= delta
+
+            # 4) Act on the constraint that became tight.
+            if delta_type == 1:
+                break
+            elif delta_type == 2:
+                allowed_edge[delta_edge] = True
+                i, j, _ = edges[delta_edge]
+                if label[in_blossom[i]] == 0:
+                    i, j = j, i
+                queue.append(i)
+            elif delta_type == 3:
+                allowed_edge[delta_edge] = True
+                i, j, _ = edges[delta_edge]
+                queue.append(i)
+            else:
+                expand_blossom(delta_blossom, False)
+
+        if not augmented:
+            break
+
+        # Expand the S-blossoms whose dual variable dropped to zero.
+        for b in range(node_count, 2 * node_count):
+            if (blossom_parent[b] == -1 and blossom_base[b] >= 0
+                and label[b] == 1 and dual[b] == 0):
+                expand_blossom(b, True)
+
+    # Convert the matched endpoints into nodes.
+    return [endpoint[p] if p >= 0 else -1 for p in mate]
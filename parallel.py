@@ -0,0 +1,355 @@
+"""
+Contains the functions that plan the routes of several groups of places at
+the same time with a pool of processes.
+
+The route of each deadline group (see get_delivery_details() in delivery.py)
+only depends on the places in it until chain_routes() puts them together,
+and the routes of both trucks can be planned as soon as they are loaded. The
+groups are sent to a concurrent.futures process pool, where each of them goes
+through plan_route() (a template or the solver portfolio).
+
+The distance matrix and the neighbour index are published once in shared
+memory (multiprocessing.shared_memory), and each worker process attaches to
+them by name when it starts, without copying them. Only the places (a small
+table with the name and address of each ID) are copied to each worker. A
+group is then sent as a list of place IDs and its route comes back as the
+list of place IDs in visiting order. Place objects are compared by identity,
+so the IDs are turned back into the places of the main process before the
+routes are used. The routes come back in the same order as the groups,
+whichever worker finishes first, so the result is the same as planning them
+one after the other.
+
+Several randomized Christofides routes can also be found for a single
+group at the same time (see plan_multi_start()). Each run gets its own seed,
+so the whole search can be repeated exactly, and the shortest route wins.
+
+If the pool can't be started, or breaks while planning, the groups are
+planned one by one in the main process instead.
+"""
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from christofides import christofides
+from classes.distance_matrix import DistanceMatrix
+from classes.neighbour_index import NeighbourIndex
+from classes.route_cache import RouteCache
+from classes.tour import Tour
+from local_search import improve_route
+from route_templates import plan_route
+from tour_evaluation import evaluate_tours
+
+# What each process needs to plan a route. The main process fills it in too,
+# so that it can plan the groups itself when there is no pool.
+_planner = {}
+
+
+def share_array(array):
+    """Copies a NumPy array into a new block of shared memory, and returns
+    the block along with the (name, shape, dtype) needed to attach to it.
+
+    The block stays available until it is unlinked by the process that made
+    it (see stop_planner()).
+
+    Time complexity: O(n)
+        * n = size of the array
+    """
+
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+    shared[...] = array
+    return block, (block.name, array.shape, array.dtype.str)
+
+
+def attach_array(description):
+    """Attaches to an array in shared memory without copying it, and
+    returns the block along with the array. The block must be kept for as
+    long as the array is used.
+
+    Time complexity: O(1)
+    """
+
+    name, shape, dtype = description
+    try:
+        # Only the process that made the block should unlink it.
+        block = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python 3.12 and older
+        block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+def _attach_planner(matrix_description, matrix_layout, place_list, places,
+                    neighbour_description=None):
+    """Attaches a worker process to the shared distance matrix and
+    neighbour index, and stores what it needs to plan routes.
+
+    matrix_layout is the (condensed, encoding, size, version) of the matrix.
+
+    Time complexity: O(n)
+        * n = place_list
+    """
+
+    blocks = []
+    block, data = attach_array(matrix_description)
+    blocks.append(block)
+    distance_graph = DistanceMatrix(data, *matrix_layout)
+
+    neighbour_index = None
+    if neighbour_description is not None:
+        block, neighbours = attach_array(neighbour_description)
+        blocks.append(block)
+        neighbour_index = NeighbourIndex(neighbours)
+
+    _init_planner(distance_graph, place_list, places, neighbour_index)
+    _planner["shared"] = blocks
+
+
+def _init_planner(distance_graph, place_list, places, neighbour_index=None):
+    """Stores what the current process needs to plan routes.
+
+    place_list and places must be sent together so that they still hold the
+    same Place objects once they reach a worker process.
+
+    Time complexity: O(1)
+    """
+
+    _planner["distance_graph"] = distance_graph
+    _planner["place_list"] = place_list
+    _planner["places"] = places
+    _planner["neighbour_index"] = neighbour_index
+    # Each process remembers the routes it found for the groups it got.
+    _planner["cache"] = RouteCache()
+
+
+def _plan_group(place_ids: list, region: str, templates: dict, options: dict):
+    """Plans the route of a group of places, and returns the IDs of its
+    places in visiting order, starting at the hub, along with the report of
+    how it was found (see run_solver() in portfolio.py).
+
+    Time complexity: O(n^3)
+        * n = place_ids
+    """
+
+    distance_graph = _planner["distance_graph"]
+    places = _planner["places"]
+    group = [_planner["place_list"][place_id] for place_id in place_ids]
+
+    reports = []
+    route = plan_route(group, distance_graph, places, templates, region,
+                       reports=reports,
+                       neighbour_index=_planner["neighbour_index"],
+                       cache=_planner["cache"], **options)
+
+    return _route_to_ids(route), reports[0]
+
+
+def _plan_start(place_ids: list, seed, improve: bool, options: dict):
+    """Finds a randomized Christofides route for a group of places (see
+    christofides()), and returns the IDs of its places in visiting order
+    along with how many seconds it took.
+
+    Time complexity: O(n^3)
+        * n = place_ids
+    """
+
+    started = time.perf_counter()
+    distance_graph = _planner["distance_graph"]
+    places = _planner["places"]
+    group = [_planner["place_list"][place_id] for place_id in place_ids]
+
+    route = christofides(group, distance_graph, places,
+                         neighbour_index=_planner["neighbour_index"],
+                         seed=seed, **options)
+    if improve:
+        route = improve_route(route, distance_graph, places,
+                              neighbour_index=_planner["neighbour_index"])
+
+    return _route_to_ids(route), time.perf_counter() - started
+
+
+def _route_to_ids(route: dict):
+    """Returns the IDs of the places of a route in visiting order, starting
+    at the hub.
+
+    Time complexity: O(n)
+        * n = route
+    """
+
+    if not route:
+        return []
+    places = _planner["places"]
+    hub = places.get(places.address_to_place("HUB"))  # Node 0
+    start = hub if hub in route else next(iter(route))
+    return Tour.from_graph(route, start).order.tolist()
+
+
+def _run_tasks(pool, function, tasks: list):
+    """Runs the function on each task (a tuple of arguments) in the pool,
+    or one by one if the pool is None or breaks, and returns the results in
+    the same order as the tasks.
+
+    Time complexity: O(t/w)
+        * t = tasks
+        * w = processes in the pool
+    """
+
+    if pool is not None and tasks:
+        try:
+            return list(pool.map(function, *zip(*tasks)))
+        except (BrokenProcessPool, OSError):
+            pass
+    return [function(*task) for task in tasks]
+
+
+def start_planner(distance_graph, place_list: list, places,
+                  neighbour_index=None, workers=None):
+    """Prepares the planning of routes and returns a process pool with
+    workers processes, or None if the routes should be planned in the main
+    process (when workers is 1 or the pool can't be started).
+
+    place_list must hold the places sorted by their ID, and distance_graph 
+    must be a DistanceMatrix. By default, the pool has a process for each 
+    CPU. The matrix and neighbour index are copied into shared memory once, 
+    which is released by stop_planner().
+
+    Time complexity: O(n^2 + w*n)
+        * n = place_list
+        * w = workers
+    """
+
+    _init_planner(distance_graph, place_list, places, neighbour_index)
+    if workers == 1:
+        return None
+
+    blocks = []
+    try:
+        block, matrix_description = share_array(distance_graph.data)
+        blocks.append(block)
+        neighbour_description = None
+        if neighbour_index is not None:
+            block, neighbour_description = share_array(
+                np.asarray(neighbour_index.neighbours))
+            blocks.append(block)
+        _planner["shared"] = blocks
+
+        matrix_layout = (distance_graph.condensed, distance_graph.encoding,
+                         distance_graph.size, distance_graph.version)
+        return ProcessPoolExecutor(
+            max_workers=workers, initializer=_attach_planner,
+            initargs=(matrix_description, matrix_layout, place_list, places,
+                      neighbour_description))
+    except (OSError, ValueError, NotImplementedError):
+        _release_shared()
+        return None
+
+
+def _release_shared():
+    """Frees the blocks of shared memory made by start_planner().
+
+    Time complexity: O(1)
+    """
+
+    for block in _planner.pop("shared", []):
+        block.close()
+        block.unlink()
+
+
+def stop_planner(pool):
+    """Shuts down the process pool from start_planner() and frees the 
+    shared memory it used.
+
+    Time complexity: O(w)
+        * w = processes in the pool
+    """
+
+    if pool is not None:
+        pool.shutdown()
+    _release_shared()
+
+
+def plan_groups(pool, groups: list, regions: list, templates: dict,
+                reports=None, **options):
+    """Returns the finished {Place: set()} route of each group of places, in
+    the same order as groups.
+
+    Each group is planned from the templates of its region (see
+    plan_route()), and any other options (like budget_ms) are given to
+    plan_route(). The groups are planned by the pool from start_planner(),
+    or one by one if the pool is None or breaks. If reports is a list, the
+    report of each group (see run_solver() in portfolio.py) is added to it in
+    the same order.
+
+    Time complexity: O(g*n^3/w)
+        * g = groups
+        * n = places in each group
+        * w = processes in the pool
+    """
+
+    place_list = _planner["place_list"]
+    places = _planner["places"]
+    hub = places.get(places.address_to_place("HUB"))  # Node 0
+
+    tasks = []
+    for group, region in zip(groups, regions):
+        # Only send the templates the group can use.
+        key = f"{hub.id}/{region}"
+        tasks.append((sorted(place.id for place in group), region,
+                      {key: templates[key]} if key in templates else {},
+                      options))
+
+    results = _run_tasks(pool, _plan_group, tasks)
+    if reports is not None:
+        reports.extend(report for _, report in results)
+
+    return [Tour(tour).to_graph(place_list) for tour, _ in results]
+
+
+def plan_multi_start(pool, group, starts=8, seed=0, improve=True,
+                     **options):
+    """Finds starts Christofides routes for the group of places, each one
+    randomized differently, and returns the shortest one as a
+    {Place: set()} route along with the statistics of every run.
+
+    The first run is the usual route without randomization, so the result is
+    never longer than it. The seeds of the other runs are drawn from seed, so
+    calling this again with the same seed gives the same route. If improve is
+    True, each route goes through local search before it is measured. Any
+    other options are given to christofides(). The runs are split among the
+    processes of the pool from start_planner(), or made one by one if the
+    pool is None.
+
+    Each run has a dictionary of statistics with its seed (None for the
+    first run), the length of its route, and how many seconds it took. The
+    routes of all of the runs are measured together (see evaluate_tours()).
+    When two routes have the same length, the one from the earlier run is
+    kept.
+
+    Time complexity: O(s*n^3/w)
+        * s = starts
+        * n = group
+        * w = processes in the pool
+    """
+
+    place_list = _planner["place_list"]
+    place_ids = sorted(place.id for place in group)
+    seeds = [None] + np.random.SeedSequence(seed).generate_state(
+        max(starts - 1, 0)).tolist()
+
+    results = _run_tasks(pool, _plan_start,
+                         [(place_ids, run_seed, improve, options)
+                          for run_seed in seeds])
+
+    # Every run visits the same places, so the tours stack into one array.
+    lengths, _, _ = evaluate_tours([tour for tour, _ in results],
+                                   _planner["distance_graph"])
+    statistics = [{"seed": run_seed, "length": float(length),
+                   "seconds": seconds}
+                  for run_seed, length, (_, seconds) in zip(seeds, lengths,
+                                                            results)]
+    best = int(np.argmin(lengths))  # The first of the shortest
+
+    return Tour(results[best][0]).to_graph(place_list), statistics
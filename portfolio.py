@@ -0,0 +1,338 @@
+"""
+Contains the solver portfolio, which picks the way a group of places is
+routed based on its size and the time available.
+
+No single algorithm is the best choice for every group: an exact solver is
+both faster and better than Christofides for a handful of places, while the
+dense Christofides pipeline takes too long for thousands of places. Each way
+of routing a group is registered as a solver under a name:
+- "held_karp": the exact route (see held_karp.py), for tiny groups.
+- "christofides": the dense christofides() pipeline (see christofides_ids())
+  followed by 2-opt and Or-opt moves (see local_search.py), for most
+  groups. Only the local search looks at the nearest neighbours of each
+  place, when there is a neighbour index.
+- "sparse": christofides() with the greedy matching, with the MST, matching,
+  and local search only looking at the k nearest neighbours of each place
+  (see classes/neighbour_index.py), for huge groups.
+- "anytime": solve() from solver.py, which keeps improving a route until a
+  time budget runs out.
+
+select_solver() picks one of them from a dictionary of thresholds: groups of
+up to thresholds["exact"] places are routed exactly, groups of at least
+thresholds["sparse"] places use the sparse pipeline, and the others use
+Christofides. When there is a time budget, the expected runtime of the pick
+(thresholds["ms"][name] milliseconds times the work it does on n places, see
+get_work()) is compared with it, and the anytime solver is used instead if it
+might not fit. Every solver reports how long it took and how long its route
+is, so the thresholds can be calibrated for each machine with benchmark() and
+calibrate(). The report can also hold a lower bound on the length of the
+shortest route (see lower_bound.py), which tells how far from the shortest
+route the group's route can be at most.
+"""
+
+import time
+
+import numpy as np
+
+from christofides import christofides, get_distances_between
+from classes.neighbour_index import NeighbourIndex
+from held_karp import HELD_KARP_LIMIT, held_karp
+from local_search import improve_route
+from lower_bound import get_gap, get_lower_bound
+from solver import solve
+
+# Name -> function(places_list, distance_graph, places, budget_ms, **options)
+# that returns a {Place: set()} route.
+SOLVERS = {}
+
+DEFAULT_THRESHOLDS = {
+    # Largest group that is routed exactly.
+    "exact": HELD_KARP_LIMIT,
+    # Smallest group that uses the sparse pipeline.
+    "sparse": 2000,
+    # Expected milliseconds per unit of work (see get_work()) for each
+    # solver, measured on a single core.
+    "ms": {"held_karp": 2e-6, "christofides": 0.001, "sparse": 0.0003},
+}
+
+
+def register_solver(name: str):
+    """Returns a decorator that adds a function to the portfolio under the
+    name, replacing any solver that had it.
+
+    Time complexity: O(1)
+    """
+
+    def register(function):
+        SOLVERS[name] = function
+        return function
+
+    return register
+
+
+@register_solver("held_karp")
+def solve_exact(places_list, distance_graph, places, budget_ms=None,
+                **options):
+    """Routes the group exactly with the Held-Karp algorithm.
+
+    Time complexity: O(2^n*n^2)
+        * n = places_list
+    """
+
+    return held_karp(places_list, distance_graph, places)
+
+
+@register_solver("christofides")
+def solve_christofides(places_list, distance_graph, places, budget_ms=None,
+                       neighbour_index=None, **options):
+    """Routes the group with the dense christofides() pipeline followed by
+    local search. The neighbour_index is only used by the local search (see
+    improve_route()); solve_sparse() is the one that builds the route from
+    the nearest neighbours.
+
+    Time complexity: O(n^3)
+        * n = places_list
+    """
+
+    route = christofides(places_list, distance_graph, places, **options)
+    return improve_route(route, distance_graph, places,
+                         neighbour_index=neighbour_index)
+
+
+@register_solver("sparse")
+def solve_sparse(places_list, distance_graph, places, budget_ms=None,
+                 neighbour_index=None, k=8, **options):
+    """Routes the group with christofides() and local search, only looking
+    at the edges between each place and its k nearest neighbours.
+
+    If the neighbour_index does not cover the group (see
+    NeighbourIndex.candidate_lists()), an index of the nearest neighbours of
+    each place within the group is built instead.
+
+    Time complexity: O(n^2) to read the distances, then close to O(n*k)
+        * n = places_list
+    """
+
+    options["matching"] = "greedy"
+    ids = [place.id for place in places_list]
+    if (neighbour_index is None
+        or neighbour_index.candidate_lists(ids) is None):
+        neighbour_index = NeighbourIndex.from_matrix(distance_graph, 2 * k,
+                                                     ids=ids)
+    route = christofides(places_list, distance_graph, places,
+                         neighbour_index=neighbour_index, **options)
+    return improve_route(route, distance_graph, places,
+                         neighbour_index=neighbour_index)
+
+
+@register_solver("anytime")
+def solve_anytime(places_list, distance_graph, places, budget_ms=None,
+                  neighbour_index=None, **options):
+    """Routes the group with the anytime solver within budget_ms milliseconds
+    (one second if there is no budget).
+
+    Time complexity: O(n^2 + budget_ms)
+        * n = places_list
+    """
+
+    route, _ = solve(places_list, distance_graph, places,
+                     1000 if budget_ms is None else budget_ms,
+                     neighbour_index=neighbour_index)
+    return route
+
+
+def get_work(name: str, size: int):
+    """Returns how much work the named solver does on a group of size
+    places, which its thresholds["ms"] is measured per unit of: 2^n*n^2 for
+    Held-Karp, and n^2 for every other solver.
+
+    Time complexity: O(1)
+    """
+
+    if name == "held_karp":
+        return 2 ** size * size ** 2
+    return size ** 2
+
+
+def select_solver(size: int, budget_ms=None, thresholds=None):
+    """Returns the name of the solver to use for a group of size places.
+
+    Time complexity: O(1)
+    """
+
+    if thresholds is None:
+        thresholds = DEFAULT_THRESHOLDS
+
+    if size <= thresholds["exact"]:
+        name = "held_karp"
+    elif size >= thresholds["sparse"]:
+        name = "sparse"
+    else:
+        name = "christofides"
+
+    if (budget_ms is not None
+        and thresholds["ms"].get(name, 0) * get_work(name, size)
+            > budget_ms):
+        name = "anytime"
+    return name
+
+
+def get_route_length(route: dict, distance_graph):
+    """Returns the length of a {Place: set()} route.
+
+    Time complexity: O(n)
+        * n = route
+    """
+
+    origins = []
+    destinations = []
+    for node in route:
+        for neighbour in route[node]:
+            origins.append(node.id)
+            destinations.append(neighbour.id)
+    if not origins:
+        return 0.0
+
+    # Every edge is listed by both of its places. A route through two places
+    # goes there and back, but only lists the edge once per place.
+    length = float(np.sum(distance_graph.pairs(origins, destinations))) / 2
+    return 2 * length if len(route) == 2 else length
+
+
+def add_bound(report: dict, places_list, distance_graph):
+    """Adds a lower bound on the length of the shortest route through the
+    group ("bound") and how much longer the reported route can be than the
+    shortest one ("gap", as a fraction) to a report.
+
+    Routes found by Held-Karp are the shortest ones, so their bound is their
+    own length.
+
+    Time complexity: O(i*n^2)
+        * i = iterations of get_lower_bound()
+        * n = places_list
+    """
+
+    if report["solver"] == "held_karp":
+        bound = report["cost"]
+    else:
+        distances = get_distances_between(sorted(places_list), distance_graph)
+        bound = get_lower_bound(distances, upper_bound=report["cost"])
+    report["bound"] = bound
+    report["gap"] = get_gap(report["cost"], bound)
+    return report
+
+
+def run_solver(name: str, places_list, distance_graph, places,
+               budget_ms=None, bound=False, **options):
+    """Routes the group with the named solver, and returns the route along
+    with a report of the solver's name, the number of places, how many
+    seconds it took, and the length of the route. If bound is True, the
+    report also has the lower bound and gap of the route (see add_bound()),
+    which are not counted in its seconds.
+
+    Raises ValueError if there is no solver with that name.
+
+    Time complexity: depends on the solver
+    """
+
+    if name not in SOLVERS:
+        raise ValueError(f"Unknown solver {name}.")
+
+    started = time.perf_counter()
+    route = SOLVERS[name](places_list, distance_graph, places, budget_ms,
+                          **options)
+    report = {"solver": name, "places": len(places_list),
+              "seconds": time.perf_counter() - started,
+              "cost": get_route_length(route, distance_graph)}
+    if bound:
+        add_bound(report, places_list, distance_graph)
+    return route, report
+
+
+def solve_group(places_list, distance_graph, places, budget_ms=None,
+                thresholds=None, **options):
+    """Routes the group with the solver picked by select_solver(), and
+    returns the route along with its report (see run_solver()).
+
+    Time complexity: depends on the solver
+    """
+
+    name = select_solver(len(places_list), budget_ms, thresholds)
+    return run_solver(name, places_list, distance_graph, places, budget_ms,
+                      **options)
+
+
+def benchmark(groups: list, distance_graph, places, names=None, **options):
+    """Routes every group with every named solver (all of them by default),
+    and returns the report of each run (see run_solver()).
+
+    Solvers that can't route a group (like Held-Karp on a large one) are
+    skipped for it.
+
+    Time complexity: depends on the solvers
+    """
+
+    if names is None:
+        names = list(SOLVERS)
+
+    reports = []
+    for group in groups:
+        for name in names:
+            try:
+                reports.append(run_solver(name, group, distance_graph, places,
+                                          **options)[1])
+            except ValueError:
+                continue
+    return reports
+
+
+def calibrate(reports: list, exact_ms=20, tolerance=0.01):
+    """Returns thresholds for select_solver() measured from the reports of
+    benchmark().
+
+    - "exact" is the largest group Held-Karp routed within exact_ms
+      milliseconds.
+    - "sparse" is the smallest group from which the sparse pipeline was
+      faster than Christofides on every larger group as well, with a route
+      at most tolerance longer.
+    - "ms" is the milliseconds per unit of work (see get_work()) of each
+      solver on the largest group it routed, since small groups are
+      dominated by fixed costs. The anytime solver always takes its budget,
+      so it has none.
+    Thresholds without the reports to measure them keep their default.
+
+    Time complexity: O(r*log(r))
+        * r = reports
+    """
+
+    thresholds = {"exact": DEFAULT_THRESHOLDS["exact"],
+                  "sparse": DEFAULT_THRESHOLDS["sparse"],
+                  "ms": dict(DEFAULT_THRESHOLDS["ms"])}
+
+    by_solver = {}
+    for report in reports:
+        by_solver.setdefault(report["solver"], []).append(report)
+    for name, runs in by_solver.items():
+        if name == "anytime":
+            continue
+        largest = max(runs, key=lambda run: run["places"])
+        thresholds["ms"][name] = (1000 * largest["seconds"]
+                                  / max(get_work(name, largest["places"]), 1))
+
+    fast_exact = [run["places"] for run in by_solver.get("held_karp", [])
+                  if 1000 * run["seconds"] <= exact_ms]
+    if fast_exact:
+        thresholds["exact"] = max(fast_exact)
+
+    dense = {run["places"]: run for run in by_solver.get("christofides", [])}
+    sparse_runs = [run for run in by_solver.get("sparse", [])
+                   if run["places"] in dense]
+    # Walk down from the largest group until the sparse pipeline loses.
+    for run in sorted(sparse_runs, key=lambda run: -run["places"]):
+        other = dense[run["places"]]
+        if (run["seconds"] >= other["seconds"]
+            or run["cost"] > other["cost"] * (1 + tolerance)):
+            break
+        thresholds["sparse"] = run["places"]
+
+    return thresholds
@@ -0,0 +1,265 @@
+"""
+Contains the functions that keep past routes on disk and use them as a
+starting point for new routes.
+
+The places a truck visits change very little from one day to the next, so
+the route it took last time is usually a much better start than a new
+Christofides route. A template is the order in which a past route visited
+its places (as place IDs), stored under its depot (the hub) and a region
+chosen by the caller, such as the truck that drove it. Planning a route from
+a template works like this:
+1) Find the stored template for the depot and region whose places are the
+   most similar to the new group of places.
+2) Drop the places of the template that are not in the new group.
+3) Insert each new place where it makes the route the least longer (cheapest
+   insertion).
+4) Hand the route over to local search (see local_search.py), which cleans up
+   the places that moved.
+If no template is similar enough, the route is found by the solver portfolio
+instead (see portfolio.py). Groups small enough to be routed exactly skip the
+templates altogether.
+
+The templates are stored as a JSON file with the following layout:
+{"version": 1, "templates": {"<depot ID>/<region>": [template, ...]}}
+where each template is {"matrix": <version of the distance matrix>,
+"tour": [place IDs]}, most recent first. Templates made with a different
+distance matrix are ignored, since their place IDs might not mean the same
+places anymore.
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+
+from classes.distance_matrix import DistanceMatrix
+from classes.tour import Tour
+from local_search import improve_route
+from portfolio import add_bound, get_route_length, run_solver, select_solver
+
+TEMPLATE_VERSION = 1
+# How many templates are kept for each depot and region.
+TEMPLATE_LIMIT = 8
+
+
+def load_templates(file_path: str):
+    """Returns the templates stored in a JSON file, or an empty store if the
+    file does not exist.
+
+    Raises ValueError if the file is not a template store or was written by
+    an unsupported version.
+
+    Time complexity: O(n)
+        * n = size of the file
+    """
+
+    try:
+        with open(file_path, 'r') as file:
+            data = json.load(file)
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError:
+        raise ValueError(f"{file_path} is not a route template store.")
+
+    if (not isinstance(data, dict) or data.get("version") != TEMPLATE_VERSION
+        or not isinstance(data.get("templates"), dict)):
+        raise ValueError(f"{file_path} is not a route template store or was "
+                         "written by an unsupported version.")
+    return data["templates"]
+
+
+def save_templates(file_path: str, templates: dict):
+    """Writes the templates to a JSON file.
+
+    The file is written under a temporary name first and then renamed, so a
+    run that is interrupted never leaves a broken store behind.
+
+    Time complexity: O(n)
+        * n = places in all of the templates
+    """
+
+    temporary_path = file_path + ".tmp"
+    with open(temporary_path, 'w') as file:
+        json.dump({"version": TEMPLATE_VERSION, "templates": templates}, file)
+    os.replace(temporary_path, file_path)
+
+
+def get_matrix_version(distance_graph):
+    """Returns the version of the distance matrix as a string that can be
+    stored in JSON, or None if it is unknown.
+
+    Time complexity: O(1)
+    """
+
+    version = getattr(distance_graph, "version", None)
+    if isinstance(version, bytes):
+        return version.hex()
+    return None if version is None else str(version)
+
+
+def find_template(templates: dict, depot: int, region: str, place_ids,
+                  matrix_version):
+    """Returns the stored tour for the depot and region whose places are the
+    most similar to place_ids, along with its similarity, or (None, 0) if
+    there is none.
+
+    The similarity of two groups of places is the number of places they share
+    divided by the number of places in either of them (Jaccard index).
+
+    Time complexity: O(t*n)
+        * t = templates for the depot and region
+        * n = places in each template
+    """
+
+    place_ids = set(place_ids)
+    best_tour = None
+    best_similarity = 0
+    for template in templates.get(f"{depot}/{region}", []):
+        if template["matrix"] != matrix_version:
+            continue
+        tour_ids = set(template["tour"])
+        similarity = len(tour_ids & place_ids) / len(tour_ids | place_ids)
+        if similarity > best_similarity:
+            best_tour = template["tour"]
+            best_similarity = similarity
+
+    return best_tour, best_similarity
+
+
+def add_template(templates: dict, depot: int, region: str, tour_ids: list,
+                 matrix_version, limit=TEMPLATE_LIMIT):
+    """Stores a tour as the most recent template for the depot and region.
+
+    A template with the same places replaces the old one, and the oldest
+    templates are dropped once there are more than limit of them.
+
+    Time complexity: O(t*n)
+        * t = templates for the depot and region
+        * n = places in each template
+    """
+
+    key = f"{depot}/{region}"
+    place_ids = set(tour_ids)
+    kept = [template for template in templates.get(key, [])
+            if set(template["tour"]) != place_ids
+            or template["matrix"] != matrix_version]
+    templates[key] = [{"matrix": matrix_version,
+                       "tour": list(tour_ids)}] + kept[:limit - 1]
+
+
+def insert_places(tour_ids: list, new_ids, distance_graph):
+    """Inserts each of the new places into the tour where it makes the tour
+    the least longer, and returns the new tour.
+
+    Placing x between a and b makes the tour longer by
+    d(a, x) + d(x, b) - d(a, b), which is computed for every edge of the tour
+    at once.
+
+    Time complexity: O(n*m)
+        * n = tour_ids
+        * m = new_ids
+    """
+
+    tour_ids = list(tour_ids)
+    for place_id in new_ids:
+        if len(tour_ids) < 2:
+            tour_ids.append(place_id)
+            continue
+
+        origins = np.array(tour_ids)
+        destinations = np.roll(origins, -1)
+        if isinstance(distance_graph, DistanceMatrix):
+            added = (distance_graph.pairs(origins, place_id)
+                     + distance_graph.pairs(place_id, destinations)
+                     - distance_graph.pairs(origins, destinations))
+        else:
+            added = np.array([distance_graph[a][place_id]
+                              + distance_graph[place_id][b]
+                              - distance_graph[a][b]
+                              for a, b in zip(origins, destinations)])
+        i = int(np.argmin(added))
+        tour_ids.insert(i + 1, place_id)
+
+    return tour_ids
+
+
+def plan_route(places_list, distance_graph, places, templates: dict,
+               region: str, min_similarity=0.5, budget_ms=None,
+               thresholds=None, reports=None, bound=False, **options):
+    """Returns a finished {Place: set()} route for the group of places,
+    starting from the most similar template for the hub and region if there
+    is one.
+
+    Cheapest insertion only places each new place well relative to the route
+    at the time, so the route then goes through local search (see
+    improve_route() in local_search.py). If no template shares at least
+    min_similarity of its places with the group, the route is found by the
+    solver that select_solver() picks for its size and budget_ms (see
+    portfolio.py), which also receives any other options. Groups small enough
+    to be routed exactly skip the templates altogether.
+
+    If reports is a list, the report of how the route was found (see
+    run_solver()) is added to it, with "template" as the solver if it came
+    from a template. If bound is True, the report also has the lower bound
+    and gap of the route (see add_bound() in portfolio.py).
+
+    Time complexity: O(n*m + p*n*k) with a template, depends on the solver
+    without one
+        * n = places_list
+        * m = places that are not in the template
+        * p = passes of local search
+        * k = neighbours of each place in local search
+    """
+
+    name = select_solver(len(places_list), budget_ms, thresholds)
+    tour_ids = None
+    if name != "held_karp":
+        hub = places.get(places.address_to_place("HUB"))  # Node 0
+        by_id = {place.id: place for place in places_list}
+        tour_ids, similarity = find_template(
+            templates, hub.id, region, by_id,
+            get_matrix_version(distance_graph))
+
+    if tour_ids is None or similarity < min_similarity:
+        route, report = run_solver(name, places_list, distance_graph, places,
+                                   budget_ms, bound, **options)
+    else:
+        started = time.perf_counter()
+        # 2) Drop the places that are gone, 3) insert the new ones, 4) and
+        #    clean up with local search.
+        kept_ids = [place_id for place_id in tour_ids if place_id in by_id]
+        new_ids = sorted(set(by_id) - set(kept_ids))
+        tour_ids = insert_places(kept_ids, new_ids, distance_graph)
+        route = Tour(tour_ids).to_graph(by_id)
+        route = improve_route(route, distance_graph, places,
+                              neighbour_index=options.get("neighbour_index"))
+        report = {"solver": "template", "places": len(places_list),
+                  "seconds": time.perf_counter() - started,
+                  "cost": get_route_length(route, distance_graph)}
+        if bound:
+            add_bound(report, places_list, distance_graph)
+
+    if reports is not None:
+        reports.append(report)
+    return route
+
+
+def remember_route(route: dict, distance_graph, places, templates: dict,
+                   region: str):
+    """Stores a finished {Place: set()} route as a template for the hub and
+    region.
+
+    Time complexity: O(n + t*n)
+        * n = route
+        * t = templates for the hub and region
+    """
+
+    if not route:
+        return
+
+    hub = places.get(places.address_to_place("HUB"))  # Node 0
+    start = hub if hub in route else next(iter(route))
+    tour = Tour.from_graph(route, start)
+    add_template(templates, hub.id, region, tour.order.tolist(),
+                 get_matrix_version(distance_graph))
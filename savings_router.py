@@ -0,0 +1,370 @@
+"""
+Contains the Clarke-Wright savings router, which splits the packages of a
+whole day among a fleet of any size and finds the route of each trip.
+
+load_trucks() in delivery.py is written for the two trucks of the Salt Lake
+City facility, and the routes are only planned once the trucks are loaded.
+Here, both are done at once for any list of trucks, each with its own
+capacity, speed, and departure time:
+1) Every stop starts on a trip of its own: hub -> stop -> hub.
+2) Joining the trip that ends at stop i with the trip that starts at stop j
+   saves d(hub, i) + d(hub, j) - d(i, j) miles (the savings of i and j). The
+   savings of each stop and its nearest neighbours are put in a heap, and
+   the pairs are taken from it earliest deadline first (the later one of i
+   and j), then largest savings first. The stops with the same deadline are
+   joined with each other before any later stop is, like the deadline
+   groups of get_delivery_details() in delivery.py, so the urgent stops end
+   up on the same trips. Two trips are joined when i and j are at the ends
+   of different trips, the packages of both fit in the largest truck, and
+   every stop is still reached before its deadline.
+3) The trips are handed out to the trucks. The trucks are kept in a heap
+   ordered by the minute at which they can leave the hub (their departure
+   time, or when they come back from their last trip). The first truck to
+   leave takes the most urgent trip that fits in it: the one with the
+   earliest latest departure, the last minute at which it can leave and
+   still be on time.
+4) If a trip that is left can no longer leave on time when the next truck
+   does, its stops were joined for a departure that is already gone. The
+   stops that are left are then joined again (step 2) for the minute at
+   which that truck leaves, and the trips are handed out from there.
+Packages with special notes (see load_trucks()) are not treated differently.
+
+The deadlines are checked in O(1) for each pair, like in deadline_route.py:
+each trip keeps the smallest deadline - arrival over its stops (its slack)
+when it is driven in each direction. Joining the trips makes every stop of
+the second one later by the same number of minutes, which its slack is
+compared with. While the trips are joined, every trip is assumed to leave
+when the next truck does, at the pace of the slowest truck; step 4 makes
+sure that no trip leaves any later than it can.
+
+Stops are node indices, with the hub as node 0 (see get_distances_between()),
+and times are in minutes since midnight (see tour_evaluation.py).
+"""
+
+import heapq
+
+import numpy as np
+
+from christofides import get_distances_between
+from classes.neighbour_index import NeighbourIndex
+from classes.tour import Tour
+from tour_evaluation import evaluate_tours, get_deadline_minutes, to_minutes
+
+# How many of the nearest stops of each stop the savings are computed for.
+NEIGHBOURS = 20
+
+
+def get_demands(packages: list, places, size: int):
+    """Returns an array with the number of packages going to each place,
+    indexed by place ID.
+
+    Time complexity: O(n + p)
+        * n = size
+        * p = packages
+    """
+
+    demands = np.zeros(size, dtype=np.int64)
+    for package in packages:
+        demands[places.address_to_place(package.address).id] += 1
+    return demands
+
+
+def get_savings(distances, ids=None, neighbour_index=None, k=NEIGHBOURS):
+    """Returns the heap of savings of the stops (every node but the hub),
+    as (-savings, i, j) tuples with i < j, so that the largest savings come
+    out first.
+
+    Only the k nearest stops of each stop are paired with it. They are taken
+    from the neighbour index if there is one and it has enough of them for
+    every stop (ids are then the place IDs of the nodes), or found from the
+    distances. Pairs with negative savings are left out, since joining them
+    would make the routes longer.
+
+    Time complexity: O(n*k*log(n*k))
+        * n = nodes
+        * k = k
+    """
+
+    n = len(distances)
+    stops = np.arange(1, n)
+    if len(stops) < 2:
+        return []
+
+    lists = None
+    if neighbour_index is not None and ids is not None:
+        lists = neighbour_index.candidate_lists(ids[1:], k, min(k, n - 2))
+    if lists is None:
+        index = NeighbourIndex.from_matrix(distances, k, ids=stops)
+        origins = np.repeat(stops, index.k)
+        destinations = index.neighbours.ravel().astype(np.intp)
+    else:
+        origins = np.repeat(stops, [len(row) for row in lists])
+        destinations = 1 + np.fromiter(
+            (j for row in lists for j in row), dtype=np.intp,
+            count=len(origins))
+
+    # Each pair is kept once, however many times it was found.
+    pairs = np.unique(np.stack([np.minimum(origins, destinations),
+                                np.maximum(origins, destinations)], axis=1),
+                      axis=0)
+    i, j = pairs[:, 0], pairs[:, 1]
+    savings = distances[0, i] + distances[0, j] - distances[i, j]
+    kept = savings >= 0
+
+    heap = list(zip((-savings[kept]).tolist(), i[kept].tolist(),
+                    j[kept].tolist()))
+    heapq.heapify(heap)
+    return heap
+
+
+def merge_routes(distances, demands, capacity, deadlines, depart_minutes,
+                 pace, savings, stops=None):
+    """Joins the trips of the stops (see the top of this module) in order of
+    their savings, and returns the routes as lists of stops (without the
+    hub).
+
+    demands and deadlines are arrays indexed by node, and a trip can hold up
+    to capacity packages. Stops that can't be reached on time even on a trip
+    of their own have no deadline, so they don't keep every other stop from
+    being joined with them. savings is a heap of tuples that end with the
+    pair of stops (see get_savings()). stops are the nodes to route (every
+    node but the hub by default), and savings must only pair nodes among
+    them.
+
+    Time complexity: O(s*log(s) + n*c)
+        * s = savings
+        * n = nodes
+        * c = stops in the longest route
+    """
+
+    n = len(distances)
+    # 1) Each stop on a trip of its own. The arrays are indexed by trip, and
+    #    each trip is named after the stop it started with.
+    from_hub = distances[0]
+    slack = deadlines - depart_minutes - pace * from_hub
+    slack = np.where(slack < 0, np.inf, slack).tolist()
+
+    routes = [[stop] for stop in range(n)]
+    route_of = list(range(n))
+    first = list(range(n))
+    last = list(range(n))
+    load = np.asarray(demands).tolist()
+    driven = [0.0] * n  # From the first stop to the last one
+    forward_slack = slack
+    backward_slack = list(slack)
+    from_hub = from_hub.tolist()
+
+    # 2) Join the trips in order of their savings.
+    while savings:
+        i, j = heapq.heappop(savings)[-2:]
+        a = route_of[i]
+        b = route_of[j]
+        if a == b or i not in (first[a], last[a]) or j not in (first[b],
+                                                               last[b]):
+            continue
+        if load[a] + load[b] > capacity:
+            continue
+
+        # The trip of i must end at i and the trip of j start at j, so
+        # either of them may need to be driven the other way around.
+        if last[a] != i:
+            routes[a].reverse()
+            first[a], last[a] = last[a], first[a]
+            forward_slack[a], backward_slack[a] = (backward_slack[a],
+                                                   forward_slack[a])
+        if first[b] != j:
+            routes[b].reverse()
+            first[b], last[b] = last[b], first[b]
+            forward_slack[b], backward_slack[b] = (backward_slack[b],
+                                                   forward_slack[b])
+
+        # How much later the stops of each trip are reached once they are
+        # joined, when the new trip is driven forwards (b after a) or
+        # backwards (a after b).
+        edge = distances[i, j]
+        delay_b = pace * (from_hub[first[a]] + driven[a] + edge
+                          - from_hub[j])
+        delay_a = pace * (from_hub[last[b]] + driven[b] + edge
+                          - from_hub[i])
+        new_forward = min(forward_slack[a], forward_slack[b] - delay_b)
+        new_backward = min(backward_slack[b], backward_slack[a] - delay_a)
+        if max(new_forward, new_backward) < 0:
+            continue
+
+        # The smaller list of stops is moved into the larger one.
+        if len(routes[a]) >= len(routes[b]):
+            kept, moved = a, b
+            routes[a].extend(routes[b])
+        else:
+            kept, moved = b, a
+            routes[b][:0] = routes[a]
+        for stop in routes[moved]:
+            route_of[stop] = kept
+        routes[moved] = None
+
+        first[kept], last[kept] = first[a], last[b]
+        load[kept] = load[a] + load[b]
+        driven[kept] = driven[a] + edge + driven[b]
+        forward_slack[kept] = new_forward
+        backward_slack[kept] = new_backward
+
+    # 3) Each route is driven in the direction that is on time.
+    result = []
+    for r in (range(1, n) if stops is None else stops):
+        if routes[r] is None:
+            continue
+        if forward_slack[r] < 0 <= backward_slack[r]:
+            routes[r].reverse()
+        result.append(routes[r])
+    return result
+
+
+def get_latest_departure(route, distances, deadlines, pace):
+    """Returns the last minute at which a route (a list of stops, without the
+    hub) can leave the hub and still reach every stop before its deadline,
+    or infinity if none of its stops have one.
+
+    Time complexity: O(n)
+        * n = route
+    """
+
+    tour = np.concatenate([[0], route]).astype(np.intp)
+    drive = pace * np.cumsum(distances[tour[:-1], tour[1:]])
+    return float(np.min(deadlines[tour[1:]] - drive))
+
+
+def dispatch_routes(trucks: list, distances, demands, deadlines, paces: list,
+                    savings: list):
+    """Joins the stops into routes and hands them out to the trucks (steps 2
+    to 4 at the top of this module), and returns (truck index, departure
+    minute, route) tuples in the order the trucks leave the hub.
+
+    demands and deadlines are arrays indexed by node, savings is the list of
+    savings of every stop (see get_savings()), which is left as it is, and
+    paces holds the number of minutes it takes each truck to drive a mile.
+
+    Time complexity: O(p*(s*log(s) + n*c) + r*(r + t*log(t)))
+        * p = times the stops are joined (once, plus once for each step 4)
+        * s = savings
+        * n = nodes
+        * c = stops in the longest route
+        * r = routes
+        * t = trucks
+    """
+
+    pace = max(paces)
+    capacity = max(truck.capacity for truck in trucks)
+    from_hub = distances[0]
+    left = np.ones(len(distances), dtype=bool)
+    left[0] = False
+
+    # The trucks that can leave the earliest come out first.
+    available = [(to_minutes(truck.depart_time), i)
+                 for i, truck in enumerate(trucks)]
+    heapq.heapify(available)
+
+    routes = []  # (latest departure, route), most urgent first
+    dispatched = []
+    while left.any():
+        minute, i = heapq.heappop(available)
+
+        # 4) Join the stops that are left again if a route would be late,
+        #    earliest deadline first.
+        if not routes or routes[0][0] < minute:
+            stops = np.flatnonzero(left).tolist()
+            due = np.where(deadlines - minute - pace * from_hub < 0, np.inf,
+                           deadlines)
+            wave = [(max(due[i], due[j]), saving, i, j)
+                    for saving, i, j in savings if left[i] and left[j]]
+            heapq.heapify(wave)
+            routes = [(get_latest_departure(route, distances, due, pace),
+                       route)
+                      for route in merge_routes(distances, demands, capacity,
+                                                due, minute, pace, wave,
+                                                stops)]
+            routes.sort(key=lambda route: route[0])
+
+        # 3) The truck takes the most urgent route that fits in it. A truck
+        #    that no route fits in is not used again.
+        fits = [r for r, (_, route) in enumerate(routes)
+                if demands[route].sum() <= trucks[i].capacity]
+        if not fits:
+            continue
+        _, route = routes.pop(fits[0])
+        left[route] = False
+        dispatched.append((i, minute, route))
+
+        tour = np.concatenate([[0], route]).astype(np.intp)
+        length = evaluate_tours(tour, distances)[0][0]
+        heapq.heappush(available, (minute + paces[i] * length, i))
+
+    return dispatched
+
+
+def plan_fleet(trucks: list, packages: list, places, distance_graph,
+               neighbour_index=None, k=NEIGHBOURS):
+    """Splits the packages among the trucks and plans the route of each of
+    their trips with the savings router (see the top of this module).
+
+    Returns a list of trips, in the order the trucks leave the hub. Each
+    trip is a dictionary with the truck, the minute it leaves the hub, its
+    route (a Tour of place IDs starting at the hub, see classes/tour.py),
+    the packages it carries, the length of the route in miles, and how many
+    of its stops are reached after their deadline. A truck comes back to the
+    hub after each of its trips before it leaves on the next one.
+
+    Raises a ValueError if there are no trucks, or if the packages going to
+    a single place don't fit in the largest truck.
+
+    Time complexity: O(n^2 + p*n*k*log(n*k) + r*(r + t*log(t)))
+        * n = places the packages go to
+        * k = k
+        * p = times the stops are joined (see dispatch_routes())
+        * r = trips
+        * t = trucks
+    """
+
+    if not trucks:
+        raise ValueError("At least one truck is needed to deliver packages.")
+
+    hub = places.get(places.address_to_place("HUB"))  # Node 0
+    stops = {}  # Key = place, values = packages going to it
+    for package in packages:
+        place = places.address_to_place(package.address)
+        stops.setdefault(place, []).append(package)
+    stops.pop(hub, None)
+    capacity = max(truck.capacity for truck in trucks)
+    for place, place_packages in stops.items():
+        if len(place_packages) > capacity:
+            raise ValueError(f"The {len(place_packages)} packages going to "
+                             f"place {place.id} don't fit in any truck.")
+
+    nodes = [hub] + sorted(stops)
+    ids = np.array([node.id for node in nodes], dtype=np.intp)
+    distances = np.asarray(get_distances_between(nodes, distance_graph),
+                           dtype=np.float64)
+    size = len(distance_graph)
+    demands = get_demands(packages, places, size)[ids]
+    demands[0] = 0
+    all_deadlines = get_deadline_minutes(packages, places, size)
+    deadlines = all_deadlines[ids]
+    deadlines[0] = np.inf
+
+    paces = [60 / truck.speed for truck in trucks]
+    savings = get_savings(distances, ids, neighbour_index, k)
+    dispatched = dispatch_routes(trucks, distances, demands, deadlines,
+                                 paces, savings)
+
+    result = []
+    for i, minute, route in dispatched:
+        truck = trucks[i]
+        tour = ids[np.concatenate([[0], route]).astype(np.intp)]
+        lengths, _, late = evaluate_tours(tour, distance_graph, minute,
+                                          truck.speed, all_deadlines)
+        route_packages = [package for stop in route
+                          for package in stops[nodes[stop]]]
+        result.append({"truck": truck, "depart": minute, "tour": Tour(tour),
+                       "packages": route_packages,
+                       "length": float(lengths[0]), "late": int(late[0])})
+    result.sort(key=lambda trip: (trip["depart"], trip["truck"].id))
+    return result
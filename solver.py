@@ -0,0 +1,203 @@
+"""
+Contains the anytime solver, which finds the best route it can for a group of
+places within a time budget.
+
+christofides() and local search (see local_search.py) take as long as they
+take, which can be too long when the trucks have to leave at a set time. The
+anytime solver always has a valid route ready and keeps making it shorter
+until the budget runs out:
+1) Build a nearest-neighbour route, which takes O(n^2) time.
+2) Improve it with 2-opt and Or-opt moves.
+3) Improve it further with Lin-Kernighan-style moves.
+4) Until the budget runs out, find Christofides routes (the usual one first,
+   then randomized ones, see christofides()) and improve them with local
+   search, keeping any route that is shorter.
+Every time the best route gets shorter, it is handed to a callback, so the
+caller can use it as soon as it is found. Local search checks the time after
+every move, so it stops close to the end of the budget, but a Christofides
+route can't be stopped once it has started. So each one is only started if
+there is more time left than the previous step took (the first one is
+compared with all of the time spent before it), and the greedy matching is
+used for groups too large for the exact one to be quick. Local search reads
+the distances from a CandidateDistances table, so the solver never copies
+all n^2 of them into Python lists.
+
+Right after the nearest-neighbour route, a lower bound on the length of the
+shortest route is found (see lower_bound.py), using up to a quarter of the
+budget. Once the best route is within gap of the bound, it is at most that
+much longer than the shortest route, and the solver stops early instead of
+spending the rest of the budget on it.
+"""
+
+import time
+
+import numpy as np
+
+from christofides import (EXACT_MATCHING_LIMIT, christofides,
+                          get_distances_between, tour_to_graph)
+from classes.candidate_distances import CandidateDistances
+from classes.tour import Tour
+from local_search import (get_neighbour_lists, graph_to_tour, improve_tour,
+                          lin_kernighan)
+from lower_bound import get_lower_bound
+
+# The anytime solver stops once its route is at most this much longer than
+# the shortest route (1%).
+STOP_GAP = 0.01
+
+
+def get_tour_length(tour: list, distances):
+    """Returns the length of a tour of node indices, including the path back
+    to the first node.
+
+    Time complexity: O(n)
+        * n = tour
+    """
+
+    return float(sum(distances[tour[i - 1]][tour[i]]
+                     for i in range(len(tour))))
+
+
+def nearest_neighbour_tour(distances, start=0):
+    """Returns a tour that always goes to the closest node it has not visited
+    yet, starting at the start node.
+
+    Time complexity: O(n^2)
+        * n = distances
+    """
+
+    distances = np.asarray(distances, dtype=np.float64)
+    n = len(distances)
+    if n == 0:
+        return []
+
+    visited = np.zeros(n, dtype=bool)
+    tour = [start]
+    visited[start] = True
+    current = start
+    for _ in range(n - 1):
+        row = np.where(visited, np.inf, distances[current])
+        current = int(np.argmin(row))
+        visited[current] = True
+        tour.append(current)
+
+    return tour
+
+
+def solve(stops, distance_graph, places, budget_ms=1000, callback=None,
+          neighbour_index=None, k=8, seed=0, gap=STOP_GAP):
+    """Returns the shortest {Place: set()} route the anytime solver finds for
+    the stops within budget_ms milliseconds, along with its length.
+
+    callback(route, length, seconds) is called with the best route so far
+    every time it gets shorter, along with its length and how many seconds
+    have passed since the start. The randomized routes use seeds drawn from
+    seed, so two calls that get through the same number of steps find the
+    same route. The solver stops early once the route is within gap of the
+    lower bound (None to always use the whole budget). See the top of this
+    module for the steps of the solver.
+
+    Time complexity: O(n^2) for the first route, then up to budget_ms
+        * n = stops
+    """
+
+    started = time.perf_counter()
+    deadline = started + budget_ms / 1000
+
+    def remaining():
+        return deadline - time.perf_counter()
+
+    nodes = sorted(stops)
+    if len(nodes) < 4:
+        route = tour_to_graph(nodes)
+        length = get_tour_length(
+            list(range(len(nodes))),
+            get_distances_between(nodes, distance_graph))
+        if callback is not None:
+            callback(route, length, time.perf_counter() - started)
+        return route, length
+
+    hub = places.get(places.address_to_place("HUB"))  # Node 0
+    start = nodes.index(hub) if hub in nodes else 0
+    positions = {node: i for i, node in enumerate(nodes)}
+
+    distances = np.asarray(get_distances_between(nodes, distance_graph),
+                           dtype=np.float64)
+    bound_distances = distances
+
+    best = {"tour": None, "length": float("inf")}
+
+    def offer(tour):
+        """Keeps the tour if it is shorter than the best one so far."""
+
+        length = get_tour_length(list(tour), distances)
+        if length < best["length"]:
+            best["tour"] = Tour(tour.order)
+            best["length"] = length
+            if callback is not None:
+                callback(tour.to_graph(nodes), length,
+                         time.perf_counter() - started)
+
+    matching = "exact" if len(nodes) <= EXACT_MATCHING_LIMIT else "greedy"
+
+    def christofides_tour(seed):
+        """Returns a Christofides tour of the nodes as node indices."""
+
+        route = christofides(nodes, distance_graph, places, matching,
+                             neighbour_index=neighbour_index, seed=seed)
+        return Tour([positions[node]
+                     for node in graph_to_tour(route, nodes[start])])
+
+    # 1) A valid route, right away. It is built from the NumPy array, which
+    #    is much faster for whole rows.
+    tour = Tour(nearest_neighbour_tour(distances, start))
+    offer(tour)
+
+    neighbours = None
+    if neighbour_index is not None:
+        neighbours = neighbour_index.candidate_lists(
+            [node.id for node in nodes], k)
+    if neighbours is None:
+        neighbours = get_neighbour_lists(distances, k)
+    # Local search reads one distance at a time, which is much faster from
+    # Python containers than from a NumPy array. Only the distances to the
+    # candidate neighbours (and the ones read later) are copied, instead of
+    # building n^2 Python floats (see classes/candidate_distances.py).
+    distances = CandidateDistances([node.id for node in nodes], neighbours,
+                                   distance_graph)
+
+    lower_bound = 0.0
+    if gap is not None and remaining() > 0:
+        lower_bound = get_lower_bound(bound_distances, best["length"],
+                                      time_limit=remaining() / 4)
+
+    def close_enough():
+        """Returns whether the best tour is within gap of the lower bound."""
+
+        return (gap is not None
+                and best["length"] <= lower_bound * (1 + gap))
+
+    # 2) and 3) Local search on it.
+    if remaining() > 0 and not close_enough():
+        improve_tour(tour, distances, neighbours, deadline=deadline)
+        offer(tour)
+    if remaining() > 0 and not close_enough():
+        lin_kernighan(tour, distances, neighbours, deadline=deadline)
+        improve_tour(tour, distances, neighbours, deadline=deadline)
+        offer(tour)
+
+    # 4) Christofides routes until the budget runs out. A step is skipped
+    #    if the last one took longer than the time that is left, and the
+    #    first one if everything before it did.
+    seeds = np.random.SeedSequence(seed)
+    run_seed = None
+    step_time = time.perf_counter() - started
+    while remaining() > step_time and not close_enough():
+        step_started = time.perf_counter()
+        tour = christofides_tour(run_seed)
+        improve_tour(tour, distances, neighbours, deadline=deadline)
+        offer(tour)
+        step_time = time.perf_counter() - step_started
+        run_seed = int(seeds.spawn(1)[0].generate_state(1)[0])
+
+    return best["tour"].to_graph(nodes), best["length"]
@@ -0,0 +1,68 @@
+import unittest
+
+import numpy as np
+
+from classes.distance_matrix import DistanceMatrix
+from classes.package import Package
+from classes.place import Place
+from classes.places_hash import PlacesHash
+from classes.timemod import TimeMod
+from classes.truck import Truck
+from savings_router import plan_fleet
+from tour_evaluation import to_minutes
+
+
+def make_day(seed, stops=60, urgent=30):
+    """Returns the places, distance matrix, and packages of a day with one
+    package for each stop, scattered around the hub. The first urgent
+    packages are due at 11:00 and the rest at the end of the day."""
+
+    rng = np.random.default_rng(seed)
+    points = np.vstack([[0, 0], rng.random((stops, 2)) * 16 - 8])
+    distances = np.sqrt(((points[:, None] - points[None]) ** 2).sum(-1))
+
+    place_list = [Place(0, "Hub", " HUB")]
+    place_list += [Place(i, f"Stop {i}", f" {100 + i} Main St")
+                   for i in range(1, stops + 1)]
+    places = PlacesHash(1000)
+    places.load(place_list)
+
+    packages = [Package(i, f"{100 + i} Main St", "Salt Lake City", "UT",
+                        "84101", "11:00 AM" if i <= urgent else "EOD", "1")
+                for i in range(1, stops + 1)]
+    return places, DistanceMatrix(distances), packages
+
+
+class PlanFleetTest(unittest.TestCase):
+
+    def test_every_trip_leaves_on_time(self):
+        # Half of the stops are due at 11:00. Both trucks can take all of
+        # them on their first trip, so none of them should be late, even
+        # though the trips that come after leave well after 8:00.
+        for seed in range(6):
+            places, distance_graph, packages = make_day(seed)
+            trucks = [Truck(1, TimeMod(8, 0)), Truck(2, TimeMod(8, 0))]
+
+            trips = plan_fleet(trucks, packages, places, distance_graph)
+
+            late = sum(trip["late"] for trip in trips)
+            self.assertEqual(late, 0, f"seed {seed}")
+
+    def test_every_package_is_delivered_once(self):
+        places, distance_graph, packages = make_day(0)
+        trucks = [Truck(1, TimeMod(8, 0)), Truck(2, TimeMod(9, 30), 10)]
+
+        trips = plan_fleet(trucks, packages, places, distance_graph)
+
+        delivered = sorted(package.id for trip in trips
+                           for package in trip["packages"])
+        self.assertEqual(delivered, [package.id for package in packages])
+        for trip in trips:
+            self.assertLessEqual(len(trip["packages"]),
+                                 trip["truck"].capacity)
+            self.assertGreaterEqual(trip["depart"],
+                                    to_minutes(trip["truck"].depart_time))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+Contains the functions that score many tours at once.
+
+deliver_packages() in delivery.py drives a route one stop at a time, which is
+fine for the route the trucks actually take, but far too slow for scoring the
+thousands of candidate tours that multi-start runs and local search can come
+up with. Here, the tours are the rows of a 2D array of place IDs, and they are
+all scored together with NumPy:
+1) The distance of every leg of every tour is read from the distance matrix
+   at once by indexing it with the arrays of origins and destinations.
+2) The cumulative sum of each row gives how far the truck has driven when it
+   reaches each stop, which is turned into minutes with the truck's speed.
+3) The arrival minutes are compared with the deadline of each stop.
+Times are in minutes since midnight (see to_minutes()). Unlike TimeMod, the
+minutes are not rounded down after every leg.
+"""
+
+import numpy as np
+
+from classes.distance_matrix import DistanceMatrix
+from classes.timemod import TimeMod
+
+
+def to_minutes(time: TimeMod):
+    """Returns a time as the number of minutes since midnight.
+
+    Time complexity: O(1)
+    """
+
+    return time.hour * 60 + time.minutes
+
+
+def get_deadline_minutes(packages: list, places, size: int):
+    """Returns an array with the earliest deadline (in minutes since
+    midnight) of the packages going to each place, indexed by place ID.
+    Places without packages have no deadline (infinity).
+
+    Time complexity: O(n + p)
+        * n = size
+        * p = packages
+    """
+
+    deadlines = np.full(size, np.inf)
+    for package in packages:
+        place_id = places.address_to_place(package.address).id
+        deadlines[place_id] = min(deadlines[place_id],
+                                  to_minutes(package.deadline))
+    return deadlines
+
+
+def evaluate_tours(tours, distance_graph, depart_minutes=0.0, speed=18,
+                   deadlines=None, closed=True):
+    """Scores every tour (row) of a 2D array of place IDs, and returns the
+    length of each tour, the minute at which each stop is reached, and how
+    many stops of each tour are reached after their deadline.
+
+    The arrival minutes have the same shape as the tours, and the first stop
+    of each tour is reached at depart_minutes. If closed is True, the length
+    includes the way back from the last stop to the first one. deadlines is
+    an array of minutes indexed by place ID (see get_deadline_minutes()); if
+    it is None, no stop is ever late.
+
+    Time complexity: O(b*n)
+        * b = tours
+        * n = stops in each tour
+    """
+
+    tours = np.atleast_2d(np.asarray(tours, dtype=np.intp))
+    batch, n = tours.shape
+    if n == 0:
+        return (np.zeros(batch), np.zeros((batch, 0)),
+                np.zeros(batch, dtype=np.int64))
+
+    # 1) The distance of every leg, with the way back as the last column.
+    origins = tours
+    destinations = np.roll(tours, -1, axis=1)
+    if isinstance(distance_graph, DistanceMatrix):
+        legs = distance_graph.pairs(origins, destinations)
+    else:
+        legs = np.asarray(distance_graph, dtype=np.float64)[origins,
+                                                            destinations]
+
+    # 2) How far the truck has driven when it reaches each stop.
+    driven = np.zeros((batch, n))
+    np.cumsum(legs[:, :-1], axis=1, out=driven[:, 1:])
+    arrivals = depart_minutes + driven * (60 / speed)
+    lengths = driven[:, -1] + (legs[:, -1] if closed else 0)
+
+    # 3) The stops that are reached too late.
+    if deadlines is None:
+        late = np.zeros(batch, dtype=np.int64)
+    else:
+        late = np.count_nonzero(arrivals > np.asarray(deadlines)[tours],
+                                axis=1)
+
+    return lengths, arrivals, late